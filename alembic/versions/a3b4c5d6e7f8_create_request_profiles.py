@@ -0,0 +1,54 @@
+"""Create request_profiles table for the sampling profiler
+
+Revision ID: a3b4c5d6e7f8
+Revises: f2a3b4c5d6e7
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3b4c5d6e7f8'
+down_revision: Union[str, None] = 'f2a3b4c5d6e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _table_exists(bind, name):
+    try:
+        return bool(bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall())
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _table_exists(bind, 'request_profiles'):
+        op.create_table(
+            'request_profiles',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('endpoint', sa.String(length=100), nullable=True),
+            sa.Column('method', sa.String(length=10), nullable=False),
+            sa.Column('path', sa.String(length=255), nullable=False),
+            sa.Column('status', sa.Integer(), nullable=True),
+            sa.Column('trigger', sa.String(length=10), nullable=False),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+            sa.Column('duration', sa.Float(), nullable=False),
+            sa.Column('cpu', sa.Float(), nullable=True),
+            sa.Column('samples', sa.Integer(), nullable=False),
+            sa.Column('interval_ms', sa.Float(), nullable=False),
+            sa.Column('stacks', sa.LargeBinary(), nullable=False),
+        )
+        # Newest first on /admin/profiles
+        op.create_index('ix_request_profiles_created_at', 'request_profiles', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_request_profiles_created_at', table_name='request_profiles')
+    op.drop_table('request_profiles')
@@ -0,0 +1,63 @@
+"""Create price_history and price_buckets tables
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _table_exists(bind, name):
+    try:
+        return bool(bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall())
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _table_exists(bind, 'price_history'):
+        op.create_table(
+            'price_history',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id'), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False, server_default=''),
+            sa.Column('location', sa.String(length=100), nullable=False, server_default=''),
+            sa.Column('unit', sa.String(length=50), nullable=False, server_default=''),
+            sa.Column('price', sa.Numeric(10, 2), nullable=False),
+            sa.Column('counted', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('recorded_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_price_history_product_id', 'price_history', ['product_id', 'id'])
+        # Compaction deletes by age
+        op.create_index('ix_price_history_recorded_at', 'price_history', ['recorded_at'])
+
+    if not _table_exists(bind, 'price_buckets'):
+        op.create_table(
+            'price_buckets',
+            sa.Column('category', sa.String(length=50), primary_key=True),
+            sa.Column('location', sa.String(length=100), primary_key=True),
+            sa.Column('unit', sa.String(length=50), primary_key=True),
+            sa.Column('week', sa.Date(), primary_key=True),
+            sa.Column('bucket', sa.Integer(), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('price_buckets')
+    op.drop_index('ix_price_history_recorded_at', table_name='price_history')
+    op.drop_index('ix_price_history_product_id', table_name='price_history')
+    op.drop_table('price_history')
@@ -0,0 +1,65 @@
+"""Add listing_bands and duplicate flags for near-duplicate listing detection
+
+Revision ID: b4c5d6e7f8a9
+Revises: a3b4c5d6e7f8
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4c5d6e7f8a9'
+down_revision: Union[str, None] = 'a3b4c5d6e7f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _table_exists(bind, name):
+    try:
+        return bool(bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall())
+    except Exception:
+        return False
+
+
+def _columns(bind, name):
+    try:
+        return {row[1] for row in bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall()}
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _table_exists(bind, 'listing_bands'):
+        op.create_table(
+            'listing_bands',
+            sa.Column('kind', sa.String(length=10), primary_key=True),
+            sa.Column('bucket', sa.BigInteger(), primary_key=True),
+            sa.Column('entity_id', sa.Integer(), primary_key=True),
+        )
+        # A listing's own buckets, for re-indexing and the candidate join
+        op.create_index('ix_listing_bands_entity', 'listing_bands', ['kind', 'entity_id', 'bucket'])
+
+    for table in ('products', 'pawah_projects'):
+        cols = _columns(bind, table)
+        with op.batch_alter_table(table) as batch_op:
+            if 'duplicate_of_id' not in cols:
+                batch_op.add_column(sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+                batch_op.create_foreign_key(f'fk_{table}_duplicate_of_id', table, ['duplicate_of_id'], ['id'])
+            if 'duplicate_score' not in cols:
+                batch_op.add_column(sa.Column('duplicate_score', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in ('pawah_projects', 'products'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_duplicate_of_id', type_='foreignkey')
+            batch_op.drop_column('duplicate_score')
+            batch_op.drop_column('duplicate_of_id')
+    op.drop_index('ix_listing_bands_entity', table_name='listing_bands')
+    op.drop_table('listing_bands')
@@ -0,0 +1,30 @@
+"""Add pawah indexes for the recommendation index
+
+Revision ID: b7c8d9e0f1a2
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c8d9e0f1a2'
+down_revision: Union[str, None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Incremental refresh reads rows changed since a watermark
+    op.create_index('ix_pawah_projects_updated_at', 'pawah_projects', ['updated_at'])
+    # Farmer profile: projects a user has accepted
+    op.create_index('ix_pawah_projects_farmer_id', 'pawah_projects', ['farmer_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pawah_projects_farmer_id', table_name='pawah_projects')
+    op.drop_index('ix_pawah_projects_updated_at', table_name='pawah_projects')
@@ -0,0 +1,37 @@
+"""Add orders.hold_expires_at for expiring stock holds
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    try:
+        cols = {row[1] for row in bind.exec_driver_sql("PRAGMA table_info('orders')").fetchall()}
+    except Exception:
+        cols = set()
+    if 'hold_expires_at' not in cols:
+        with op.batch_alter_table('orders') as batch_op:
+            batch_op.add_column(sa.Column('hold_expires_at', sa.DateTime(), nullable=True))
+    # The expiry sweep is a range scan of this index; only pending orders have a value
+    op.create_index('ix_orders_hold_expires_at', 'orders', ['hold_expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_hold_expires_at', table_name='orders')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('hold_expires_at')
@@ -0,0 +1,48 @@
+"""Add latitude/longitude/geo_cell to products and pawah projects
+
+Revision ID: c3d4e5f6a7b8
+Revises: b7c8d9e0f1a2
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, None] = 'b7c8d9e0f1a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for table in ('products', 'pawah_projects'):
+        try:
+            cols = {row[1] for row in bind.exec_driver_sql(f"PRAGMA table_info('{table}')").fetchall()}
+        except Exception:
+            cols = set()
+        with op.batch_alter_table(table) as batch_op:
+            if 'latitude' not in cols:
+                batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+            if 'longitude' not in cols:
+                batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+            if 'geo_cell' not in cols:
+                batch_op.add_column(sa.Column('geo_cell', sa.Integer(), nullable=True))
+
+    # Radius search: geo_cell IN (...) is the range lookup; the listing flags and
+    # coordinates ride along so the distance sort never touches the table
+    op.create_index('ix_products_geo_cell', 'products', ['geo_cell', 'is_active', 'is_approved', 'latitude', 'longitude'])
+    op.create_index('ix_pawah_projects_geo_cell', 'pawah_projects', ['geo_cell', 'is_approved', 'latitude', 'longitude'])
+
+
+def downgrade() -> None:
+    for table in ('pawah_projects', 'products'):
+        op.drop_index(f'ix_{table}_geo_cell', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('geo_cell')
+            batch_op.drop_column('longitude')
+            batch_op.drop_column('latitude')
@@ -0,0 +1,57 @@
+"""Add moderation triage scores and submission times
+
+Revision ID: c5d6e7f8a9b0
+Revises: b4c5d6e7f8a9
+Create Date: 2026-10-22 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d6e7f8a9b0'
+down_revision: Union[str, None] = 'b4c5d6e7f8a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('products', 'pawah_projects')
+
+
+def _columns(bind, name):
+    try:
+        return {row[1] for row in bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall()}
+    except Exception:
+        return set()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    for table in TABLES:
+        cols = _columns(bind, table)
+        with op.batch_alter_table(table) as batch_op:
+            if 'submitted_at' not in cols:
+                batch_op.add_column(sa.Column('submitted_at', sa.DateTime(), nullable=True))
+            if 'triage_score' not in cols:
+                batch_op.add_column(sa.Column('triage_score', sa.SmallInteger(), nullable=False, server_default='50'))
+            if 'triage_flags' not in cols:
+                batch_op.add_column(sa.Column('triage_flags', sa.String(length=100), nullable=True))
+        # Best guess for existing rows; `flask moderation rescore` scores the ones awaiting review
+        op.execute(f'UPDATE {table} SET submitted_at = created_at WHERE submitted_at IS NULL')
+        # The queue: pending rows (is_approved false, never reviewed) lowest risk first, then oldest
+        op.create_index(f'ix_{table}_triage', table, ['is_approved', 'reviewed_at', 'triage_score', 'submitted_at'])
+        # Approval latency over recent approvals
+        op.create_index(f'ix_{table}_approved_at', table, ['approved_at'])
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_approved_at', table_name=table)
+        op.drop_index(f'ix_{table}_triage', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('triage_flags')
+            batch_op.drop_column('triage_score')
+            batch_op.drop_column('submitted_at')
@@ -0,0 +1,60 @@
+"""Create job_leases and job_runs tables
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d0e1f2a3b4'
+down_revision: Union[str, None] = 'b8c9d0e1f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _table_exists(bind, name):
+    try:
+        return bool(bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall())
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _table_exists(bind, 'job_leases'):
+        op.create_table(
+            'job_leases',
+            sa.Column('name', sa.String(length=50), primary_key=True),
+            sa.Column('holder', sa.String(length=120), nullable=True),
+            sa.Column('expires_at', sa.DateTime(), nullable=True),
+        )
+
+    if not _table_exists(bind, 'job_runs'):
+        op.create_table(
+            'job_runs',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('job', sa.String(length=50), nullable=False),
+            sa.Column('holder', sa.String(length=120), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False, server_default='running'),
+            sa.Column('started_at', sa.DateTime(), nullable=False),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.Column('duration', sa.Float(), nullable=True),
+            sa.Column('detail', sa.Text(), nullable=True),
+        )
+        # Last run per job, and the admin history / pruning by age
+        op.create_index('ix_job_runs_job_started', 'job_runs', ['job', 'started_at'])
+        op.create_index('ix_job_runs_started_at', 'job_runs', ['started_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_runs_started_at', table_name='job_runs')
+    op.drop_index('ix_job_runs_job_started', table_name='job_runs')
+    op.drop_table('job_runs')
+    op.drop_table('job_leases')
@@ -0,0 +1,55 @@
+"""Create archived_orders table for closed order archival
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0e1f2a3b4c5'
+down_revision: Union[str, None] = 'c9d0e1f2a3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _table_exists(bind, name):
+    try:
+        return bool(bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall())
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _table_exists(bind, 'archived_orders'):
+        op.create_table(
+            'archived_orders',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column('buyer_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('seller_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id'), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False, server_default='1'),
+            sa.Column('total_price', sa.Numeric(10, 2), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('closed_at', sa.DateTime(), nullable=True),
+            sa.Column('first_reply_at', sa.DateTime(), nullable=True),
+            sa.Column('archived_at', sa.DateTime(), nullable=False),
+            sa.Column('payload', sa.LargeBinary(), nullable=False),
+        )
+        # The archive sections of /orders, newest first per buyer and per seller
+        op.create_index('ix_archived_orders_buyer_created', 'archived_orders', ['buyer_id', 'created_at'])
+        op.create_index('ix_archived_orders_seller_created', 'archived_orders', ['seller_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_archived_orders_seller_created', table_name='archived_orders')
+    op.drop_index('ix_archived_orders_buyer_created', table_name='archived_orders')
+    op.drop_table('archived_orders')
@@ -0,0 +1,64 @@
+"""Composite indexes for listing filters, seller pages and admin lists
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Found with `python -m bench.query_plans`: equality filters first, then the
+# created_at sort key, so each page is one ordered index range
+INDEXES = [
+    # Marketplace filters (ix_products_active_approved_created serves the unfiltered list)
+    ('ix_products_listing_category', 'products', ['is_active', 'is_approved', 'category', 'created_at']),
+    ('ix_products_listing_location', 'products', ['is_active', 'is_approved', 'location', 'created_at']),
+    # My listings, and the seller side of the orders page
+    ('ix_products_seller_created', 'products', ['seller_id', 'created_at']),
+    # Admin moderation queue and full lists
+    ('ix_products_approved_created', 'products', ['is_approved', 'created_at']),
+    ('ix_products_created_at', 'products', ['created_at']),
+    ('ix_pawah_projects_created_at', 'pawah_projects', ['created_at']),
+    # Pawah list filters
+    ('ix_pawah_projects_listing_status', 'pawah_projects', ['is_approved', 'status', 'created_at']),
+    ('ix_pawah_projects_listing_crop', 'pawah_projects', ['is_approved', 'crop_type', 'created_at']),
+    ('ix_pawah_projects_listing_location', 'pawah_projects', ['is_approved', 'location', 'created_at']),
+    # Admin logs filters
+    ('ix_audit_logs_created_at', 'audit_logs', ['created_at']),
+    ('ix_audit_logs_type_created', 'audit_logs', ['entity_type', 'created_at']),
+    ('ix_audit_logs_actor_created', 'audit_logs', ['actor_id', 'created_at']),
+]
+
+# Widened to carry the sort key; the old index is a prefix of the new one
+REPLACED = [
+    ('ix_orders_buyer_id', 'ix_orders_buyer_created', 'orders', ['buyer_id'], ['buyer_id', 'created_at']),
+    ('ix_orders_product_id', 'ix_orders_product_created', 'orders', ['product_id'], ['product_id', 'created_at']),
+    ('ix_messages_context', 'ix_messages_context_created', 'messages',
+     ['context_type', 'context_id'], ['context_type', 'context_id', 'created_at']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+    for old, new, table, _, columns in REPLACED:
+        op.create_index(new, table, columns)
+        op.drop_index(old, table_name=table)
+
+
+def downgrade() -> None:
+    for old, new, table, old_columns, _ in REPLACED:
+        op.create_index(old, table, old_columns)
+        op.drop_index(new, table_name=table)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,50 @@
+"""Add orders.updated_at and (updated_at, id) indexes for the delta sync API
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f2a3b4c5d6'
+down_revision: Union[str, None] = 'd0e1f2a3b4c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Sync cursors walk (updated_at, id) ranges, per user for orders
+INDEXES = [
+    ('ix_products_updated', 'products', ['updated_at', 'id']),
+    ('ix_pawah_projects_updated', 'pawah_projects', ['updated_at', 'id']),
+    ('ix_orders_buyer_updated', 'orders', ['buyer_id', 'updated_at', 'id']),
+    ('ix_orders_product_updated', 'orders', ['product_id', 'updated_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    try:
+        cols = {row[1] for row in bind.exec_driver_sql("PRAGMA table_info('orders')").fetchall()}
+    except Exception:
+        cols = set()
+    if 'updated_at' not in cols:
+        with op.batch_alter_table('orders') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # Rows without a stamp are invisible to the sync cursors
+    for table in ('orders', 'products', 'pawah_projects'):
+        op.execute(f'UPDATE {table} SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL')
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('updated_at')
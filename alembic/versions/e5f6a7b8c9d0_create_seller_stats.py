@@ -0,0 +1,42 @@
+"""Create seller_stats table
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    try:
+        table_exists = bool(bind.exec_driver_sql("PRAGMA table_info('seller_stats')").fetchall())
+    except Exception:
+        table_exists = False
+
+    if not table_exists:
+        op.create_table(
+            'seller_stats',
+            sa.Column('seller_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('products_active', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('orders_completed', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('responses', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('response_seconds', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+    # Fill it with `flask seller-stats reconcile` after upgrading
+
+
+def downgrade() -> None:
+    op.drop_table('seller_stats')
@@ -0,0 +1,69 @@
+"""Add product_images and uploaded image columns on products
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a3b4c5d6e7'
+down_revision: Union[str, None] = 'e1f2a3b4c5d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _table_exists(bind, name):
+    try:
+        return bool(bind.exec_driver_sql(f"PRAGMA table_info('{name}')").fetchall())
+    except Exception:
+        return False
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _table_exists(bind, 'product_images'):
+        op.create_table(
+            'product_images',
+            sa.Column('key', sa.String(length=64), primary_key=True),
+            sa.Column('ext', sa.String(length=5), nullable=False),
+            sa.Column('width', sa.Integer(), nullable=False),
+            sa.Column('height', sa.Integer(), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+            sa.Column('widths', sa.String(length=40), nullable=True),
+            sa.Column('variant_bytes', sa.Integer(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('uploaded_by_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('processed_at', sa.DateTime(), nullable=True),
+        )
+        # The retry job looks for pending images
+        op.create_index('ix_product_images_status', 'product_images', ['status'])
+
+    try:
+        cols = {row[1] for row in bind.exec_driver_sql("PRAGMA table_info('products')").fetchall()}
+    except Exception:
+        cols = set()
+    with op.batch_alter_table('products') as batch_op:
+        if 'image_key' not in cols:
+            batch_op.add_column(sa.Column('image_key', sa.String(length=64), nullable=True))
+        if 'image_widths' not in cols:
+            batch_op.add_column(sa.Column('image_widths', sa.String(length=40), nullable=True))
+    # Variants finishing update every product showing that image
+    op.create_index('ix_products_image_key', 'products', ['image_key'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_image_key', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('image_widths')
+        batch_op.drop_column('image_key')
+    op.drop_index('ix_product_images_status', table_name='product_images')
+    op.drop_table('product_images')
@@ -0,0 +1,41 @@
+"""Create listing_views table
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    try:
+        table_exists = bool(bind.exec_driver_sql("PRAGMA table_info('listing_views')").fetchall())
+    except Exception:
+        table_exists = False
+
+    if not table_exists:
+        # Separate from products/pawah_projects so view writes never touch
+        # (or bump updated_at on) the listing rows themselves
+        op.create_table(
+            'listing_views',
+            sa.Column('kind', sa.String(length=20), primary_key=True),
+            sa.Column('entity_id', sa.Integer(), primary_key=True),
+            sa.Column('views', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('listing_views')
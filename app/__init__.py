@@ -1,10 +1,20 @@
 from flask import Flask
 from flask_wtf import CSRFProtect
 from app.extensions import db, limiter, mail
+from app.utils.metrics import init_metrics, metrics
+from app.utils.warmup import configure_template_cache
+from app.utils.fragment_cache import init_fragment_cache
+from app.utils.compression import csrf_token, init_compression, init_lite_mode
+from app.utils.recommend import init_recommendations
+from app.utils.view_counter import init_view_counter
+from app.utils.autocomplete import init_autocomplete
+from app.utils.jobs import init_scheduler
+from app.utils.images import init_images
+from app.utils.profiler import init_profiler
+from app.utils.load_shedding import configure_pool_timing, init_load_shedding
 import os
 from dotenv import load_dotenv
-from flask_wtf.csrf import generate_csrf
-from flask import render_template
+from flask import render_template, request
 
 def create_app():
     # Load .env variables
@@ -31,14 +41,116 @@ def create_app():
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME', '')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD', '')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'Kelab Petani <no-reply@kelabpetani.local>')
+    # Metrics (Prometheus text format at /metrics, aggregated across workers via METRICS_DIR)
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.getenv('METRICS_FLUSH_INTERVAL', '1.0'))
+    # Worker boot: compiled templates are cached on disk and shared by all workers
+    app.config['JINJA_BYTECODE_CACHE'] = os.getenv('JINJA_BYTECODE_CACHE', 'true').lower() == 'true'
+    app.config['JINJA_CACHE_DIR'] = os.getenv('JINJA_CACHE_DIR') or os.path.join(app.instance_path, 'jinja-cache')
+    app.config['WARMUP_ON_START'] = os.getenv('WARMUP_ON_START', 'false').lower() == 'true'
+    app.config['WARMUP_DB_CONNECTIONS'] = int(os.getenv('WARMUP_DB_CONNECTIONS', '1'))
+    app.config['WARMUP_OAUTH'] = os.getenv('WARMUP_OAUTH', 'false').lower() == 'true'
+    # Template fragment cache ({% cache %} blocks): memory (per worker), filesystem (shared) or none
+    app.config['FRAGMENT_CACHE'] = os.getenv('FRAGMENT_CACHE', 'memory').lower()
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.getenv('FRAGMENT_CACHE_SIZE', '5000'))
+    app.config['FRAGMENT_CACHE_DIR'] = os.getenv('FRAGMENT_CACHE_DIR') or os.path.join(app.instance_path, 'fragment-cache')
+    # Response compression (gzip, plus brotli when installed) for HTML/JSON/text responses
+    app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', '6'))
+    app.config['COMPRESS_BR_QUALITY'] = int(os.getenv('COMPRESS_BR_QUALITY', '4'))
+    # Streamed rendering for long list pages (admin, my listings, orders)
+    app.config['STREAM_TEMPLATES'] = os.getenv('STREAM_TEMPLATES', 'true').lower() == 'true'
+    app.config['STREAM_YIELD_PER'] = int(os.getenv('STREAM_YIELD_PER', '200'))
+    app.config['STREAM_CHUNK_SIZE'] = int(os.getenv('STREAM_CHUNK_SIZE', '8192'))
+    # Pawah "for you" recommendations
+    app.config['RECOMMEND_REFRESH_SECONDS'] = float(os.getenv('RECOMMEND_REFRESH_SECONDS', '5'))
+    app.config['RECOMMEND_LIMIT'] = int(os.getenv('RECOMMEND_LIMIT', '24'))
+    # Pawah profit-share simulator
+    app.config['SIMULATION_SCENARIOS'] = int(os.getenv('SIMULATION_SCENARIOS', '100000'))
+    # Write-behind listing view counters
+    app.config['VIEW_COUNTS_ENABLED'] = os.getenv('VIEW_COUNTS_ENABLED', 'true').lower() == 'true'
+    app.config['VIEW_FLUSH_SECONDS'] = float(os.getenv('VIEW_FLUSH_SECONDS', '5'))
+    app.config['VIEW_FLUSH_EVENTS'] = int(os.getenv('VIEW_FLUSH_EVENTS', '500'))
+    app.config['VIEW_DEDUPE_SECONDS'] = float(os.getenv('VIEW_DEDUPE_SECONDS', '1800'))
+    # Pending orders hold their stock this long before the sweep cancels them
+    app.config['STOCK_HOLD_HOURS'] = float(os.getenv('STOCK_HOLD_HOURS', '48'))
+    # Product image uploads: content-addressed files under UPLOAD_DIR, variants made in a process pool
+    app.config['UPLOAD_DIR'] = os.getenv('UPLOAD_DIR') or os.path.join(app.instance_path, 'uploads')
+    app.config['IMAGE_MAX_BYTES'] = int(os.getenv('IMAGE_MAX_BYTES', str(8 * 1024 * 1024)))
+    app.config['IMAGE_MAX_PIXELS'] = int(os.getenv('IMAGE_MAX_PIXELS', '40000000'))
+    app.config['IMAGE_WIDTHS'] = tuple(int(w) for w in os.getenv('IMAGE_WIDTHS', '320,640,1024').split(','))
+    app.config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', '2'))
+    app.config['IMAGE_PROCESSING'] = os.getenv('IMAGE_PROCESSING', 'pool')  # pool | job
+    # JSON API (/api/v1): default and largest page size
+    app.config['API_PAGE_SIZE'] = int(os.getenv('API_PAGE_SIZE', '20'))
+    app.config['API_MAX_PAGE_SIZE'] = int(os.getenv('API_MAX_PAGE_SIZE', '100'))
+    # Delta sync API: rows per page, and how far behind now cursors stop (covers clock skew and slow commits)
+    app.config['SYNC_PAGE_SIZE'] = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+    app.config['SYNC_SETTLE_SECONDS'] = float(os.getenv('SYNC_SETTLE_SECONDS', '30'))
+    # Closed orders untouched this long move to archived_orders (0 disables the archive job)
+    app.config['ORDER_ARCHIVE_MONTHS'] = float(os.getenv('ORDER_ARCHIVE_MONTHS', '6'))
+    # Background jobs: every worker runs the scheduler loop, the holder of a DB lease runs the jobs
+    app.config['JOBS_ENABLED'] = os.getenv('JOBS_ENABLED', 'true').lower() == 'true'
+    app.config['JOBS_LEASE_SECONDS'] = float(os.getenv('JOBS_LEASE_SECONDS', '30'))
+    app.config['JOBS_TICK_SECONDS'] = float(os.getenv('JOBS_TICK_SECONDS', '1'))
+    app.config['JOBS_HISTORY_DAYS'] = int(os.getenv('JOBS_HISTORY_DAYS', '30'))
+    # Load shedding: refuse low-priority requests with 503 when queue time or DB pool waits pass their targets
+    app.config['LOAD_SHED_ENABLED'] = os.getenv('LOAD_SHED_ENABLED', 'true').lower() == 'true'
+    app.config['LOAD_SHED_QUEUE_HEADER'] = os.getenv('LOAD_SHED_QUEUE_HEADER', '')
+    app.config['LOAD_SHED_QUEUE_TARGET_MS'] = float(os.getenv('LOAD_SHED_QUEUE_TARGET_MS', '200'))
+    app.config['LOAD_SHED_POOL_TARGET_MS'] = float(os.getenv('LOAD_SHED_POOL_TARGET_MS', '100'))
+    app.config['LOAD_SHED_NORMAL_FACTOR'] = float(os.getenv('LOAD_SHED_NORMAL_FACTOR', '3'))
+    app.config['LOAD_SHED_HALF_LIFE'] = float(os.getenv('LOAD_SHED_HALF_LIFE', '2'))
+    app.config['LOAD_SHED_RETRY_AFTER'] = int(os.getenv('LOAD_SHED_RETRY_AFTER', '5'))
+    # Sampling profiler: admins profile a request with a signed link, or a fraction of all traffic is profiled
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', 'true').lower() == 'true'
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    app.config['PROFILE_INTERVAL_MS'] = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+    app.config['PROFILE_MAX_SECONDS'] = float(os.getenv('PROFILE_MAX_SECONDS', '30'))
+    app.config['PROFILE_LINK_SECONDS'] = int(os.getenv('PROFILE_LINK_SECONDS', '3600'))
+    app.config['PROFILE_KEEP'] = int(os.getenv('PROFILE_KEEP', '500'))
+    # Near-duplicate listings: new and edited listings at least this similar (Jaccard, 0..1) to a live one are flagged
+    app.config['DUPLICATE_THRESHOLD'] = float(os.getenv('DUPLICATE_THRESHOLD', '0.6'))
+    # Moderation queue: optional fast lane approving clean listings from sellers with a clean record
+    app.config['MODERATION_FAST_LANE'] = os.getenv('MODERATION_FAST_LANE', 'false').lower() == 'true'
+    app.config['MODERATION_TRUSTED_APPROVALS'] = int(os.getenv('MODERATION_TRUSTED_APPROVALS', '5'))
+    app.config['MODERATION_TRUST_DAYS'] = int(os.getenv('MODERATION_TRUST_DAYS', '180'))
+    app.config['MODERATION_QUEUE_SIZE'] = int(os.getenv('MODERATION_QUEUE_SIZE', '50'))
+    # Search autocomplete: prefix index snapshot shared by all workers via AUTOCOMPLETE_DIR
+    app.config['AUTOCOMPLETE_DIR'] = os.getenv('AUTOCOMPLETE_DIR') or os.path.join(app.instance_path, 'autocomplete')
+    app.config['AUTOCOMPLETE_MERGE_SECONDS'] = float(os.getenv('AUTOCOMPLETE_MERGE_SECONDS', '10'))
+    configure_template_cache(app)
+    init_fragment_cache(app)
+    configure_pool_timing(app)
 
     # Initialize database
     db.init_app(app)
 
+    # Metrics hooks go before the limiter so rejected requests are timed too
+    init_metrics(app)
+    # Shedding runs next: refused requests are still counted, and cost nothing else
+    init_load_shedding(app)
+    # Profiler hooks come next so the profile covers the rest of the request pipeline
+    init_profiler(app)
+
     # CSRF Protection
     CSRFProtect(app)
-    # Expose csrf_token() to templates
-    app.jinja_env.globals['csrf_token'] = generate_csrf
+    # Expose csrf_token() to templates (compression skips pages that reflect input next to it);
+    # CSRFProtect also injects its own through a context processor, which this one overrides
+    app.jinja_env.globals['csrf_token'] = csrf_token
+    app.context_processor(lambda: {'csrf_token': csrf_token})
+
+    # Compression, fingerprinted static assets and low-bandwidth mode
+    init_compression(app)
+    init_lite_mode(app)
+    init_recommendations(app)
+    init_view_counter(app)
+    init_autocomplete(app)
+    init_images(app)
+    init_scheduler(app)
 
     # Rate Limiting
     limiter.init_app(app)
@@ -52,9 +164,13 @@ def create_app():
     # Import and register routes
     from app.blueprint import main
     # Ensure route modules are imported so they register handlers on the blueprint
-    from app import routes_core, routes_marketplace, routes_orders, routes_pawah, routes_admin  # noqa: F401
+    from app import routes_core, routes_marketplace, routes_orders, routes_pawah, routes_admin, routes_ops, routes_prices, routes_sync, routes_api  # noqa: F401
     app.register_blueprint(main)
 
+    # CLI commands (flask --app wsgi <command>)
+    from app.cli import register_cli
+    register_cli(app)
+
     # Error handlers
     @app.errorhandler(403)
     def forbidden(_e):
@@ -66,6 +182,7 @@ def create_app():
 
     @app.errorhandler(429)
     def ratelimit(_e):
+        metrics.inc('http_rate_limited_total', endpoint=request.url_rule.endpoint if request.url_rule else 'unmatched')
         return render_template('429.html'), 429
 
     @app.errorhandler(500)
@@ -0,0 +1,269 @@
+import time
+
+import click
+from flask import Flask
+from flask.cli import AppGroup
+
+from app.extensions import db
+
+
+def register_cli(app: Flask):
+    @app.cli.command('seed')
+    @click.option('--users', default=5000, show_default=True)
+    @click.option('--products', default=100_000, show_default=True)
+    @click.option('--pawah', default=20_000, show_default=True)
+    @click.option('--orders', default=50_000, show_default=True)
+    @click.option('--messages', default=1_000_000, show_default=True)
+    @click.option('--audit-logs', default=500_000, show_default=True)
+    @click.option('--seed', default=42, show_default=True, help='RNG seed for reproducible datasets')
+    @click.option('--chunk-size', default=5000, show_default=True)
+    @click.option('--create-tables', is_flag=True, help='Run db.create_all() first (fresh benchmark DBs)')
+    def seed_command(users, products, pawah, orders, messages, audit_logs, seed, chunk_size, create_tables):
+        """Bulk-insert a synthetic dataset with skewed sellers and categories."""
+        from app.utils.seed import seed_dataset
+        if create_tables:
+            db.create_all()
+        started = time.perf_counter()
+        seed_dataset(users=users, products=products, pawah=pawah, orders=orders, messages=messages,
+                     audit_logs=audit_logs, seed=seed, chunk_size=chunk_size, echo=click.echo)
+        click.echo(f'done in {time.perf_counter() - started:.1f}s')
+
+    @app.cli.command('import-products')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--seller-email', required=True, help='Owner of the imported products')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Default: from file extension')
+    @click.option('--batch-size', default=1000, show_default=True)
+    @click.option('--dry-run', is_flag=True, help='Validate only, insert nothing')
+    def import_products_command(path, seller_email, fmt, batch_size, dry_run):
+        """Bulk-import products from a CSV or JSON file into the moderation queue."""
+        from app.models import User
+        from app.utils.product_import import detect_format, import_products
+        seller = User.query.filter_by(email=seller_email).first()
+        if not seller:
+            raise click.ClickException(f'No user with email {seller_email}')
+        with open(path, 'rb') as fh:
+            result = import_products(fh, fmt or detect_format(path), seller_id=seller.id,
+                                     batch_size=batch_size, dry_run=dry_run)
+        for row_number, message in result.errors:
+            click.echo(f'row {row_number if row_number is not None else "-"}: {message}', err=True)
+        verb = 'validated' if dry_run else 'imported'
+        click.echo(f'{result.imported} {verb}, {result.skipped} rejected in {result.elapsed:.2f}s')
+
+    assets = AppGroup('assets', help='Static asset pipeline.')
+    app.cli.add_command(assets)
+
+    @assets.command('build')
+    def assets_build():
+        """Fingerprint static files and write .gz/.br variants next to them."""
+        from app.utils.compression import build_assets, brotli
+        if not app.static_folder:
+            raise click.ClickException('No static folder configured')
+        manifest = build_assets(app.static_folder)
+        for logical, hashed in sorted(manifest.items()):
+            click.echo(f'{logical} -> {hashed}')
+        if brotli is None:
+            click.echo('brotli not installed: only .gz variants written', err=True)
+
+    geo = AppGroup('geo', help='Location gazetteer.')
+    app.cli.add_command(geo)
+
+    @geo.command('backfill')
+    @click.option('--all', 'redo', is_flag=True, help='Re-resolve rows that already have coordinates')
+    def geo_backfill(redo):
+        """Resolve listing locations against the gazetteer and fill coordinates."""
+        from app.models import Product, PawahProject
+        from app.utils.geo import geo_fields
+        for model in (Product, PawahProject):
+            query = db.session.query(model.location).filter(model.location.isnot(None))
+            if not redo:
+                query = query.filter(model.geo_cell.is_(None))
+            resolved = unknown = 0
+            # One UPDATE per distinct spelling; listings share a small set of place names
+            for (text,) in query.distinct().all():
+                fields = geo_fields(text)
+                if fields['geo_cell'] is None:
+                    unknown += 1
+                    continue
+                resolved += db.session.execute(
+                    db.update(model).where(model.location == text).values(**fields)
+                ).rowcount
+            db.session.commit()
+            click.echo(f'{model.__tablename__}: {resolved} rows geocoded, {unknown} unrecognised place names')
+
+    seller_stats = AppGroup('seller-stats', help='Denormalized seller counters.')
+    app.cli.add_command(seller_stats)
+
+    @seller_stats.command('reconcile')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Seller ids per transaction')
+    @click.option('--dry-run', is_flag=True, help='Report drift without correcting it')
+    def seller_stats_reconcile(chunk_size, dry_run):
+        """Recompute seller stats from products, orders and messages and fix drift."""
+        from app.utils.seller_stats import reconcile
+        result = reconcile(chunk_size=chunk_size, fix=not dry_run)
+        for seller_id, have, want in result.samples:
+            click.echo(f'seller {seller_id}: stored {have} expected {want}')
+        verb = 'drifted' if dry_run else 'corrected'
+        click.echo(f'{result.sellers} sellers checked, {result.drifted} {verb} in {result.elapsed:.2f}s')
+
+    prices = AppGroup('prices', help='Price history and market price index.')
+    app.cli.add_command(prices)
+
+    @prices.command('backfill')
+    def prices_backfill():
+        """Record the current price of listed products that have no history yet."""
+        from app.utils.price_index import backfill
+        click.echo(f'{backfill()} prices recorded')
+
+    @prices.command('rebuild')
+    @click.option('--weeks', default=26, show_default=True, help='Recent weeks to recompute from the history')
+    def prices_rebuild(weeks):
+        """Recompute the weekly price histograms from the (uncompacted) history."""
+        from datetime import date, timedelta
+        from app.utils.price_index import rebuild
+        n = rebuild(date.today() - timedelta(weeks=weeks - 1))
+        click.echo(f'{n} histogram buckets rebuilt for the last {weeks} weeks')
+
+    @prices.command('compact')
+    @click.option('--keep-days', default=182, show_default=True, help='Raw price history to keep')
+    @click.option('--keep-weeks', default=156, show_default=True, help='Weekly aggregates to keep')
+    def prices_compact(keep_days, keep_weeks):
+        """Drop raw price history already folded into the weekly aggregates."""
+        from app.utils.price_index import compact
+        result = compact(keep_days=keep_days, keep_weeks=keep_weeks)
+        click.echo(f'{result.history} history rows and {result.buckets} aggregate rows removed in {result.elapsed:.2f}s')
+
+    holds = AppGroup('holds', help='Stock held by pending orders.')
+    app.cli.add_command(holds)
+
+    @holds.command('sweep')
+    @click.option('--batch-size', default=1000, show_default=True, help='Orders released per transaction')
+    def holds_sweep(batch_size):
+        """Cancel pending orders whose stock hold has expired and restock their products."""
+        from app.utils.stock_holds import release_expired
+        result = release_expired(batch_size=batch_size)
+        click.echo(f'{result.orders} orders released ({result.units} units restocked) in {result.elapsed:.2f}s')
+
+    @holds.command('adopt')
+    def holds_adopt():
+        """Give pending orders from before stock holds an expiry (now + STOCK_HOLD_HOURS)."""
+        from app.utils.stock_holds import adopt_legacy
+        click.echo(f'{adopt_legacy()} pending orders now expire')
+
+    orders = AppGroup('orders', help='Order maintenance.')
+    app.cli.add_command(orders)
+
+    @orders.command('archive')
+    @click.option('--months', type=float, default=None, help='Closed for at least this long (default: ORDER_ARCHIVE_MONTHS)')
+    @click.option('--batch-size', default=500, show_default=True, help='Orders moved per transaction')
+    @click.option('--dry-run', is_flag=True, help='Only count the orders that would move')
+    def orders_archive(months, batch_size, dry_run):
+        """Move long-closed orders, their messages and audit trail to archived_orders."""
+        from app.utils.archive import archive_closed, shrink_report
+        months = app.config['ORDER_ARCHIVE_MONTHS'] if months is None else months
+        result = archive_closed(months=months, batch_size=batch_size, dry_run=dry_run)
+        if dry_run:
+            click.echo(f'{result.orders} orders would be archived')
+            return
+        for line in shrink_report(result):
+            click.echo(line)
+
+    images = AppGroup('images', help='Uploaded product images.')
+    app.cli.add_command(images)
+
+    @images.command('process')
+    @click.option('--retry-failed', is_flag=True, help='Also retry images whose variants failed')
+    @click.option('--limit', default=1000, show_default=True)
+    def images_process(retry_failed, limit):
+        """Make the resized variants of images still waiting for them."""
+        from app.utils.images import enabled, process_pending
+        if not enabled():
+            raise click.ClickException('Pillow is not installed')
+        started = time.perf_counter()
+        done, failed = process_pending(limit=limit, retry_failed=retry_failed)
+        click.echo(f'{done} images processed, {failed} failed in {time.perf_counter() - started:.2f}s')
+
+    duplicates = AppGroup('duplicates', help='Near-duplicate listing index.')
+    app.cli.add_command(duplicates)
+
+    @duplicates.command('rebuild')
+    @click.option('--kind', type=click.Choice(['product', 'pawah']), multiple=True, help='Default: both')
+    @click.option('--batch-size', default=2000, show_default=True, help='Listings indexed per transaction')
+    def duplicates_rebuild(kind, batch_size):
+        """Index every live listing, then re-check the ones awaiting moderation."""
+        from app.utils.duplicates import rebuild
+        for name in kind or ('product', 'pawah'):
+            started = time.perf_counter()
+            indexed, pending, flagged = rebuild(name, batch_size=batch_size, echo=click.echo)
+            click.echo(f'{name}: {indexed} listings indexed, {flagged} of {pending} pending flagged '
+                       f'in {time.perf_counter() - started:.2f}s')
+
+    moderation = AppGroup('moderation', help='Listing moderation queue.')
+    app.cli.add_command(moderation)
+
+    @moderation.command('rescore')
+    @click.option('--kind', type=click.Choice(['product', 'pawah']), multiple=True, help='Default: both')
+    def moderation_rescore(kind):
+        """Re-score every listing awaiting review."""
+        from app.utils.moderation import rescore
+        for name in kind or ('product', 'pawah'):
+            click.echo(f'{name}: {rescore(name)} listings re-scored')
+
+    @moderation.command('report')
+    @click.option('--days', default=30, show_default=True, help='Approvals in this many days')
+    def moderation_report(days):
+        """Median and p90 time from submission to approval."""
+        from app.models import PawahProject, Product
+        from app.utils.moderation import approval_latency, pending
+        for name, model in (('product', Product), ('pawah', PawahProject)):
+            latency = approval_latency(name, days=days)
+            waiting = pending(model).count()
+            if not latency.n:
+                click.echo(f'{name}: no approvals in {days} days, {waiting} waiting')
+                continue
+            click.echo(f'{name}: median {latency.median / 3600:.1f}h, p90 {latency.p90 / 3600:.1f}h over '
+                       f'{latency.n} approvals ({latency.fast} fast lane), {waiting} waiting')
+
+    jobs = AppGroup('jobs', help='Scheduled background jobs.')
+    app.cli.add_command(jobs)
+
+    @jobs.command('run')
+    def jobs_run():
+        """Run the scheduler in the foreground (use with JOBS_ENABLED=false on the web workers)."""
+        from app.utils.jobs import scheduler
+        click.echo(f'scheduler {scheduler.holder}: {len(scheduler.jobs)} jobs, waiting for the lease')
+        scheduler.run_forever()
+
+    @jobs.command('list')
+    def jobs_list():
+        """Registered jobs with their last run."""
+        from app.utils.jobs import job_overview
+        for job, run, due in job_overview():
+            last = f'{run.status} at {run.started_at:%Y-%m-%d %H:%M:%S}' if run else 'never run'
+            click.echo(f'{job.name:<24} every {job.interval:>7.0f}s  {last}  next ~{due:%Y-%m-%d %H:%M:%S}' if due
+                       else f'{job.name:<24} every {job.interval:>7.0f}s  {last}')
+
+    @jobs.command('run-once')
+    @click.argument('name')
+    def jobs_run_once(name):
+        """Run one job now, outside the schedule and without the lease."""
+        from app.utils.jobs import scheduler
+        if name not in scheduler.jobs:
+            raise click.BadParameter(f"unknown job; choose from {', '.join(sorted(scheduler.jobs))}")
+        status, detail = scheduler.run_now(name)
+        click.echo(f'{name}: {status}' + (f' ({detail})' if detail else ''))
+
+    autocomplete = AppGroup('autocomplete', help='Search autocomplete index.')
+    app.cli.add_command(autocomplete)
+
+    @autocomplete.command('build')
+    def autocomplete_build():
+        """Rebuild the autocomplete snapshot from the listing tables."""
+        from app.utils.autocomplete import autocomplete_index
+        if not autocomplete_index.directory:
+            raise click.ClickException('AUTOCOMPLETE_DIR is not usable; see the warning above')
+        started = time.perf_counter()
+        n = autocomplete_index.rebuild()
+        if n is None:
+            click.echo('Another process is writing the snapshot; try again shortly')
+            return
+        click.echo(f'{n} index entries written to {autocomplete_index.path} in {time.perf_counter() - started:.2f}s')
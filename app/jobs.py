@@ -0,0 +1,54 @@
+"""Built-in scheduled jobs (see app/utils/jobs.py). Each is safe to re-run after a crash or timeout."""
+from flask import current_app
+
+from app.utils.jobs import prune_runs, scheduler
+
+
+@scheduler.job('holds.sweep', interval=300, timeout=120)
+def sweep_stock_holds():
+    from app.utils.stock_holds import release_expired
+    result = release_expired()
+    return f'{result.orders} orders released, {result.units} units restocked'
+
+
+@scheduler.job('seller_stats.reconcile', interval=24 * 3600, timeout=3600, jitter=3600)
+def reconcile_seller_stats():
+    from app.utils.seller_stats import reconcile
+    result = reconcile()
+    return f'{result.sellers} sellers checked, {result.drifted} corrected'
+
+
+@scheduler.job('prices.compact', interval=24 * 3600, timeout=1800, jitter=3600)
+def compact_prices():
+    from app.utils.price_index import compact
+    result = compact()
+    return f'{result.history} history rows, {result.buckets} aggregate rows removed'
+
+
+@scheduler.job('orders.archive', interval=24 * 3600, timeout=3600, jitter=3600)
+def archive_orders():
+    months = current_app.config.get('ORDER_ARCHIVE_MONTHS', 6)
+    if not months:
+        return 'disabled (ORDER_ARCHIVE_MONTHS=0)'
+    from app.utils.archive import archive_closed, shrink_report
+    return '\n'.join(shrink_report(archive_closed(months=months)))
+
+
+@scheduler.job('images.variants', interval=60, timeout=900)
+def make_image_variants():
+    from app.utils.images import process_pending
+    # In pool mode uploads are handled as they arrive; this only catches ones a restart dropped
+    older_than = 300 if current_app.config.get('IMAGE_PROCESSING') == 'pool' else None
+    done, failed = process_pending(older_than=older_than)
+    return f'{done} images processed, {failed} failed'
+
+
+@scheduler.job('profiles.prune', interval=3600, timeout=300, jitter=600)
+def prune_profiles():
+    from app.utils.profiler import prune
+    return f"{prune(current_app.config.get('PROFILE_KEEP', 500))} request profiles removed"
+
+
+@scheduler.job('jobs.prune', interval=24 * 3600, timeout=600, jitter=3600)
+def prune_job_runs():
+    return f"{prune_runs(current_app.config.get('JOBS_HISTORY_DAYS', 30))} job runs removed"
@@ -40,7 +40,13 @@ class Product(db.Model):
     quantity = db.Column(db.Integer, default=1)
     category = db.Column(db.String(50), nullable=True)
     image_url = db.Column(db.String(255), nullable=True)
+    # Uploaded image (app/utils/images.py): content hash, and the variant widths once generated
+    image_key = db.Column(db.String(64), nullable=True, index=True)
+    image_widths = db.Column(db.String(40), nullable=True)
     location = db.Column(db.String(100), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.Integer, nullable=True)  # app.utils.geo.cell_of(latitude, longitude)
     is_active = db.Column(db.Boolean, default=True)
     is_approved = db.Column(db.Boolean, default=True)
     unit = db.Column(db.String(50), nullable=True)
@@ -54,8 +60,16 @@ class Product(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    seller = db.relationship('User', backref=db.backref('products', lazy=True))
+    seller = db.relationship('User', foreign_keys=[seller_id], backref=db.backref('products', lazy=True))
     reviewed_by = db.relationship('User', foreign_keys=[reviewed_by_id])
+    # Closest existing listing found at submission (app/utils/duplicates.py), for moderators
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
+    duplicate_score = db.Column(db.Float, nullable=True)  # Jaccard similarity of the two texts (0..1)
+    duplicate_of = db.relationship('Product', remote_side=[id], foreign_keys=[duplicate_of_id])
+    # Moderation queue (app/utils/moderation.py): risk 0..100 scored on submission, lowest reviewed first
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    triage_score = db.Column(db.SmallInteger, nullable=False, default=50, server_default='50')
+    triage_flags = db.Column(db.String(100), nullable=True)  # comma-separated moderation.FLAG_LABELS keys
 
     def __repr__(self):
         return f'<Product {self.title}>'
@@ -70,7 +84,10 @@ class Order(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=1)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, paid, shipped, completed, cancelled
+    # Set while a pending order holds stock; cleared when it leaves pending (app/utils/stock_holds.py)
+    hold_expires_at = db.Column(db.DateTime, nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     buyer = db.relationship('User', backref=db.backref('orders', lazy=True))
     product = db.relationship('Product', backref=db.backref('orders', lazy=True))
@@ -87,6 +104,9 @@ class PawahProject(db.Model):
     description = db.Column(db.Text, nullable=True)
     crop_type = db.Column(db.String(100), nullable=False)
     location = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.Integer, nullable=True)
     duration_months = db.Column(db.Integer, nullable=False)
     capital_required = db.Column(db.Numeric(12, 2), nullable=False)
     owner_share_percent = db.Column(db.Integer, nullable=False, default=50)
@@ -106,6 +126,12 @@ class PawahProject(db.Model):
     owner = db.relationship('User', foreign_keys=[owner_id], backref=db.backref('pawah_projects_owned', lazy=True))
     farmer = db.relationship('User', foreign_keys=[farmer_id], backref=db.backref('pawah_projects_accepted', lazy=True))
     reviewed_by = db.relationship('User', foreign_keys=[reviewed_by_id])
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('pawah_projects.id'), nullable=True)
+    duplicate_score = db.Column(db.Float, nullable=True)
+    duplicate_of = db.relationship('PawahProject', remote_side=[id], foreign_keys=[duplicate_of_id])
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    triage_score = db.Column(db.SmallInteger, nullable=False, default=50, server_default='50')
+    triage_flags = db.Column(db.String(100), nullable=True)
 
     def __repr__(self):
         return f'<PawahProject {self.title}>'
@@ -143,4 +169,190 @@ class AuditLog(db.Model):
     actor = db.relationship('User')
 
     def __repr__(self):
-        return f'<AuditLog {self.entity_type}:{self.entity_id} {self.action}>'
\ No newline at end of file
+        return f'<AuditLog {self.entity_type}:{self.entity_id} {self.action}>'
+
+class SellerStats(db.Model):
+    """Per-seller counters kept in step with their source rows (see app/utils/seller_stats.py)."""
+    __tablename__ = 'seller_stats'
+
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    products_active = db.Column(db.Integer, nullable=False, default=0)  # active and approved
+    orders_completed = db.Column(db.Integer, nullable=False, default=0)
+    responses = db.Column(db.Integer, nullable=False, default=0)  # orders the seller has replied on
+    response_seconds = db.Column(db.BigInteger, nullable=False, default=0)  # sum of first-reply delays
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def avg_response_seconds(self):
+        return self.response_seconds / self.responses if self.responses else None
+
+    def __repr__(self):
+        return f'<SellerStats {self.seller_id}>'
+
+
+class ListingView(db.Model):
+    """View counts per listing, written in batches by app/utils/view_counter.py."""
+    __tablename__ = 'listing_views'
+
+    kind = db.Column(db.String(20), primary_key=True)  # 'product' or 'pawah'
+    entity_id = db.Column(db.Integer, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ListingView {self.kind}:{self.entity_id} {self.views}>'
+
+
+class PriceHistory(db.Model):
+    """Asking prices as listed over time (appended on create, edit and import; see app/utils/price_index.py)."""
+    __tablename__ = 'price_history'
+    __table_args__ = (
+        db.Index('ix_price_history_product_id', 'product_id', 'id'),
+        db.Index('ix_price_history_recorded_at', 'recorded_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    # Copied from the product so later edits do not rewrite the history
+    category = db.Column(db.String(50), nullable=False, default='')
+    location = db.Column(db.String(100), nullable=False, default='')
+    unit = db.Column(db.String(50), nullable=False, default='')
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    counted = db.Column(db.Boolean, nullable=False, default=False)  # included in price_buckets
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    product = db.relationship('Product')
+
+    def __repr__(self):
+        return f'<PriceHistory {self.product_id} {self.price}>'
+
+
+class PriceBucket(db.Model):
+    """Weekly price histogram per category x location x unit (log-spaced buckets, see app/utils/price_index.py)."""
+    __tablename__ = 'price_buckets'
+
+    category = db.Column(db.String(50), primary_key=True)
+    location = db.Column(db.String(100), primary_key=True)
+    unit = db.Column(db.String(50), primary_key=True)
+    week = db.Column(db.Date, primary_key=True)  # Monday
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PriceBucket {self.category}/{self.location}/{self.unit} {self.week} {self.bucket}:{self.count}>'
+
+
+class JobLease(db.Model):
+    """Time-limited lock row; the scheduler's leader holds 'scheduler' (see app/utils/jobs.py)."""
+    __tablename__ = 'job_leases'
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(120), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<JobLease {self.name} {self.holder}>'
+
+
+class JobRun(db.Model):
+    """One run of a scheduled job."""
+    __tablename__ = 'job_runs'
+    __table_args__ = (db.Index('ix_job_runs_job_started', 'job', 'started_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(50), nullable=False)
+    holder = db.Column(db.String(120), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, ok, failed, timeout, lost
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration = db.Column(db.Float, nullable=True)  # seconds
+    detail = db.Column(db.Text, nullable=True)  # result summary or error
+
+    def __repr__(self):
+        return f'<JobRun {self.job} {self.status}>'
+
+
+class ArchivedOrder(db.Model):
+    """A closed order moved out of the hot tables with its messages and audit trail (see app/utils/archive.py)."""
+    __tablename__ = 'archived_orders'
+    __table_args__ = (
+        db.Index('ix_archived_orders_buyer_created', 'buyer_id', 'created_at'),
+        db.Index('ix_archived_orders_seller_created', 'seller_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original order id
+    buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    total_price = db.Column(db.Numeric(10, 2), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # completed or cancelled
+    created_at = db.Column(db.DateTime, nullable=True)
+    closed_at = db.Column(db.DateTime, nullable=True)  # last status change or message
+    # The seller's first reply, kept for seller_stats.reconcile
+    first_reply_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON: messages and audit trail
+
+    buyer = db.relationship('User', foreign_keys=[buyer_id])
+    product = db.relationship('Product')
+
+    def __repr__(self):
+        return f'<ArchivedOrder {self.id}>'
+
+
+class ProductImage(db.Model):
+    """An uploaded image, stored once per content hash; its resized variants are made off the request path."""
+    __tablename__ = 'product_images'
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of the original
+    ext = db.Column(db.String(5), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # bytes
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, ready, failed
+    widths = db.Column(db.String(40), nullable=True)  # e.g. "320,640,1024"
+    variant_bytes = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    uploaded_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ProductImage {self.key[:12]} {self.status}>'
+
+
+class RequestProfile(db.Model):
+    """Sampled call stacks of one profiled request, stored as zlib-compressed collapsed stacks."""
+    __tablename__ = 'request_profiles'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    endpoint = db.Column(db.String(100), nullable=True)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.Integer, nullable=True)
+    trigger = db.Column(db.String(10), nullable=False)  # link, sample
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    duration = db.Column(db.Float, nullable=False)  # seconds, wall clock
+    cpu = db.Column(db.Float, nullable=True)  # seconds of CPU on the request thread
+    samples = db.Column(db.Integer, nullable=False)
+    interval_ms = db.Column(db.Float, nullable=False)
+    stacks = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'<RequestProfile {self.method} {self.path} {self.duration:.3f}s>'
+
+
+class ListingBand(db.Model):
+    """One LSH band of a listing's MinHash signature; listings sharing a bucket are duplicate candidates."""
+    __tablename__ = 'listing_bands'
+    __table_args__ = (db.Index('ix_listing_bands_entity', 'kind', 'entity_id', 'bucket'),)
+
+    kind = db.Column(db.String(10), primary_key=True)  # 'product' or 'pawah'
+    # Hash of the band number and its rows, so one (kind, bucket IN ...) lookup uses the primary key
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+
+    def __repr__(self):
+        return f'<ListingBand {self.kind} {self.entity_id} {self.bucket}>'
@@ -1,34 +1,54 @@
-from flask import render_template, redirect, url_for, session, flash, request
+import json
+
+from flask import Response, current_app, render_template, redirect, url_for, session, flash, request
 from sqlalchemy.orm import selectinload
 from datetime import datetime
 
 from app.blueprint import main
 from app.extensions import db, limiter
-from app.models import User, Product, PawahProject, AuditLog
+from app.models import User, Product, PawahProject, AuditLog, JobLease, JobRun, RequestProfile
+from app.utils.autocomplete import autocomplete_index, listing_terms
 from app.utils.decorators import admin_required
+from app.utils.jobs import LEADER_LEASE, job_overview
+from app.utils.metrics import metrics
 from app.utils.notifications import safe_send_email
+from app.utils.price_index import review as review_price
+from app.utils import moderation, profiler
+from app.utils.seller_stats import is_listed, listing_changed
+from app.utils.streaming import render_streamed
 
 
 @main.route('/admin')
 @admin_required
 def admin_home():
-    pending_products = Product.query.filter_by(is_approved=False).order_by(Product.created_at.desc()).all()
-    pending_projects = PawahProject.query.filter_by(is_approved=False).order_by(PawahProject.created_at.desc()).all()
-    return render_template('admin_home.html', pending_products=pending_products, pending_projects=pending_projects)
+    size = current_app.config['MODERATION_QUEUE_SIZE']
+    return render_template(
+        'admin_home.html',
+        pending_products=moderation.queue(Product, size), pending_projects=moderation.queue(PawahProject, size),
+        product_count=moderation.pending(Product).count(), project_count=moderation.pending(PawahProject).count(),
+        latency={kind: moderation.approval_latency(kind) for kind in ('product', 'pawah')},
+        flag_labels=moderation.FLAG_LABELS, fast_lane=current_app.config['MODERATION_FAST_LANE'],
+    )
 
 
 @main.route('/admin/products')
 @admin_required
 def admin_products():
-    products = Product.query.order_by(Product.created_at.desc()).all()
-    return render_template('admin_products.html', products=products)
+    per = current_app.config['STREAM_YIELD_PER']
+    products = (
+        Product.query.options(selectinload(Product.seller))
+        .order_by(Product.created_at.desc())
+        .yield_per(per)
+    )
+    return render_streamed('admin_products.html', products=products)
 
 
 @main.route('/admin/pawah')
 @admin_required
 def admin_pawah():
-    projects = PawahProject.query.order_by(PawahProject.created_at.desc()).all()
-    return render_template('admin_pawah.html', projects=projects)
+    per = current_app.config['STREAM_YIELD_PER']
+    projects = PawahProject.query.order_by(PawahProject.created_at.desc()).yield_per(per)
+    return render_streamed('admin_pawah.html', projects=projects)
 
 
 @main.route('/admin/products/<int:product_id>/approve', methods=['POST'])
@@ -40,6 +60,8 @@ def admin_approve_product(product_id):
     reason = request.form.get('reason', '').strip()
     user = User.query.get(session.get('user_id'))
     now = datetime.utcnow()
+    was_listed = is_listed(product)
+    terms = listing_terms(product)
 
     if approve:
         product.is_approved = True
@@ -54,7 +76,13 @@ def admin_approve_product(product_id):
 
     action = 'approve' if approve else 'reject'
     db.session.add(AuditLog(entity_type='product', entity_id=product.id, action=action, actor_id=(user.id if user else None), meta=(reason or None)))
+    listing_changed(product, was_listed)
+    review_price(product)
+    moderation.decided('product', product)
     db.session.commit()
+    autocomplete_index.log_changes(terms, listing_terms(product))
+    if approve:
+        metrics.inc('listings_approved_total', kind='product')
 
     # Notify seller
     seller = User.query.get(product.seller_id)
@@ -75,6 +103,7 @@ def admin_approve_pawah(project_id):
     reason = request.form.get('reason', '').strip()
     user = User.query.get(session.get('user_id'))
     now = datetime.utcnow()
+    terms = listing_terms(project)
 
     if approve:
         project.is_approved = True
@@ -89,7 +118,11 @@ def admin_approve_pawah(project_id):
 
     action = 'approve' if approve else 'reject'
     db.session.add(AuditLog(entity_type='pawah', entity_id=project.id, action=action, actor_id=(user.id if user else None), meta=(reason or None)))
+    moderation.decided('pawah', project)
     db.session.commit()
+    autocomplete_index.log_changes(terms, listing_terms(project))
+    if approve:
+        metrics.inc('listings_approved_total', kind='pawah')
 
     # Notify owner
     owner = User.query.get(project.owner_id)
@@ -119,6 +152,58 @@ def admin_logs():
 
     query = query.order_by(AuditLog.created_at.desc())
     pagination = db.paginate(query, page=page, per_page=20, error_out=False)
-    entity_types = ['order', 'pawah', 'product']
-    actions = ['status_change', 'approve', 'reject', 'accept']
+    entity_types = ['order', 'pawah', 'product', 'user']
+    actions = ['status_change', 'approve', 'reject', 'accept', 'bulk_import']
     return render_template('admin_logs.html', pagination=pagination, logs=pagination.items, entity_type=entity_type, action=action, actor_id=actor_id, entity_types=entity_types, actions=actions)
+
+
+@main.route('/admin/jobs')
+@admin_required
+def admin_jobs():
+    runs = JobRun.query.order_by(JobRun.started_at.desc()).limit(100).all()
+    lease = db.session.get(JobLease, LEADER_LEASE)
+    return render_template('admin_jobs.html', jobs=job_overview(), runs=runs, lease=lease)
+
+
+@main.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    path = request.args.get('path', '').strip()
+    link = error = None
+    if path:
+        if path.startswith('/') and not path.startswith('//'):
+            link = request.host_url.rstrip('/') + profiler.profile_link(path, session['user_id'])
+        else:
+            error = 'Laluan mesti bermula dengan / (contoh: /marketplace?category=Buah).'
+    return render_template('admin_profiles.html', profiles=profiler.recent(), path=path, link=link, error=error,
+                           enabled=current_app.config['PROFILING_ENABLED'],
+                           sample_rate=current_app.config['PROFILE_SAMPLE_RATE'],
+                           link_minutes=current_app.config['PROFILE_LINK_SECONDS'] // 60)
+
+
+@main.route('/admin/profiles/<int:profile_id>')
+@admin_required
+def admin_profile_detail(profile_id):
+    profile = RequestProfile.query.get_or_404(profile_id)
+    stacks = profiler.load_stacks(profile)
+    return render_template('admin_profile_detail.html', profile=profile, top=profiler.top_functions(stacks),
+                           stack_count=len(stacks))
+
+
+@main.route('/admin/profiles/<int:profile_id>/stacks.txt')
+@admin_required
+def admin_profile_collapsed(profile_id):
+    profile = RequestProfile.query.get_or_404(profile_id)
+    response = Response(profiler.collapsed_text(profile), mimetype='text/plain')
+    response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile.id}.txt'
+    return response
+
+
+@main.route('/admin/profiles/<int:profile_id>/speedscope.json')
+@admin_required
+def admin_profile_speedscope(profile_id):
+    profile = RequestProfile.query.get_or_404(profile_id)
+    body = json.dumps(profiler.speedscope(profile, profiler.load_stacks(profile)), separators=(',', ':'))
+    response = Response(body, mimetype='application/json')
+    response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile.id}.speedscope.json'
+    return response
@@ -0,0 +1,177 @@
+from urllib.parse import urlencode
+
+from flask import current_app, jsonify, request, session, url_for
+from sqlalchemy import or_, tuple_
+
+from app.blueprint import main
+from app.extensions import db, limiter
+from app.models import Message, Order, PawahProject, Product
+from app.utils import api_schema
+from app.utils.api_schema import ApiError, fields_param, serialize
+from app.utils.sync import BadCursor, decode_cursor, encode_cursor
+
+
+# ----------------------
+# Versioned JSON API (read-only)
+# ----------------------
+
+
+@main.errorhandler(ApiError)
+def api_error(e):
+    return jsonify(error=e.message), e.status
+
+
+def _limit():
+    page_size = current_app.config['API_PAGE_SIZE']
+    return min(max(request.args.get('limit', default=page_size, type=int), 1), current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def _user_id():
+    user_id = session.get('user_id')
+    if not user_id:
+        raise ApiError('Sila log masuk dahulu.', 401)
+    return user_id
+
+
+def _page(query, schema, endpoint, newest_first=True, **view_args):
+    """Serialize one keyset page of ``query`` in (created_at, id) order, with includes, cursor and ETag."""
+    model = schema.model
+    include = schema.parse_include(request.args.get('include'))
+    try:
+        after = decode_cursor(request.args.get('cursor', '').strip()).get('after')
+    except BadCursor:
+        raise ApiError('cursor tidak sah')
+    if after:
+        if newest_first:
+            query = query.filter(model.created_at <= after[0], tuple_(model.created_at, model.id) < tuple_(*after))
+        else:
+            query = query.filter(model.created_at >= after[0], tuple_(model.created_at, model.id) > tuple_(*after))
+    order = (model.created_at.desc(), model.id.desc()) if newest_first else (model.created_at, model.id)
+    limit = _limit()
+    names = fields_param(request.args, schema)
+    rows = (
+        query.options(schema.load_options(names, include, extra=('created_at',)))
+        .order_by(*order).limit(limit + 1).all()
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    data, included = serialize(schema, rows, request.args, include)
+    body = {'data': data}
+    if included:
+        body['included'] = included
+    if more:
+        cursor = encode_cursor({'after': [rows[-1].created_at.isoformat(), rows[-1].id]})
+        # Query args go through urlencode, not url_for kwargs: names like endpoint or _external must stay plain args
+        args = [(k, v) for k, v in request.args.items(multi=True) if k != 'cursor'] + [('cursor', cursor)]
+        body['links'] = {'next': f'{url_for(endpoint, **view_args)}?{urlencode(args)}'}
+    return _conditional(jsonify(body))
+
+
+def _one(schema, obj):
+    include = schema.parse_include(request.args.get('include'))
+    data, included = serialize(schema, [obj], request.args, include)
+    body = {'data': data[0]}
+    if included:
+        body['included'] = included
+    return _conditional(jsonify(body))
+
+
+def _conditional(response):
+    # Clients polling an unchanged page get a 304 without the body
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@main.route('/api/v1/products')
+@limiter.limit('120 per minute')
+def api_v1_products():
+    query = Product.query.filter(Product.is_active.is_(True), Product.is_approved.is_(True))
+    for arg in ('category', 'location'):
+        value = request.args.get(arg, '').strip()
+        if value:
+            query = query.filter(getattr(Product, arg) == value)
+    seller_id = request.args.get('seller_id', type=int)
+    if seller_id:
+        query = query.filter(Product.seller_id == seller_id)
+    return _page(query, api_schema.products, 'main.api_v1_products')
+
+
+@main.route('/api/v1/products/<int:product_id>')
+@limiter.limit('120 per minute')
+def api_v1_product(product_id):
+    product = db.session.get(Product, product_id)
+    if product is None or not (product.is_active and product.is_approved) and not (
+        session.get('user_id') == product.seller_id or session.get('is_admin')
+    ):
+        raise ApiError('tidak dijumpai', 404)
+    return _one(api_schema.products, product)
+
+
+@main.route('/api/v1/pawah')
+@limiter.limit('120 per minute')
+def api_v1_pawah_list():
+    query = PawahProject.query.filter(PawahProject.is_approved.is_(True))
+    for arg in ('status', 'crop_type', 'location'):
+        value = request.args.get(arg, '').strip()
+        if value:
+            query = query.filter(getattr(PawahProject, arg) == value)
+    return _page(query, api_schema.pawah, 'main.api_v1_pawah_list')
+
+
+@main.route('/api/v1/pawah/<int:project_id>')
+@limiter.limit('120 per minute')
+def api_v1_pawah(project_id):
+    project = db.session.get(PawahProject, project_id)
+    user_id = session.get('user_id')
+    if project is None or not project.is_approved and not (
+        session.get('is_admin') or (user_id and user_id in (project.owner_id, project.farmer_id))
+    ):
+        raise ApiError('tidak dijumpai', 404)
+    return _one(api_schema.pawah, project)
+
+
+def _own_order(order_id, user_id):
+    order = db.session.get(Order, order_id)
+    if order is None:
+        raise ApiError('tidak dijumpai', 404)
+    seller_id = db.session.query(Product.seller_id).filter(Product.id == order.product_id).scalar()
+    if user_id not in (order.buyer_id, seller_id):
+        raise ApiError('tidak dibenarkan', 403)
+    return order
+
+
+@main.route('/api/v1/orders')
+@limiter.limit('120 per minute')
+def api_v1_orders():
+    user_id = _user_id()
+    role = request.args.get('role', 'buyer')
+    if role == 'buyer':
+        query = Order.query.filter(Order.buyer_id == user_id)
+    elif role == 'seller':
+        query = Order.query.filter(Order.product_id.in_(db.session.query(Product.id).filter(Product.seller_id == user_id)))
+    elif role == 'any':
+        query = Order.query.filter(or_(
+            Order.buyer_id == user_id,
+            Order.product_id.in_(db.session.query(Product.id).filter(Product.seller_id == user_id)),
+        ))
+    else:
+        raise ApiError('role mesti buyer, seller atau any')
+    status = request.args.get('status', '').strip()
+    if status:
+        query = query.filter(Order.status == status)
+    return _page(query, api_schema.orders, 'main.api_v1_orders')
+
+
+@main.route('/api/v1/orders/<int:order_id>')
+@limiter.limit('120 per minute')
+def api_v1_order(order_id):
+    return _one(api_schema.orders, _own_order(order_id, _user_id()))
+
+
+@main.route('/api/v1/orders/<int:order_id>/messages')
+@limiter.limit('120 per minute')
+def api_v1_order_messages(order_id):
+    order = _own_order(order_id, _user_id())
+    query = Message.query.filter(Message.context_type == 'order', Message.context_id == order.id)
+    return _page(query, api_schema.messages, 'main.api_v1_order_messages', newest_first=False, order_id=order.id)
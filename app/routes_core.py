@@ -1,6 +1,8 @@
 from flask import render_template, redirect, url_for, session, flash, current_app
 from app.blueprint import main
-from app.models import User
+from app.extensions import db
+from app.models import User, SellerStats
+from app.utils.load_shedding import protect
 from app.oauth import init_oauth, handle_google_login, handle_google_callback, oauth
 
 
@@ -10,6 +12,7 @@ def home():
 
 
 @main.route('/login')
+@protect()
 def login():
     def get_google_client():
         client = oauth.create_client('google')
@@ -22,6 +25,7 @@ def login():
 
 
 @main.route('/auth/callback')
+@protect()
 def auth_callback():
     def get_google_client():
         client = oauth.create_client('google')
@@ -44,10 +48,11 @@ def profile():
         flash('User not found.', 'error')
         return redirect(url_for('main.home'))
 
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=user, seller_stats=db.session.get(SellerStats, user.id))
 
 
 @main.route('/logout')
+@protect()
 def logout():
     session.clear()
     flash('You have been logged out successfully.', 'success')
@@ -1,8 +1,19 @@
-from flask import render_template, redirect, url_for, session, flash, request, abort
+from flask import current_app, jsonify, render_template, redirect, url_for, session, flash, request, abort
 from app.blueprint import main
 from app.extensions import db, limiter
-from app.models import Product, Order
+from app.models import Product, Order, SellerStats
+from app.utils.autocomplete import FIELDS as AUTOCOMPLETE_FIELDS, autocomplete_index, listing_terms
 from app.utils.decorators import login_required
+from app.utils.metrics import metrics
+from app.utils.product_import import parse_product_fields, import_products, detect_format
+from app.utils.streaming import render_streamed
+from app.utils.load_shedding import protect
+from app.utils.geo import distances_km, near_from_args, paginate_nearest, resolve
+from app.utils.seller_stats import is_listed, listing_changed
+from app.utils.stock_holds import hold_expiry, release_expired, reserve
+from app.utils import duplicates, images, moderation
+from app.utils.view_counter import record_view, views_for
+from app.utils import price_index
 from decimal import Decimal
 from sqlalchemy import or_
 
@@ -25,7 +36,8 @@ def marketplace():
     if category:
         query = query.filter(Product.category == category)
     if location:
-        query = query.filter(Product.location == location)
+        place = resolve(location)
+        query = query.filter(Product.location == (place.name if place else location))
     if min_price:
         try:
             query = query.filter(Product.price >= Decimal(min_price))
@@ -37,21 +49,50 @@ def marketplace():
         except Exception:
             pass
 
-    query = query.order_by(Product.created_at.desc())
-    pagination = db.paginate(query, page=page, per_page=12, error_out=False)
+    near = near_from_args(request.args)
+    if near and near.lat is None:
+        flash(f'Lokasi "{near.text}" tidak dikenali.', 'error')
+        near = None
+    if near:
+        pagination = paginate_nearest(query, Product, near, page=page, per_page=12)
+    else:
+        query = query.order_by(Product.created_at.desc())
+        pagination = db.paginate(query, page=page, per_page=12, error_out=False)
+
+    market = []
+    if category:
+        market_location = (place.name if place else location) if location else None
+        market = price_index.market_by_unit(category, market_location)
 
     return render_template(
         'marketplace_list.html',
         pagination=pagination,
+        market=market,
         products=pagination.items,
         q=q,
         category=category,
         location=location,
         min_price=min_price,
         max_price=max_price,
+        near=near,
+        distances=distances_km(pagination.items, near) if near else {},
     )
 
 
+@main.route('/autocomplete')
+@limiter.limit('120 per minute')
+def autocomplete():
+    q = request.args.get('q', '').strip()[:100]
+    field = request.args.get('field') or None
+    if field is not None and field not in AUTOCOMPLETE_FIELDS:
+        return jsonify(error='field tidak sah'), 400
+    limit = min(max(request.args.get('limit', default=8, type=int), 1), 10)
+    response = jsonify(autocomplete_index.lookup(q, field, limit))
+    # Same prefix, same answer for everyone: let browsers and proxies keep it briefly
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
 @main.route('/marketplace/new', methods=['GET', 'POST'])
 def new_product():
     if 'user_id' not in session:
@@ -59,39 +100,41 @@ def new_product():
         return redirect(url_for('main.login'))
 
     if request.method == 'POST':
-        title = request.form.get('title', '').strip()
-        price = request.form.get('price', '').strip()
-        quantity = request.form.get('quantity', '1').strip()
-        description = request.form.get('description', '').strip()
-        category = request.form.get('category', '').strip()
-        image_url = request.form.get('image_url', '').strip()
-        location = request.form.get('location', '').strip()
-        unit = request.form.get('unit', '').strip()
-        min_order_qty = request.form.get('min_order_qty', '').strip()
-        contact_phone = request.form.get('contact_phone', '').strip()
-
-        if not title or not price:
-            flash('Tajuk dan harga diperlukan.', 'error')
+        values, error = parse_product_fields(request.form)
+        if error:
+            flash(error, 'error')
             return render_template('marketplace_new.html')
 
+        image = None
+        upload = request.files.get('image')
+        if upload and upload.filename:
+            try:
+                image = images.save_upload(upload, user_id=session['user_id'])
+            except images.UploadError as e:
+                flash(str(e), 'error')
+                return render_template('marketplace_new.html')
+
         try:
             product = Product(
-                title=title,
-                price=Decimal(price),
-                quantity=int(quantity or 1),
-                description=description,
-                category=category,
-                image_url=image_url or None,
-                location=location or None,
-                unit=unit or None,
-                min_order_qty=int(min_order_qty) if min_order_qty else None,
-                contact_phone=contact_phone or None,
+                **values,
                 is_approved=False,
                 seller_id=session['user_id']
             )
+            if image is not None:
+                images.attach(product, image)
             db.session.add(product)
+            price_index.record(product)
+            db.session.flush()
+            duplicates.check('product', [product])
+            fast = moderation.submit('product', product)
             db.session.commit()
-            flash('Produk dihantar untuk semakan admin. Ia akan dipaparkan selepas diluluskan.', 'success')
+            if image is not None:
+                images.schedule(image)
+            if fast:
+                autocomplete_index.log_changes([], listing_terms(product))
+                flash('Produk diterbitkan.', 'success')
+            else:
+                flash('Produk dihantar untuk semakan admin. Ia akan dipaparkan selepas diluluskan.', 'success')
             return redirect(url_for('main.marketplace'))
         except Exception:
             db.session.rollback()
@@ -101,7 +144,31 @@ def new_product():
     return render_template('marketplace_new.html')
 
 
+@main.route('/marketplace/import', methods=['GET', 'POST'])
+@login_required
+@limiter.limit('5 per minute', methods=['POST'])
+def product_import():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Sila pilih fail CSV atau JSON.', 'error')
+            return render_template('marketplace_import.html')
+        fmt = request.form.get('format') or detect_format(upload.filename)
+        if fmt not in ('csv', 'json'):
+            flash('Format fail tidak disokong.', 'error')
+            return render_template('marketplace_import.html')
+        result = import_products(upload.stream, fmt, seller_id=session['user_id'])
+        if result.imported:
+            flash(f'{result.imported} produk diimport dan dihantar untuk semakan admin.', 'success')
+        if result.errors:
+            flash(f'{result.skipped} baris tidak diimport.', 'error')
+        return render_template('marketplace_import.html', result=result)
+
+    return render_template('marketplace_import.html')
+
+
 @main.route('/marketplace/<int:product_id>', methods=['GET', 'POST'])
+@protect(methods=['POST'])
 @limiter.limit('10 per minute', methods=['POST'])
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
@@ -129,33 +196,31 @@ def product_detail(product_id):
             flash(f'Minimum pesanan ialah {product.min_order_qty}.', 'error')
             return redirect(url_for('main.product_detail', product_id=product.id))
 
+        # Holds that lapsed since the last sweep free their stock before we give up
+        if product.quantity is not None and product.quantity < qty and release_expired(product_id=product.id).orders:
+            db.session.refresh(product)
         if product.quantity is not None and product.quantity < qty:
             flash('Stok tidak mencukupi.', 'error')
             return redirect(url_for('main.product_detail', product_id=product.id))
 
         try:
             total_price = product.price * Decimal(qty)
-            # Atomic stock decrement when quantity-limited
-            if product.quantity is not None:
-                updated = (
-                    db.session.query(Product)
-                    .filter(Product.id == product.id, Product.quantity >= qty)
-                    .update({Product.quantity: Product.quantity - qty}, synchronize_session=False)
-                )
-                if updated == 0:
-                    db.session.rollback()
-                    flash('Stok tidak mencukupi.', 'error')
-                    return redirect(url_for('main.product_detail', product_id=product.id))
+            if product.quantity is not None and not reserve(product.id, qty):
+                db.session.rollback()
+                flash('Stok tidak mencukupi.', 'error')
+                return redirect(url_for('main.product_detail', product_id=product.id))
 
             order = Order(
                 buyer_id=session['user_id'],
                 product_id=product.id,
                 quantity=qty,
                 total_price=total_price,
-                status='pending'
+                status='pending',
+                hold_expires_at=hold_expiry() if product.quantity is not None else None,
             )
             db.session.add(order)
             db.session.commit()
+            metrics.inc('orders_created_total')
             flash('Pesanan dibuat. Anda boleh berhubung dengan penjual melalui halaman pesanan.', 'success')
             return redirect(url_for('main.order_detail', order_id=order.id))
         except Exception:
@@ -164,7 +229,17 @@ def product_detail(product_id):
 
         return redirect(url_for('main.product_detail', product_id=product.id))
 
-    return render_template('marketplace_detail.html', product=product)
+    seller_stats = db.session.get(SellerStats, product.seller_id)
+    views = None
+    if is_owner:
+        views = views_for('product', [product.id]).get(product.id, 0)
+    else:
+        record_view('product', product.id)
+    market, market_scope = price_index.market_for(product)
+    return render_template(
+        'marketplace_detail.html', product=product, seller_stats=seller_stats, views=views,
+        market=market, market_scope=market_scope, price_history=price_index.history_for(product.id, limit=10),
+    )
 
 
 @main.route('/marketplace/my')
@@ -174,9 +249,10 @@ def my_listings():
     products = (
         Product.query.filter_by(seller_id=user_id)
         .order_by(Product.created_at.desc())
-        .all()
+        .yield_per(current_app.config['STREAM_YIELD_PER'])
     )
-    return render_template('marketplace_my.html', products=products)
+    views = views_for('product', db.session.query(Product.id).filter(Product.seller_id == user_id).scalar_subquery())
+    return render_streamed('marketplace_my.html', products=products, views=views)
 
 
 @main.route('/marketplace/<int:product_id>/archive', methods=['POST'])
@@ -186,8 +262,12 @@ def product_archive(product_id):
     product = Product.query.get_or_404(product_id)
     if product.seller_id != session['user_id']:
         abort(403)
+    was_listed = is_listed(product)
+    terms = listing_terms(product)
     product.is_active = False
+    listing_changed(product, was_listed)
     db.session.commit()
+    autocomplete_index.log_changes(terms, listing_terms(product))
     flash('Produk diarkibkan.', 'success')
     return redirect(url_for('main.my_listings'))
 
@@ -199,8 +279,12 @@ def product_unarchive(product_id):
     product = Product.query.get_or_404(product_id)
     if product.seller_id != session['user_id']:
         abort(403)
+    was_listed = is_listed(product)
+    terms = listing_terms(product)
     product.is_active = True
+    listing_changed(product, was_listed)
     db.session.commit()
+    autocomplete_index.log_changes(terms, listing_terms(product))
     flash('Produk diaktifkan semula.', 'success')
     return redirect(url_for('main.my_listings'))
 
@@ -213,39 +297,56 @@ def product_edit(product_id):
         abort(403)
 
     if request.method == 'POST':
-        title = request.form.get('title', '').strip()
-        price = request.form.get('price', '').strip()
-        quantity = request.form.get('quantity', '').strip()
-        description = request.form.get('description', '').strip()
-        category = request.form.get('category', '').strip()
-        image_url = request.form.get('image_url', '').strip()
-        location = request.form.get('location', '').strip()
-        unit = request.form.get('unit', '').strip()
-        min_order_qty = request.form.get('min_order_qty', '').strip()
-        contact_phone = request.form.get('contact_phone', '').strip()
-
-        if not title or not price:
-            flash('Tajuk dan harga diperlukan.', 'error')
+        values, error = parse_product_fields(request.form)
+        if error:
+            flash(error, 'error')
             return render_template('marketplace_edit.html', product=product)
+        if not request.form.get('quantity', '').strip():
+            # A blank quantity on the edit form clears the stock limit
+            values['quantity'] = None
+        image_url = values.pop('image_url')
+
+        image = None
+        upload = request.files.get('image')
+        if upload and upload.filename:
+            try:
+                image = images.save_upload(upload, user_id=session['user_id'])
+            except images.UploadError as e:
+                flash(str(e), 'error')
+                return render_template('marketplace_edit.html', product=product)
 
         try:
-            product.title = title
-            product.price = Decimal(price)
-            product.quantity = int(quantity) if quantity != '' else None
-            product.description = description or None
-            product.category = category or None
-            product.image_url = image_url or None
-            product.location = location or None
-            product.unit = unit or None
-            product.min_order_qty = int(min_order_qty) if min_order_qty else None
-            product.contact_phone = contact_phone or None
+            was_listed = is_listed(product)
+            terms = listing_terms(product)
+            old_price = price_index.price_key(product)
+            for field, value in values.items():
+                setattr(product, field, value)
+            product.description = values['description'] or None
+            product.category = values['category'] or None
+            if image is not None:
+                images.attach(product, image)
+            elif image_url != product.image_url:
+                # Replaced (or removed) by an external URL
+                images.detach(product)
+                product.image_url = image_url
             product.is_approved = False
             product.rejection_reason = None
             product.approved_at = None
             product.reviewed_by_id = None
             product.reviewed_at = None
+            listing_changed(product, was_listed)
+            if price_index.price_key(product) != old_price:
+                price_index.record(product)
+            duplicates.check('product', [product])
+            fast = moderation.submit('product', product)
             db.session.commit()
-            flash('Produk dikemaskini dan dihantar untuk kelulusan semula.', 'success')
+            if image is not None:
+                images.schedule(image)
+            autocomplete_index.log_changes(terms, listing_terms(product))
+            if fast:
+                flash('Produk dikemaskini.', 'success')
+            else:
+                flash('Produk dikemaskini dan dihantar untuk kelulusan semula.', 'success')
             return redirect(url_for('main.my_listings'))
         except Exception:
             db.session.rollback()
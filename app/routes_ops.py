@@ -0,0 +1,21 @@
+import hmac
+
+from flask import Response, abort, current_app, request
+from app.blueprint import main
+from app.extensions import limiter
+from app.utils.load_shedding import protect
+from app.utils.metrics import metrics
+
+
+@main.route('/metrics')
+@protect()
+@limiter.exempt
+def metrics_endpoint():
+    # Route names and business counters are not public: no token, no endpoint
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or not metrics.enabled:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied, token):
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
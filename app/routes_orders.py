@@ -1,11 +1,17 @@
-from flask import render_template, redirect, url_for, session, flash, request, abort
+from flask import current_app, render_template, redirect, url_for, session, flash, request, abort
 from sqlalchemy.orm import selectinload
 from app.blueprint import main
 from app.extensions import db, limiter
-from app.models import User, Product, Order, AuditLog
+from app.models import User, Product, Order, AuditLog, Message
+from app.utils import archive
 from app.utils.decorators import login_required
+from app.utils.load_shedding import protect
 from app.utils.notifications import safe_send_email
+from app.utils.seller_stats import bump, response_seconds
+from app.utils.stock_holds import change_status
+from app.utils.streaming import render_streamed
 import bleach
+from datetime import datetime
 
 
 # ----------------------
@@ -33,29 +39,34 @@ ORDER_TRANSITIONS = {
 @login_required
 def orders_home():
     user_id = session['user_id']
+    per = current_app.config['STREAM_YIELD_PER']
     purchases = (
         Order.query.options(selectinload(Order.product))
         .filter_by(buyer_id=user_id)
         .order_by(Order.created_at.desc())
-        .all()
+        .yield_per(per)
     )
     sales = (
-        Order.query.options(selectinload(Order.product), selectinload(Order.buyer))
+        Order.query.options(selectinload(Order.buyer))
         .join(Product, Product.id == Order.product_id)
         .filter(Product.seller_id == user_id)
         .order_by(Order.created_at.desc())
-        .all()
+        .yield_per(per)
     )
-    return render_template('orders_list.html', purchases=purchases, sales=sales)
+    archived_purchases, archived_sales = archive.archived_for(user_id)
+    return render_streamed('orders_list.html', purchases=purchases, sales=sales,
+                           archived_purchases=archived_purchases, archived_sales=archived_sales)
 
 
 @main.route('/orders/<int:order_id>')
 @login_required
 def order_detail(order_id):
+    if Order.query.get(order_id) is None:
+        # Closed orders move to the archive after ORDER_ARCHIVE_MONTHS (app/utils/archive.py)
+        return _archived_order_detail(order_id)
     order, product = _ensure_order_access(order_id)
     buyer = User.query.get(order.buyer_id)
     seller = User.query.get(product.seller_id)
-    from app.models import Message
     messages = (
         Message.query.options(selectinload(Message.sender))
         .filter_by(context_type='order', context_id=order.id)
@@ -65,7 +76,21 @@ def order_detail(order_id):
     return render_template('order_detail.html', order=order, product=product, buyer=buyer, seller=seller, messages=messages)
 
 
+def _archived_order_detail(order_id):
+    order, messages, audit = archive.load(order_id)
+    if order is None:
+        abort(404)
+    user_id = session.get('user_id')
+    if user_id not in (order.buyer_id, order.seller_id):
+        abort(403)
+    buyer = User.query.get(order.buyer_id)
+    seller = User.query.get(order.seller_id)
+    return render_template('order_detail.html', order=order, product=order.product, buyer=buyer, seller=seller,
+                           messages=messages, audit=audit, archived=True)
+
+
 @main.route('/orders/<int:order_id>/status', methods=['POST'])
+@protect()
 @login_required
 @limiter.limit('20 per minute', methods=['POST'])
 def order_change_status(order_id):
@@ -97,12 +122,15 @@ def order_change_status(order_id):
             abort(403)
 
     try:
-        if new_status == 'cancelled' and order.status == 'pending' and product.quantity is not None:
-            product.quantity += order.quantity
-
         old_status = order.status
-        order.status = new_status
+        # Conditional on the status we checked: the hold sweep may have cancelled it meanwhile
+        if not change_status(order, old_status, new_status):
+            db.session.rollback()
+            flash('Status pesanan telah berubah. Sila semak semula.', 'error')
+            return redirect(url_for('main.order_detail', order_id=order.id))
         db.session.add(AuditLog(entity_type='order', entity_id=order.id, action='status_change', old_status=old_status, new_status=new_status, actor_id=user_id))
+        if new_status == 'completed':
+            bump(product.seller_id, orders_completed=1)
         db.session.commit()
         # Notify both parties
         buyer = User.query.get(order.buyer_id)
@@ -125,7 +153,6 @@ def order_change_status(order_id):
 @login_required
 @limiter.limit('30 per minute', methods=['POST'])
 def order_add_message(order_id):
-    from app.models import Message
     order, product = _ensure_order_access(order_id)
     content = request.form.get('content', '').strip()
     if not content:
@@ -136,7 +163,15 @@ def order_add_message(order_id):
         return redirect(url_for('main.order_detail', order_id=order.id))
 
     sanitized = bleach.clean(content, tags=[], strip=True)
-    msg = Message(context_type='order', context_id=order.id, sender_id=session['user_id'], content=sanitized)
+    now = datetime.utcnow()
+    if session['user_id'] == product.seller_id:
+        # The seller's first reply on an order feeds their average response time
+        replied = db.session.query(Message.id).filter_by(
+            context_type='order', context_id=order.id, sender_id=product.seller_id
+        ).first()
+        if replied is None:
+            bump(product.seller_id, responses=1, response_seconds=response_seconds(order.created_at, now))
+    msg = Message(context_type='order', context_id=order.id, sender_id=session['user_id'], content=sanitized, created_at=now)
     db.session.add(msg)
     db.session.commit()
     # Notify the other party
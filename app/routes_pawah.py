@@ -1,4 +1,4 @@
-from flask import render_template, redirect, url_for, session, flash, request, abort
+from flask import current_app, jsonify, render_template, redirect, url_for, session, flash, request, abort
 from sqlalchemy.orm import selectinload
 from decimal import Decimal
 import bleach
@@ -6,8 +6,14 @@ import bleach
 from app.blueprint import main
 from app.extensions import db, limiter
 from app.models import User, PawahProject, AuditLog
+from app.utils import duplicates, moderation
+from app.utils.autocomplete import autocomplete_index, listing_terms
 from app.utils.decorators import login_required
 from app.utils.notifications import safe_send_email
+from app.utils.recommend import recommend, farmer_profile
+from app.utils.simulator import simulate, simulate_project
+from app.utils.geo import distances_km, near_from_args, paginate_nearest, resolve, set_location
+from app.utils.view_counter import record_view, views_for
 
 
 PAWAH_TRANSITIONS = {
@@ -32,12 +38,20 @@ def pawah_list():
     if crop_type:
         query = query.filter(PawahProject.crop_type == crop_type)
     if location:
-        query = query.filter(PawahProject.location == location)
+        place = resolve(location)
+        query = query.filter(PawahProject.location == (place.name if place else location))
     if status:
         query = query.filter(PawahProject.status == status)
 
-    query = query.order_by(PawahProject.created_at.desc())
-    pagination = db.paginate(query, page=page, per_page=12, error_out=False)
+    near = near_from_args(request.args)
+    if near and near.lat is None:
+        flash(f'Lokasi "{near.text}" tidak dikenali.', 'error')
+        near = None
+    if near:
+        pagination = paginate_nearest(query, PawahProject, near, page=page, per_page=12)
+    else:
+        query = query.order_by(PawahProject.created_at.desc())
+        pagination = db.paginate(query, page=page, per_page=12, error_out=False)
 
     return render_template(
         'pawah_list.html',
@@ -47,9 +61,23 @@ def pawah_list():
         crop_type=crop_type,
         location=location,
         status=status,
+        near=near,
+        distances=distances_km(pagination.items, near) if near else {},
     )
 
 
+@main.route('/pawah/for-you')
+@login_required
+def pawah_for_you():
+    user_id = session['user_id']
+    profile = farmer_profile(user_id)
+    recs = recommend(user_id, limit=current_app.config['RECOMMEND_LIMIT'], profile=profile)
+    ids = [r.project_id for r in recs]
+    projects = {p.id: p for p in PawahProject.query.filter(PawahProject.id.in_(ids)).all()} if ids else {}
+    items = [(projects[r.project_id], r) for r in recs if r.project_id in projects]
+    return render_template('pawah_for_you.html', items=items, has_history=profile is not None)
+
+
 @main.route('/pawah/new', methods=['GET', 'POST'])
 @login_required
 def pawah_new():
@@ -76,7 +104,6 @@ def pawah_new():
                 title=title,
                 description=description,
                 crop_type=crop_type,
-                location=location,
                 duration_months=duration_months,
                 capital_required=Decimal(capital_required),
                 owner_share_percent=owner_share_percent,
@@ -85,9 +112,17 @@ def pawah_new():
                 is_approved=False,
                 owner_id=session['user_id']
             )
+            set_location(project, location)
             db.session.add(project)
+            db.session.flush()
+            duplicates.check('pawah', [project])
+            fast = moderation.submit('pawah', project)
             db.session.commit()
-            flash('Projek pawah dihantar untuk semakan admin. Ia akan dipaparkan selepas diluluskan.', 'success')
+            if fast:
+                autocomplete_index.log_changes([], listing_terms(project))
+                flash('Projek pawah diterbitkan.', 'success')
+            else:
+                flash('Projek pawah dihantar untuk semakan admin. Ia akan dipaparkan selepas diluluskan.', 'success')
             return redirect(url_for('main.pawah_list'))
         except Exception:
             db.session.rollback()
@@ -112,7 +147,43 @@ def pawah_detail(project_id):
         .order_by(Message.created_at.asc())
         .all()
     )
-    return render_template('pawah_detail.html', project=project, owner=owner, farmer=farmer, messages=messages)
+    views = None
+    if session.get('user_id') == project.owner_id:
+        views = views_for('pawah', [project.id]).get(project.id, 0)
+    else:
+        record_view('pawah', project.id)
+    return render_template('pawah_detail.html', project=project, owner=owner, farmer=farmer, messages=messages, views=views)
+
+
+@main.route('/pawah/<int:project_id>/simulation')
+def pawah_simulation(project_id):
+    project = PawahProject.query.get_or_404(project_id)
+    if not project.is_approved and not (session.get('is_admin') or (session.get('user_id') and session['user_id'] in [project.owner_id, project.farmer_id])):
+        abort(404)
+    owner_share = request.args.get('owner_share', type=int)
+    if owner_share is None or not 0 <= owner_share <= 100:
+        owner_share = project.owner_share_percent
+    result = simulate_project(project, owner_share, scenarios=current_app.config['SIMULATION_SCENARIOS'])
+    return render_template('pawah_simulation.html', project=project, owner_share=owner_share, result=result)
+
+
+@main.route('/pawah/simulate')
+@limiter.limit('30 per minute')
+def pawah_simulate_api():
+    crop_type = request.args.get('crop_type', '').strip()
+    capital = request.args.get('capital', type=float)
+    duration_months = request.args.get('duration_months', type=int)
+    owner_share = request.args.get('owner_share', default=50, type=int)
+    if not crop_type or len(crop_type) > 100:
+        return jsonify(error='crop_type diperlukan'), 400
+    if capital is None or not 0 < capital <= 100_000_000:
+        return jsonify(error='capital tidak sah'), 400
+    if duration_months is None or not 1 <= duration_months <= 120:
+        return jsonify(error='duration_months mesti antara 1 dan 120'), 400
+    if not 0 <= owner_share <= 100:
+        return jsonify(error='owner_share mesti antara 0 dan 100'), 400
+    result = simulate(crop_type, round(capital, 2), duration_months, owner_share, current_app.config['SIMULATION_SCENARIOS'])
+    return jsonify(result._asdict())
 
 
 @main.route('/pawah/<int:project_id>/accept', methods=['POST'])
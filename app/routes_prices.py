@@ -0,0 +1,48 @@
+from flask import abort, jsonify, request, session
+
+from app.blueprint import main
+from app.extensions import limiter
+from app.models import Product
+from app.utils.price_index import history_for, market_stats, weekly_stats
+
+
+def _stats_json(stats):
+    return stats._asdict() if stats else None
+
+
+@main.route('/api/prices')
+@limiter.limit('60 per minute')
+def api_prices():
+    category = request.args.get('category', '').strip()
+    if not category:
+        return jsonify(error='category diperlukan'), 400
+    # Omitted location/unit aggregate over all of them; pass an empty value for "not set"
+    location = request.args.get('location')
+    unit = request.args.get('unit')
+    location = location.strip() if location is not None else None
+    unit = unit.strip() if unit is not None else None
+    weeks = min(max(request.args.get('weeks', default=12, type=int), 1), 156)
+    response = jsonify(
+        category=category,
+        location=location,
+        unit=unit,
+        last_4_weeks=_stats_json(market_stats(category, location, unit, weeks=4)),
+        weekly=[dict(week=week.isoformat(), **stats._asdict())
+                for week, stats in weekly_stats(category, location, unit, weeks=weeks)],
+    )
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@main.route('/api/products/<int:product_id>/prices')
+@limiter.limit('60 per minute')
+def api_product_prices(product_id):
+    product = Product.query.get_or_404(product_id)
+    if not (product.is_active and product.is_approved) and not (
+        session.get('user_id') == product.seller_id or session.get('is_admin')
+    ):
+        abort(404)
+    return jsonify(product_id=product.id, history=[
+        {'price': str(h.price), 'unit': h.unit or None, 'recorded_at': h.recorded_at.isoformat()}
+        for h in history_for(product.id)
+    ])
@@ -0,0 +1,44 @@
+from flask import current_app, jsonify, request, session
+
+from app.blueprint import main
+from app.extensions import limiter
+from app.utils.sync import BadCursor, decode_cursor, listing_changes, order_changes, sync_response
+
+
+# ----------------------
+# Delta sync for mobile / offline clients
+# ----------------------
+
+
+def _sync_args():
+    cursor = decode_cursor(request.args.get('since', '').strip())
+    page_size = current_app.config['SYNC_PAGE_SIZE']
+    limit = min(max(request.args.get('limit', default=page_size, type=int), 1), page_size)
+    return cursor, limit
+
+
+@main.route('/api/sync/listings')
+@limiter.limit('60 per minute')
+def api_sync_listings():
+    try:
+        cursor, limit = _sync_args()
+    except BadCursor:
+        return jsonify(error='cursor tidak sah'), 400
+    response = sync_response(listing_changes(cursor, limit))
+    response.headers['Cache-Control'] = 'public, max-age=15'
+    return response
+
+
+@main.route('/api/sync/orders')
+@limiter.limit('60 per minute')
+def api_sync_orders():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify(error='Sila log masuk dahulu.'), 401
+    try:
+        cursor, limit = _sync_args()
+    except BadCursor:
+        return jsonify(error='cursor tidak sah'), 400
+    response = sync_response(order_changes(user_id, cursor, limit))
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
@@ -0,0 +1,38 @@
+// Typeahead for inputs marked data-autocomplete="<field>": fills a <datalist>
+// from /autocomplete as the user types. Plain browser APIs, no framework.
+(function () {
+  var DELAY = 120;
+  document.querySelectorAll('input[data-autocomplete]').forEach(function (input, n) {
+    var list = document.createElement('datalist');
+    var timer = null;
+    var last = '';
+    var controller = null;
+    list.id = 'ac-' + n;
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.after(list);
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var q = input.value.trim();
+        if (!q || q === last) return;
+        last = q;
+        if (controller) controller.abort();
+        controller = new AbortController();
+        var url = input.dataset.autocompleteUrl + '?field=' + encodeURIComponent(input.dataset.autocomplete) +
+          '&q=' + encodeURIComponent(q);
+        fetch(url, { signal: controller.signal })
+          .then(function (r) { return r.ok ? r.json() : []; })
+          .then(function (items) {
+            list.replaceChildren.apply(list, items.map(function (item) {
+              var option = document.createElement('option');
+              option.value = item.value;
+              return option;
+            }));
+          })
+          .catch(function () {});
+      }, DELAY);
+    });
+  });
+})();
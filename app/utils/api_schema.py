@@ -0,0 +1,153 @@
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+from operator import attrgetter
+
+from sqlalchemy.orm import load_only
+
+from app.models import Message, Order, PawahProject, Product, User
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _num(value):
+    return str(value) if isinstance(value, Decimal) else value
+
+
+# type of the related resource, and the foreign key column on this one
+Relation = namedtuple('Relation', 'type key')
+
+
+class Schema:
+    """Fields a resource exposes and how each is converted, compiled once per field selection.
+
+    ``fields`` maps output name to a converter (None to pass the value
+    through). ``serializer(names)`` returns a function from a model instance
+    to a dict for exactly those names; it is built on first use and cached,
+    so serializing a page costs one ``attrgetter`` call per row.
+    """
+
+    def __init__(self, type_, model, fields, default=None, relations=None):
+        self.type = type_
+        self.model = model
+        self.fields = fields
+        self.default = tuple(default or fields)
+        self.relations = relations or {}
+        self._compiled = {}
+
+    def parse_fields(self, value):
+        if not value:
+            return self.default
+        names = tuple(dict.fromkeys(n.strip() for n in value.split(',') if n.strip()))
+        unknown = [n for n in names if n not in self.fields]
+        if unknown:
+            raise ApiError(f"medan tidak dikenali untuk {self.type}: {', '.join(unknown)}")
+        return names if 'id' in names else ('id',) + names
+
+    def parse_include(self, value):
+        names = tuple(dict.fromkeys(n.strip() for n in (value or '').split(',') if n.strip()))
+        unknown = [n for n in names if n not in self.relations]
+        if unknown:
+            raise ApiError(f"include tidak dikenali untuk {self.type}: {', '.join(unknown)}")
+        return names
+
+    def load_options(self, names, include=(), extra=()):
+        # Only the requested columns (plus keys the cursor and includes need) are read
+        columns = dict.fromkeys(('id',) + names + tuple(self.relations[r].key for r in include) + tuple(extra))
+        return load_only(*(getattr(self.model, c) for c in columns))
+
+    def serializer(self, names):
+        # One entry per field set, not per ordering: ?fields= permutations must not grow the cache
+        # (jsonify sorts keys anyway)
+        names = tuple(sorted(names))
+        fn = self._compiled.get(names)
+        if fn is None:
+            fn = self._compiled[names] = self._compile(names)
+        return fn
+
+    def _compile(self, names):
+        getter = attrgetter(*names)
+        if len(names) == 1:
+            single = getter
+            getter = lambda obj: (single(obj),)  # noqa: E731
+        converters = tuple(self.fields[n] for n in names)
+        if not any(converters):
+            return lambda obj: dict(zip(names, getter(obj)))
+        return lambda obj: {
+            name: convert(value) if convert and value is not None else value
+            for name, convert, value in zip(names, converters, getter(obj))
+        }
+
+
+SCHEMAS = {}
+
+
+def _schema(*args, **kwargs):
+    schema = Schema(*args, **kwargs)
+    SCHEMAS[schema.type] = schema
+    return schema
+
+
+users = _schema('users', User, {'id': None, 'name': None, 'profile_picture': None, 'created_at': _iso})
+
+products = _schema('products', Product, {
+    'id': None, 'title': None, 'description': None, 'price': _num, 'quantity': None, 'unit': None,
+    'min_order_qty': None, 'category': None, 'location': None, 'latitude': None, 'longitude': None,
+    'image_url': None, 'contact_phone': None, 'seller_id': None, 'created_at': _iso, 'updated_at': _iso,
+}, default=('id', 'title', 'price', 'quantity', 'unit', 'category', 'location', 'image_url', 'seller_id',
+            'created_at'), relations={'seller': Relation('users', 'seller_id')})
+
+pawah = _schema('pawah', PawahProject, {
+    'id': None, 'title': None, 'description': None, 'crop_type': None, 'location': None, 'latitude': None,
+    'longitude': None, 'duration_months': None, 'capital_required': _num, 'owner_share_percent': None,
+    'farmer_share_percent': None, 'status': None, 'owner_id': None, 'farmer_id': None, 'created_at': _iso,
+    'updated_at': _iso,
+}, default=('id', 'title', 'crop_type', 'location', 'duration_months', 'capital_required', 'owner_share_percent',
+            'farmer_share_percent', 'status', 'owner_id', 'created_at'),
+    relations={'owner': Relation('users', 'owner_id'), 'farmer': Relation('users', 'farmer_id')})
+
+orders = _schema('orders', Order, {
+    'id': None, 'buyer_id': None, 'product_id': None, 'quantity': None, 'total_price': _num, 'status': None,
+    'hold_expires_at': _iso, 'created_at': _iso, 'updated_at': _iso,
+}, relations={'product': Relation('products', 'product_id'), 'buyer': Relation('users', 'buyer_id')})
+
+messages = _schema('messages', Message, {
+    'id': None, 'context_id': None, 'sender_id': None, 'content': None, 'created_at': _iso,
+}, relations={'sender': Relation('users', 'sender_id')})
+
+
+def fields_param(args, schema):
+    # ?fields=a,b applies to the primary resource; ?fields[type]=a,b to any type
+    return schema.parse_fields(args.get(f'fields[{schema.type}]') or args.get('fields'))
+
+
+def serialize(schema, rows, args, include=()):
+    """(data, included): the rows, plus every included resource fetched with one query per relation."""
+    names = fields_param(args, schema)
+    data = list(map(schema.serializer(names), rows))
+    included = {}
+    for rel_name in include:
+        relation = schema.relations[rel_name]
+        target = SCHEMAS[relation.type]
+        ids = {getattr(row, relation.key) for row in rows} - {None}
+        if not ids:
+            continue
+        target_names = fields_param(args, target) if args.get(f'fields[{target.type}]') else target.default
+        found = (
+            target.model.query.options(target.load_options(target_names))
+            .filter(target.model.id.in_(sorted(ids))).order_by(target.model.id)
+        )
+        bucket = included.setdefault(target.type, {})
+        serializer = target.serializer(target_names)
+        for obj in found:
+            bucket.setdefault(obj.id, serializer(obj))
+    return data, {type_: list(found.values()) for type_, found in included.items()}
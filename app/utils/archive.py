@@ -0,0 +1,221 @@
+import json
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models import ArchivedOrder, AuditLog, Message, Order, Product, User
+from app.utils.metrics import describe, metrics
+
+
+describe('orders_archived_total', 'counter', 'Closed orders moved to archived_orders')
+describe('order_archive_batch_seconds', 'histogram', 'Time to archive one batch of closed orders')
+
+CLOSED = ('completed', 'cancelled')
+HOT_TABLES = ('orders', 'messages', 'audit_logs')
+
+ArchiveResult = namedtuple('ArchiveResult', 'orders messages audits skipped raw_bytes stored_bytes '
+                                            'hot_before hot_after free_bytes elapsed')
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _dt(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def hot_counts():
+    """Rows the order pages and admin log search still have to index: {table: n}."""
+    return {
+        'orders': db.session.query(func.count(Order.id)).scalar(),
+        'messages': db.session.query(func.count(Message.id)).filter(Message.context_type == 'order').scalar(),
+        'audit_logs': db.session.query(func.count(AuditLog.id)).filter(AuditLog.entity_type == 'order').scalar(),
+    }
+
+
+def _free_bytes():
+    # Deleted rows leave free pages that SQLite reuses but does not return to the OS without VACUUM
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return None
+    pages = db.session.execute(db.text('PRAGMA freelist_count')).scalar()
+    return pages * db.session.execute(db.text('PRAGMA page_size')).scalar()
+
+
+def _last_activity(ids):
+    last = {}
+    audits = (
+        db.session.query(AuditLog.entity_id, func.max(AuditLog.created_at))
+        .filter(AuditLog.entity_type == 'order', AuditLog.entity_id.in_(ids))
+        .group_by(AuditLog.entity_id)
+    )
+    messages = (
+        db.session.query(Message.context_id, func.max(Message.created_at))
+        .filter(Message.context_type == 'order', Message.context_id.in_(ids))
+        .group_by(Message.context_id)
+    )
+    for order_id, when in list(audits) + list(messages):
+        if when and (order_id not in last or when > last[order_id]):
+            last[order_id] = when
+    return last
+
+
+def _archive_batch(orders, seller_of):
+    ids = [o.id for o in orders]
+    messages = (
+        Message.query.filter(Message.context_type == 'order', Message.context_id.in_(ids))
+        .order_by(Message.created_at, Message.id).all()
+    )
+    audits = (
+        AuditLog.query.filter(AuditLog.entity_type == 'order', AuditLog.entity_id.in_(ids))
+        .order_by(AuditLog.created_at, AuditLog.id).all()
+    )
+    by_order = {i: ([], []) for i in ids}
+    for m in messages:
+        by_order[m.context_id][0].append(m)
+    for a in audits:
+        by_order[a.entity_id][1].append(a)
+
+    rows = []
+    raw = stored = 0
+    now = datetime.utcnow()
+    for o in orders:
+        thread, trail = by_order[o.id]
+        seller_id = seller_of[o.product_id]
+        first_reply = min((m.created_at for m in thread if m.sender_id == seller_id and m.created_at), default=None)
+        body = json.dumps({
+            'messages': [{'id': m.id, 'sender_id': m.sender_id, 'content': m.content, 'created_at': _iso(m.created_at)}
+                         for m in thread],
+            'audit': [{'id': a.id, 'action': a.action, 'old_status': a.old_status, 'new_status': a.new_status,
+                       'actor_id': a.actor_id, 'meta': a.meta, 'created_at': _iso(a.created_at)} for a in trail],
+        }, separators=(',', ':')).encode()
+        payload = zlib.compress(body, 6)
+        raw += len(body)
+        stored += len(payload)
+        closed = max([o.created_at] + [x.created_at for x in thread + trail if x.created_at], default=None)
+        rows.append({'id': o.id, 'buyer_id': o.buyer_id, 'seller_id': seller_id, 'product_id': o.product_id,
+                     'quantity': o.quantity, 'total_price': o.total_price, 'status': o.status,
+                     'created_at': o.created_at, 'closed_at': closed, 'first_reply_at': first_reply,
+                     'archived_at': now, 'payload': payload})
+
+    db.session.execute(ArchivedOrder.__table__.insert(), rows)
+    # Each delete must remove exactly what was copied; anything else means the
+    # order changed underneath us, so the batch is left for the next run
+    moved = (
+        db.session.query(Message).filter(Message.context_type == 'order', Message.context_id.in_(ids))
+        .delete(synchronize_session=False) == len(messages)
+        and db.session.query(AuditLog).filter(AuditLog.entity_type == 'order', AuditLog.entity_id.in_(ids))
+        .delete(synchronize_session=False) == len(audits)
+        and db.session.query(Order).filter(Order.id.in_(ids), Order.status.in_(CLOSED))
+        .delete(synchronize_session=False) == len(ids)
+    )
+    if not moved:
+        db.session.rollback()
+        return None
+    db.session.commit()
+    return len(messages), len(audits), raw, stored
+
+
+def archive_closed(months=6, batch_size=500, now=None, dry_run=False):
+    """Move orders closed more than ``months`` ago, with their messages and audit trail, to the archive.
+
+    An order is closed once it is completed or cancelled and nothing (status
+    change or message) has touched it since the cutoff. Orders are walked in
+    primary-key order and each batch is copied and deleted in its own
+    transaction, so the hot tables stay writable while it runs and an
+    interrupted run loses nothing. The newest order is never archived:
+    SQLite would otherwise hand its id out again.
+    """
+    started = time.perf_counter()
+    cutoff = (now or datetime.utcnow()) - timedelta(days=round(months * 30.44))
+    before = hot_counts()
+    newest = db.session.query(func.max(Order.id)).scalar() or 0
+    n_orders = n_messages = n_audits = skipped = raw = stored = 0
+    last_id = 0
+    while True:
+        batch_started = time.perf_counter()
+        candidates = (
+            Order.query.filter(Order.id > last_id, Order.id < newest, Order.status.in_(CLOSED),
+                               Order.created_at < cutoff)
+            .order_by(Order.id).limit(batch_size).all()
+        )
+        if not candidates:
+            break
+        last_id = candidates[-1].id
+        active = _last_activity([o.id for o in candidates])
+        due = [o for o in candidates if active.get(o.id, o.created_at) < cutoff]
+        if not due:
+            continue
+        if dry_run:
+            n_orders += len(due)
+            db.session.rollback()
+            continue
+        seller_of = dict(db.session.query(Product.id, Product.seller_id)
+                         .filter(Product.id.in_({o.product_id for o in due})))
+        moved = _archive_batch(due, seller_of)
+        if moved is None:
+            skipped += len(due)
+            continue
+        n_orders += len(due)
+        n_messages += moved[0]
+        n_audits += moved[1]
+        raw += moved[2]
+        stored += moved[3]
+        metrics.observe('order_archive_batch_seconds', time.perf_counter() - batch_started)
+    if n_orders and not dry_run:
+        metrics.inc('orders_archived_total', n_orders)
+    after = before if dry_run else hot_counts()
+    return ArchiveResult(n_orders, n_messages, n_audits, skipped, raw, stored, before, after,
+                         _free_bytes(), time.perf_counter() - started)
+
+
+def shrink_report(result):
+    """Human-readable lines describing how much an archive run shrank the hot tables."""
+    lines = [f'{result.orders} orders archived with {result.messages} messages and {result.audits} audit rows '
+             f'({result.skipped} skipped, {result.elapsed:.1f}s)']
+    for table in HOT_TABLES:
+        was, now = result.hot_before[table], result.hot_after[table]
+        pct = (was - now) * 100 / was if was else 0
+        lines.append(f'  {table}: {was} -> {now} rows (-{pct:.1f}%)')
+    if result.raw_bytes:
+        lines.append(f'  archive payload: {result.raw_bytes} bytes of JSON stored in {result.stored_bytes} '
+                     f'({result.stored_bytes * 100 / result.raw_bytes:.0f}%)')
+    if result.free_bytes is not None:
+        lines.append(f'  SQLite free pages: {result.free_bytes} bytes (reused for new rows; VACUUM to return them)')
+    return lines
+
+
+def load(order_id):
+    """(ArchivedOrder, messages, audit trail) for an archived order, or (None, [], [])."""
+    archived = db.session.get(ArchivedOrder, order_id)
+    if archived is None:
+        return None, [], []
+    data = json.loads(zlib.decompress(archived.payload))
+    user_ids = {m['sender_id'] for m in data['messages']} | {a['actor_id'] for a in data['audit'] if a['actor_id']}
+    users = {u.id: u for u in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+    messages = [SimpleNamespace(id=m['id'], sender_id=m['sender_id'], sender=users.get(m['sender_id']),
+                                content=m['content'], created_at=_dt(m['created_at'])) for m in data['messages']]
+    audit = [SimpleNamespace(**dict(a, actor=users.get(a['actor_id']), created_at=_dt(a['created_at'])))
+             for a in data['audit']]
+    return archived, messages, audit
+
+
+def archived_for(user_id, limit=50):
+    """(purchases, sales): a user's most recent archived orders, newest first."""
+    purchases = (
+        ArchivedOrder.query.options(selectinload(ArchivedOrder.product))
+        .filter(ArchivedOrder.buyer_id == user_id)
+        .order_by(ArchivedOrder.created_at.desc()).limit(limit).all()
+    )
+    sales = (
+        ArchivedOrder.query.options(selectinload(ArchivedOrder.buyer))
+        .filter(ArchivedOrder.seller_id == user_id)
+        .order_by(ArchivedOrder.created_at.desc()).limit(limit).all()
+    )
+    return purchases, sales
@@ -0,0 +1,396 @@
+import heapq
+import itertools
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.utils.fs import private_dir
+from app.utils.metrics import describe, metrics
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: single-process dev servers only
+    fcntl = None
+
+
+describe('autocomplete_rebuild_seconds', 'histogram', 'Time to write a new autocomplete snapshot')
+describe('autocomplete_terms', 'gauge', 'Distinct terms in the mapped autocomplete snapshot')
+
+FIELDS = ('product', 'category', 'location', 'pawah', 'crop')
+# Titles are also found by later words ("king" -> "Durian Musang King"), up to this many
+MAX_WORD_STARTS = 4
+# Prefixes up to this length match too many terms to rank per request; their
+# top completions are precomputed into the snapshot
+HEAD_LEN = 3
+HEAD_SIZE = 10
+# Longer prefixes rank at most this many matching entries
+SCAN_LIMIT = 400
+
+MAGIC = b'KPAC0001'
+_HEADER = struct.Struct('<8sdQQ')  # magic, built_at, terms table pos, heads table pos
+SEP = '\x1f'
+_CONTROL_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', (text or '').lower()).split())
+
+
+def clean_value(value):
+    """A term as stored and logged: no control characters (SEP, tab, newline), single spaces."""
+    return ' '.join(_CONTROL_RE.sub(' ', value or '').split())
+
+
+def listing_terms(obj):
+    """(field, value) pairs a listing contributes while it is publicly listed."""
+    from app.models import Product
+    if isinstance(obj, Product):
+        if not (obj.is_active and obj.is_approved):
+            return []
+        pairs = [('product', obj.title), ('category', obj.category), ('location', obj.location)]
+    else:
+        if not obj.is_approved:
+            return []
+        pairs = [('pawah', obj.title), ('crop', obj.crop_type), ('location', obj.location)]
+    return [(f, clean_value(v)) for f, v in pairs if clean_value(v)]
+
+
+def collect_terms():
+    """{(field, value): listings using it} straight from the listing tables."""
+    from app.models import PawahProject, Product
+    listed = (Product.is_active.is_(True), Product.is_approved.is_(True))
+    approved = (PawahProject.is_approved.is_(True),)
+    sources = [
+        ('product', Product.title, listed), ('category', Product.category, listed),
+        ('location', Product.location, listed), ('pawah', PawahProject.title, approved),
+        ('crop', PawahProject.crop_type, approved), ('location', PawahProject.location, approved),
+    ]
+    terms = Counter()
+    for field, column, filters in sources:
+        for value, n in db.session.query(column, func.count()).filter(*filters, column.isnot(None)).group_by(column):
+            value = clean_value(value)
+            if value:
+                terms[(field, value)] += n
+    return terms
+
+
+# ----------------------
+# Snapshot file
+# ----------------------
+#
+# header | terms table | heads table
+# table  = u64 count | u64 offsets[count + 1] | entry bytes
+# term   = key SEP field SEP value SEP count   (sorted by bytes, so by key)
+# head   = scope SEP prefix SEP u32 term indexes
+#
+# Entries are found by bisecting the offsets straight out of the mmap; nothing
+# is parsed at load time, so every worker shares the page cache copy.
+
+
+def _write_table(fh, entries):
+    pos = fh.tell()
+    offsets = array('Q', [0])
+    total = 0
+    for entry in entries:
+        total += len(entry)
+        offsets.append(total)
+    fh.write(struct.pack('<Q', len(entries)))
+    fh.write(offsets.tobytes())
+    for entry in entries:
+        fh.write(entry)
+    return pos
+
+
+def write_snapshot(path, terms):
+    rows = []
+    for (field, value), count in terms.items():
+        if count <= 0:
+            continue
+        words = normalize(value).split()
+        starts = range(min(len(words), MAX_WORD_STARTS)) if field in ('product', 'pawah') else range(min(len(words), 1))
+        for i in starts:
+            key = ' '.join(words[i:])
+            rows.append((f'{key}{SEP}{FIELDS.index(field)}{SEP}{value}{SEP}{count}'.encode(), key, field, value, count))
+    rows.sort(key=lambda r: r[0])
+
+    heads = []
+    for length in range(1, HEAD_LEN + 1):
+        indexed = ((i, r) for i, r in enumerate(rows) if len(r[1]) >= length)
+        for prefix, group in itertools.groupby(indexed, key=lambda ir: ir[1][1][:length]):
+            group = list(group)
+            for scope in ('all',) + FIELDS:
+                members = group if scope == 'all' else [ir for ir in group if ir[1][2] == scope]
+                top, seen = [], set()
+                for i, r in heapq.nlargest(HEAD_SIZE * 4, members, key=lambda ir: ir[1][4]):
+                    if (r[2], r[3]) not in seen:
+                        seen.add((r[2], r[3]))
+                        top.append(i)
+                        if len(top) == HEAD_SIZE:
+                            break
+                if top:
+                    heads.append(f'{scope}{SEP}{prefix}{SEP}'.encode() + array('I', top).tobytes())
+    heads.sort()
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(b'\0' * _HEADER.size)
+        terms_pos = _write_table(fh, [r[0] for r in rows])
+        heads_pos = _write_table(fh, heads)
+        fh.seek(0)
+        fh.write(_HEADER.pack(MAGIC, time.time(), terms_pos, heads_pos))
+    os.replace(tmp, path)
+    return len(rows)
+
+
+class _Table:
+    """Read-only sequence of the entries of one table inside the mmap (bisect-able)."""
+
+    def __init__(self, buf, pos):
+        (self.n,) = struct.unpack_from('<Q', buf, pos)
+        start = pos + 8
+        self.offsets = memoryview(buf)[start:start + (self.n + 1) * 8].cast('Q')
+        self.data = start + (self.n + 1) * 8
+        self.buf = buf
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return self.buf[self.data + self.offsets[i]:self.data + self.offsets[i + 1]]
+
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self.stat = os.fstat(fh.fileno())
+            self.buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.built_at, terms_pos, heads_pos = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an autocomplete snapshot')
+        self.terms = _Table(self.buf, terms_pos)
+        self.heads = _Table(self.buf, heads_pos)
+
+    @staticmethod
+    def _parse(entry):
+        # key and field never contain SEP; split the count off the right in case a value does
+        _key, field, rest = entry.decode().split(SEP, 2)
+        value, _, count = rest.rpartition(SEP)
+        return field, value, int(count)
+
+    def term(self, i):
+        field, value, count = self._parse(self.terms[i])
+        return FIELDS[int(field)], value, count
+
+    def all_terms(self):
+        terms = Counter()
+        for i in range(len(self.terms)):
+            field, value, count = self.term(i)
+            terms[(field, value)] = count
+        return terms
+
+    def lookup(self, prefix, field=None, limit=8):
+        from bisect import bisect_left
+        key = normalize(prefix)
+        if not key:
+            return []
+        if len(key) <= HEAD_LEN:
+            head = f"{field or 'all'}{SEP}{key}{SEP}".encode()
+            i = bisect_left(self.heads, head)
+            if i == len(self.heads) or not self.heads[i].startswith(head):
+                return []
+            ids = array('I')
+            ids.frombytes(self.heads[i][len(head):])
+            return [dict(zip(('field', 'value', 'count'), self.term(j))) for j in ids[:limit]]
+
+        want = key.encode()
+        code = None if field is None else str(FIELDS.index(field))
+        found = {}
+        i = bisect_left(self.terms, want)
+        for j in range(i, min(i + SCAN_LIMIT, len(self.terms))):
+            entry = self.terms[j]
+            if not entry.startswith(want):
+                break
+            f, value, count = self._parse(entry)
+            if code is None or f == code:
+                found[(f, value)] = count
+        best = heapq.nlargest(limit, found.items(), key=lambda kv: kv[1])
+        return [{'field': FIELDS[int(f)], 'value': v, 'count': n} for (f, v), n in best]
+
+
+# ----------------------
+# Cross-worker index
+# ----------------------
+
+
+class AutocompleteIndex:
+    """The mapped snapshot plus the delta log that keeps it current.
+
+    Any worker that changes a listing appends +1/-1 term lines to
+    ``autocomplete.log``. Every ``check_interval`` seconds a lookup stats the
+    snapshot (remapping it if another worker replaced it) and the log; when
+    the log has entries and ``merge_interval`` has passed, a background thread
+    takes a file lock, folds the log into a new snapshot and swaps it in
+    atomically. Only the lock holder writes, so workers never duplicate work.
+    """
+
+    def __init__(self, directory=None, check_interval=1.0, merge_interval=10.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.merge_interval = merge_interval
+        self.app = None
+        self.snapshot = None
+        self._checked = 0.0
+        self._merged = 0.0
+        self._busy = threading.Lock()
+
+    def configure(self, directory, check_interval=1.0, merge_interval=10.0, app=None):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.merge_interval = merge_interval
+        self.app = app
+        self.snapshot = None
+        self._checked = self._merged = 0.0
+        if directory:
+            private_dir(directory)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, 'autocomplete.idx')
+
+    @property
+    def log_path(self):
+        return os.path.join(self.directory, 'autocomplete.log')
+
+    def lookup(self, prefix, field=None, limit=8):
+        if not self.directory:
+            return []
+        self._maybe_reload()
+        snapshot = self.snapshot
+        return snapshot.lookup(prefix, field, limit) if snapshot else []
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._start(self.rebuild)
+            return
+        current = self.snapshot
+        if current is None or (st.st_ino, st.st_mtime_ns) != (current.stat.st_ino, current.stat.st_mtime_ns):
+            # The old mapping is left to the garbage collector: lookups may still hold views into it
+            self.snapshot = Snapshot(self.path)
+            metrics.set_gauge('autocomplete_terms', len(self.snapshot.terms))
+        if now - self._merged >= self.merge_interval and os.path.exists(self.log_path):
+            self._merged = now
+            self._start(self.merge)
+
+    def _start(self, target):
+        if self.app is None or not self._busy.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                with self.app.app_context():
+                    target()
+            except Exception:
+                self.app.logger.exception('autocomplete snapshot update failed')
+            finally:
+                self._busy.release()
+
+        threading.Thread(target=run, name='autocomplete', daemon=True).start()
+
+    @contextmanager
+    def _writer(self):
+        # Non-blocking: if another worker is already writing, its snapshot will do
+        with open(os.path.join(self.directory, 'autocomplete.lock'), 'w') as fh:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+
+    def _take_log(self):
+        # Appenders open the log by name for every write, so after the rename
+        # new lines go to a fresh log for the next merge
+        taken = f'{self.log_path}.{os.getpid()}.merging'
+        try:
+            os.replace(self.log_path, taken)
+        except FileNotFoundError:
+            return Counter()
+        deltas = Counter()
+        with open(taken, encoding='utf-8') as fh:
+            for line in fh:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 3 and parts[1] in FIELDS:
+                    deltas[(parts[1], parts[2])] += int(parts[0])
+        os.unlink(taken)
+        return deltas
+
+    def rebuild(self):
+        """Full rebuild from the database; also discards any pending log entries."""
+        with self._writer() as ok:
+            if not ok:
+                return None
+            started = time.perf_counter()
+            self._take_log()
+            n = write_snapshot(self.path, collect_terms())
+            metrics.observe('autocomplete_rebuild_seconds', time.perf_counter() - started)
+            return n
+
+    def merge(self):
+        """Fold the delta log into the current snapshot."""
+        with self._writer() as ok:
+            if not ok or not os.path.exists(self.path):
+                return None
+            started = time.perf_counter()
+            deltas = self._take_log()
+            if not deltas:
+                return 0
+            terms = Snapshot(self.path).all_terms()
+            terms.update(deltas)
+            n = write_snapshot(self.path, terms)
+            metrics.observe('autocomplete_rebuild_seconds', time.perf_counter() - started)
+            return n
+
+    def log_changes(self, before, after):
+        """Append the term differences of one listing change to the delta log."""
+        if not self.directory:
+            return
+        old, new = Counter(before), Counter(after)
+        lines = []
+        for sign, diff in ((1, new - old), (-1, old - new)):
+            lines += [f'{sign * n}\t{f}\t{clean_value(v)}\n' for (f, v), n in diff.items()]
+        if not lines:
+            return
+        # One O_APPEND write per change keeps lines from concurrent workers whole
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, ''.join(lines).encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def init_autocomplete(app):
+    merge_interval = app.config.get('AUTOCOMPLETE_MERGE_SECONDS', 10.0)
+    try:
+        autocomplete_index.configure(app.config.get('AUTOCOMPLETE_DIR'), merge_interval=merge_interval, app=app)
+    except OSError as exc:
+        app.logger.warning('autocomplete disabled: %s', exc)
+        autocomplete_index.configure(None, merge_interval=merge_interval, app=app)
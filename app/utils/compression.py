@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import zlib
+from urllib.parse import urlencode
+
+from flask import current_app, g, request, send_from_directory, session, url_for
+from flask_wtf.csrf import generate_csrf
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript', 'text/csv',
+    'application/json', 'application/msgpack', 'application/javascript', 'application/xml', 'image/svg+xml',
+}
+FAR_FUTURE = 365 * 24 * 3600
+MANIFEST_NAME = 'manifest.json'
+DIST_DIR = 'dist'
+
+
+def _accepted_encoding(allow_br=True):
+    accept = request.accept_encodings
+    if allow_br and brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def _stream_compressed(chunks, encoding, level, quality):
+    # Sync-flush after each chunk so a streamed page still paints progressively
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+def csrf_token():
+    """``csrf_token()`` for templates; also notes that the response carries the token."""
+    g.csrf_rendered = True
+    return generate_csrf()
+
+
+def _breach_risk(response):
+    # BREACH: compressed size leaks a secret (the CSRF token) when attacker-chosen input is
+    # reflected next to it. Query args and form posts are that input.
+    if response.mimetype != 'text/html' or (not request.args and request.method in ('GET', 'HEAD')):
+        return False
+    if response.is_streamed:
+        # The body is rendered after this runs: assume the token if the session has one
+        return current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in session
+    return g.get('csrf_rendered', False)
+
+
+def compress_response(response):
+    cfg = current_app.config
+    if (
+        response.status_code < 200 or response.status_code in (204, 304)
+        or response.mimetype not in COMPRESSIBLE_TYPES
+        or 'Content-Encoding' in response.headers
+        or response.direct_passthrough
+        or _breach_risk(response)
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    if encoding is None:
+        return response
+    level = cfg.get('COMPRESS_LEVEL', 6)
+    quality = cfg.get('COMPRESS_BR_QUALITY', 4)
+
+    if response.is_streamed:
+        response.response = _stream_compressed(response.response, encoding, level, quality)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < cfg.get('COMPRESS_MIN_SIZE', 500):
+            return response
+        if encoding == 'br':
+            body = brotli.compress(data, quality=quality)
+        else:
+            body = gzip.compress(data, compresslevel=level, mtime=0)
+        response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The body changed, so any strong ETag no longer describes it
+    if response.headers.get('ETag', '').startswith('"'):
+        response.headers['ETag'] = 'W/' + response.headers['ETag']
+    return response
+
+
+# ----------------------
+# Static assets: fingerprinting + precompression
+# ----------------------
+
+
+def build_assets(static_folder, gzip_level=9, br_quality=11):
+    """Write fingerprinted copies (plus .gz/.br) of every static file to ``dist/``.
+
+    Returns the manifest mapping logical paths to fingerprinted ones.
+    """
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root).startswith(os.path.abspath(dist_root)):
+            continue
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_root]
+        for fname in files:
+            src = os.path.join(root, fname)
+            rel = os.path.relpath(src, static_folder).replace(os.sep, '/')
+            if rel == MANIFEST_NAME:
+                continue
+            with open(src, 'rb') as fh:
+                data = fh.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(rel)
+            hashed = f'{DIST_DIR}/{stem}.{digest}{ext}'
+            dest = os.path.join(static_folder, hashed)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(dest, 'wb') as fh:
+                fh.write(data)
+            if _is_compressible_name(fname):
+                with open(dest + '.gz', 'wb') as fh:
+                    fh.write(gzip.compress(data, compresslevel=gzip_level, mtime=0))
+                if brotli is not None:
+                    with open(dest + '.br', 'wb') as fh:
+                        fh.write(brotli.compress(data, quality=br_quality))
+            manifest[rel] = hashed
+    with open(os.path.join(static_folder, MANIFEST_NAME), 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def _is_compressible_name(fname):
+    return fname.rsplit('.', 1)[-1].lower() in {'css', 'js', 'json', 'svg', 'txt', 'html', 'xml', 'map'}
+
+
+def _load_manifest(app):
+    path = os.path.join(app.static_folder or '', MANIFEST_NAME)
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_compression(app):
+    manifest = _load_manifest(app) if app.static_folder else {}
+    fingerprinted = set(manifest.values())
+
+    @app.template_global()
+    def asset_url(path):
+        return url_for('static', filename=manifest.get(path, path))
+
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.after_request(compress_response)
+
+    if not app.has_static_folder:
+        return
+
+    def static(filename):
+        if filename not in fingerprinted:
+            return app.send_static_file(filename)
+        response = None
+        encoding = _accepted_encoding()
+        candidates = {'br': (('br', '.br'), ('gzip', '.gz')), 'gzip': (('gzip', '.gz'),)}.get(encoding, ())
+        for enc, suffix in candidates:
+            if os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = enc
+                break
+        if response is None:
+            response = app.send_static_file(filename)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = FAR_FUTURE
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
+
+
+# ----------------------
+# Low-bandwidth ("lite") rendering
+# ----------------------
+
+LITE_COOKIE = 'lite'
+
+
+def init_lite_mode(app):
+    @app.before_request
+    def _detect_lite():
+        flag = request.args.get('lite')
+        if flag in ('0', '1'):
+            g.lite_mode = flag == '1'
+        else:
+            g.lite_mode = (
+                request.cookies.get(LITE_COOKIE) == '1'
+                or request.headers.get('Save-Data', '').lower() == 'on'
+            )
+
+    @app.after_request
+    def _remember_lite(response):
+        flag = request.args.get('lite')
+        if flag == '1':
+            response.set_cookie(LITE_COOKIE, '1', max_age=FAR_FUTURE, samesite='Lax')
+        elif flag == '0':
+            response.delete_cookie(LITE_COOKIE)
+        return response
+
+    def lite_url(flag):
+        # Query args go through urlencode, not url_for kwargs: names like endpoint or _external must stay plain args
+        args = [(k, v) for k, v in request.args.items(multi=True) if k != 'lite'] + [('lite', flag)]
+        return f'{url_for(request.endpoint, **(request.view_args or {}))}?{urlencode(args)}'
+
+    @app.context_processor
+    def _lite_context():
+        return {'lite_mode': g.get('lite_mode', False), 'lite_url': lite_url}
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from app.utils.fs import private_dir
+from app.utils.metrics import describe, metrics
+
+
+describe('fragment_cache_hits_total', 'counter', 'Template fragments served from cache, by fragment')
+describe('fragment_cache_misses_total', 'counter', 'Template fragments rendered and stored, by fragment')
+describe('fragment_cache_render_seconds_total', 'counter', 'Time spent rendering fragments on a miss')
+describe('fragment_cache_saved_seconds_total', 'counter', 'Estimated render time avoided by cache hits')
+
+
+class MemoryBackend:
+    """Per-process LRU."""
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FileSystemBackend:
+    """Shared by all workers on a host; a small in-process LRU sits in front.
+
+    Entries are files named by key hash. When the directory grows past
+    ``maxsize`` the least recently written half is pruned (checked every
+    ``maxsize // 10`` writes, so the bound is approximate).
+    """
+
+    def __init__(self, directory, maxsize=20000, local_size=1000):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.local = MemoryBackend(local_size)
+        self._writes = 0
+        # Entries come back as Markup: nobody else may be able to write here
+        private_dir(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            with open(self._path(key), encoding='utf-8') as fh:
+                value = fh.read()
+        except OSError:
+            return None
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as fh:
+                fh.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._writes += 1
+        if self._writes % max(self.maxsize // 10, 1) == 0:
+            self._prune()
+
+    def _prune(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file() and not e.name.endswith('.tmp')]
+        except OSError:
+            return
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[: len(entries) - self.maxsize // 2]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        self.local.clear()
+        for entry in os.scandir(self.directory):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class FragmentCache:
+    def __init__(self):
+        self.backend = None
+        self._lock = threading.Lock()
+        self.stats = {}  # fragment name -> [hits, misses, render_seconds]
+
+    def configure(self, backend):
+        self.backend = backend
+
+    def render(self, parts, caller):
+        if self.backend is None:
+            return caller()
+        name = str(parts[0]) if parts else ''
+        key = '\x1f'.join(map(str, parts))
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self._lock:
+                stat = self.stats.setdefault(name, [0, 0, 0.0])
+                stat[0] += 1
+                avg = stat[2] / stat[1] if stat[1] else 0.0
+            metrics.inc('fragment_cache_hits_total', fragment=name)
+            metrics.inc('fragment_cache_saved_seconds_total', avg, fragment=name)
+            return Markup(cached)
+        started = time.perf_counter()
+        value = caller()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stat = self.stats.setdefault(name, [0, 0, 0.0])
+            stat[1] += 1
+            stat[2] += elapsed
+        metrics.inc('fragment_cache_misses_total', fragment=name)
+        metrics.inc('fragment_cache_render_seconds_total', elapsed, fragment=name)
+        self.backend.set(key, str(value))
+        return value
+
+    def report(self):
+        """Per-fragment hit rate and estimated render time saved in this process."""
+        out = {}
+        for name, (hits, misses, render_s) in self.stats.items():
+            avg = render_s / misses if misses else 0.0
+            out[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                'avg_render_ms': avg * 1000,
+                'saved_ms': hits * avg * 1000,
+            }
+        return out
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'product_card', product.id, product.updated_at %}...{% endcache %}``
+
+    The first argument names the fragment (used for stats); all arguments
+    together form the key, so bumping ``updated_at`` invalidates naturally.
+    Never put per-user or per-session output (e.g. ``csrf_token()``) inside.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        return fragment_cache.render(parts, caller)
+
+
+def init_fragment_cache(app):
+    # Register before app.jinja_env is first used
+    app.jinja_options = {
+        **app.jinja_options,
+        'extensions': [*app.jinja_options.get('extensions', ()), FragmentCacheExtension],
+    }
+    kind = app.config.get('FRAGMENT_CACHE', 'memory')
+    size = app.config.get('FRAGMENT_CACHE_SIZE', 5000)
+    if kind == 'memory':
+        fragment_cache.configure(MemoryBackend(size))
+    elif kind == 'filesystem':
+        try:
+            fragment_cache.configure(FileSystemBackend(app.config['FRAGMENT_CACHE_DIR'], maxsize=size))
+        except OSError as exc:
+            app.logger.warning('fragment cache: %s; using the in-memory backend', exc)
+            fragment_cache.configure(MemoryBackend(size))
+    else:
+        fragment_cache.configure(None)
@@ -0,0 +1,24 @@
+import os
+import stat
+
+
+class UnsafeDirectory(OSError):
+    pass
+
+
+def private_dir(path):
+    """Create ``path`` (mode 0700) if missing and check that no other user can write to it.
+
+    The caches kept on disk are read back and trusted (compiled templates,
+    rendered HTML), so a directory someone else created or can write to is
+    refused with ``UnsafeDirectory``.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise UnsafeDirectory(f'{path} is not a directory')
+    if hasattr(os, 'geteuid') and st.st_uid != os.geteuid():
+        raise UnsafeDirectory(f'{path} is owned by another user')
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise UnsafeDirectory(f'{path} is writable by group or others')
+    return path
@@ -0,0 +1,170 @@
+import csv
+import difflib
+import math
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from flask_sqlalchemy.pagination import QueryPagination
+from sqlalchemy import and_
+
+
+Place = namedtuple('Place', 'name state lat lon')
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'gazetteer.csv')
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Grid used for the geo_cell column; 0.25 degrees is ~28 km at Malaysian latitudes
+CELL_DEGREES = 0.25
+_COLS = int(360 / CELL_DEGREES)
+_PREFIXES = ('daerah ', 'mukim ', 'bandar ', 'pekan ', 'kg ', 'kg. ', 'kampung ')
+
+
+def _key(text):
+    text = re.sub(r'[^\w\s]', ' ', (text or '').lower())
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """Normalized name/alias -> Place, loaded once from app/data/gazetteer.csv."""
+    places = {}
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            place = Place(row['name'], row['state'], float(row['lat']), float(row['lon']))
+            for alias in [row['name'], *(row['aliases'] or '').split('|')]:
+                if alias.strip():
+                    places.setdefault(_key(alias), place)
+    return places
+
+
+@lru_cache(maxsize=4096)
+def resolve(text):
+    """Best gazetteer match for free-text ``text`` or None.
+
+    Tries the whole string, then each comma-separated part (``"Raub, Pahang"``),
+    with common prefixes such as "Daerah" stripped, then a close fuzzy match
+    to absorb typos.
+    """
+    key = _key(text)
+    if not key:
+        return None
+    places = gazetteer()
+    parts = [key] + [_key(p) for p in (text or '').split(',')[:-1] if _key(p)]
+    for part in parts:
+        for candidate in (part, *(part[len(p):] for p in _PREFIXES if part.startswith(p))):
+            if candidate in places:
+                return places[candidate]
+    match = difflib.get_close_matches(key, places.keys(), n=1, cutoff=0.85)
+    return places[match[0]] if match else None
+
+
+def cell_of(lat, lon):
+    return int((lat + 90) // CELL_DEGREES) * _COLS + int((lon + 180) // CELL_DEGREES)
+
+
+def cells_within(lat, lon, radius_km):
+    """Grid cells overlapping the bounding box of a circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    row0, row1 = int((lat - dlat + 90) // CELL_DEGREES), int((lat + dlat + 90) // CELL_DEGREES)
+    col0, col1 = int((lon - dlon + 180) // CELL_DEGREES), int((lon + dlon + 180) // CELL_DEGREES)
+    return [r * _COLS + c for r in range(row0, row1 + 1) for c in range(col0, col1 + 1)]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def geo_fields(location):
+    """Column values for a listing's free-text location.
+
+    A recognised place replaces the text with its canonical name so exact
+    filters stop fragmenting on spelling; unknown text is kept as typed.
+    """
+    place = resolve(location) if location else None
+    if place is None:
+        return {'location': location or None, 'latitude': None, 'longitude': None, 'geo_cell': None}
+    return {'location': place.name, 'latitude': place.lat, 'longitude': place.lon,
+            'geo_cell': cell_of(place.lat, place.lon)}
+
+
+def set_location(obj, location):
+    for field, value in geo_fields(location).items():
+        setattr(obj, field, value)
+
+
+def within_radius(query, model, lat, lon, radius_km):
+    """Filter ``query`` to rows within ``radius_km`` and order nearest first.
+
+    The ``geo_cell IN (...)`` predicate hits the index; the rest runs on that
+    small set. Distance uses an equirectangular approximation (well under 1%
+    error at these ranges) so it is plain arithmetic in any SQL dialect.
+    """
+    scale = math.cos(math.radians(lat))
+    dist2 = (model.latitude - lat) * (model.latitude - lat) + \
+        (model.longitude - lon) * scale * (model.longitude - lon) * scale
+    limit = radius_km / KM_PER_DEGREE
+    return (
+        query.filter(and_(model.geo_cell.in_(cells_within(lat, lon, radius_km)), dist2 <= limit * limit))
+        .order_by(dist2, model.id.desc())
+    )
+
+
+class NearestPagination(QueryPagination):
+    """Pages a ``within_radius`` query by sorting ids first, then loading only that page.
+
+    Ordering by distance would otherwise pull every matching row out of the
+    table before the sort; the id-only sort runs from the geo_cell index.
+    """
+
+    def _query_items(self):
+        query, model = self._query_args['query'], self._query_args['model']
+        ids = [pk for (pk,) in query.with_entities(model.id).limit(self.per_page).offset(self._query_offset)]
+        if not ids:
+            return []
+        rows = {row.id: row for row in query.order_by(None).filter(model.id.in_(ids))}
+        return [rows[pk] for pk in ids if pk in rows]
+
+
+def paginate_nearest(query, model, near, page, per_page):
+    query = within_radius(query, model, near.lat, near.lon, near.radius_km)
+    return NearestPagination(query=query, model=model, page=page, per_page=per_page, error_out=False)
+
+
+Near = namedtuple('Near', 'text label lat lon radius_km')
+
+
+def near_from_args(args, default_radius=30.0, max_radius=200.0):
+    """Parse ``near``/``radius`` (and optional browser ``lat``/``lon``) query args.
+
+    Returns None when no proximity search was asked for, and a ``Near`` with
+    ``lat=None`` when the place could not be resolved.
+    """
+    text = args.get('near', '').strip()
+    radius = args.get('radius', type=float)
+    # float() accepts 'nan' and 'inf'; nan would slip through the clamp below
+    if radius is None or not math.isfinite(radius) or radius == 0:
+        radius = default_radius
+    radius = min(max(radius, 1.0), max_radius)
+    lat, lon = args.get('lat', type=float), args.get('lon', type=float)
+    if (lat is not None and lon is not None and math.isfinite(lat) and math.isfinite(lon)
+            and -90 <= lat <= 90 and -180 <= lon <= 180):
+        return Near(text, text or 'Lokasi saya', lat, lon, radius)
+    if not text:
+        return None
+    place = resolve(text)
+    if place is None:
+        return Near(text, text, None, None, radius)
+    return Near(text, place.name, place.lat, place.lon, radius)
+
+
+def distances_km(items, near):
+    return {
+        item.id: haversine_km(near.lat, near.lon, item.latitude, item.longitude)
+        for item in items if item.latitude is not None
+    }
@@ -0,0 +1,294 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, send_from_directory, url_for
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import Product, ProductImage
+from app.utils.compression import FAR_FUTURE
+from app.utils.metrics import describe, metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: image upload disabled
+    Image = ImageOps = None
+
+
+describe('image_uploads_total', 'counter', 'Product image uploads, by whether the bytes were already stored')
+describe('image_variants_seconds', 'histogram', 'Time to make all variants of one image (in the worker process)')
+describe('images_processed_total', 'counter', 'Images whose variants were made, by outcome')
+
+# Pillow format -> stored extension
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+CHUNK_SIZE = 64 * 1024
+# (extension, Pillow format, save options) for every variant width
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+CARD_SIZES = '(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw'
+
+VariantResult = namedtuple('VariantResult', 'widths size elapsed')
+
+
+class UploadError(ValueError):
+    pass
+
+
+def enabled():
+    return Image is not None
+
+
+def relpath(key, name):
+    return f'{key[:2]}/{key}/{name}'
+
+
+def _image_dir(key):
+    return os.path.join(current_app.config['UPLOAD_DIR'], key[:2], key)
+
+
+def original_url(image):
+    return url_for('media', filename=relpath(image.key, f'original.{image.ext}'))
+
+
+# ----------------------
+# Upload
+# ----------------------
+
+
+def save_upload(upload, user_id=None):
+    """Store an uploaded file under its sha256 and return its ProductImage (added to the session).
+
+    The body is copied to disk in chunks while it is hashed, so memory use
+    does not grow with the file; bytes already stored (same photo uploaded
+    twice, or for two listings) are kept once. Only the header is decoded
+    here: resizing happens in ``make_variants``, off the request.
+    """
+    if Image is None:
+        raise UploadError('Muat naik gambar tidak tersedia pada pelayan ini.')
+    cfg = current_app.config
+    root = cfg['UPLOAD_DIR']
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=root, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = upload.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > cfg['IMAGE_MAX_BYTES']:
+                    raise UploadError(f"Gambar terlalu besar (maksimum {cfg['IMAGE_MAX_BYTES'] // (1024 * 1024)} MB).")
+                digest.update(chunk)
+                out.write(chunk)
+        try:
+            with Image.open(tmp) as im:
+                fmt, (width, height) = im.format, im.size
+        except Exception:
+            raise UploadError('Fail bukan gambar yang sah.')
+        if fmt not in FORMATS:
+            raise UploadError('Format gambar tidak disokong (JPEG, PNG atau WebP sahaja).')
+        if width * height > cfg['IMAGE_MAX_PIXELS']:
+            raise UploadError('Resolusi gambar terlalu besar.')
+        key = digest.hexdigest()
+        dest_dir = _image_dir(key)
+        os.makedirs(dest_dir, exist_ok=True)
+        dest = os.path.join(dest_dir, f'original.{FORMATS[fmt]}')
+        duplicate = os.path.exists(dest)
+        if duplicate:
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    metrics.inc('image_uploads_total', duplicate=str(duplicate).lower())
+
+    image = db.session.get(ProductImage, key)
+    if image is None:
+        try:
+            with db.session.begin_nested():
+                image = ProductImage(key=key, ext=FORMATS[fmt], width=width, height=height, size=size,
+                                     status='pending', uploaded_by_id=user_id)
+                db.session.add(image)
+        except IntegrityError:
+            # The same bytes were uploaded concurrently
+            image = db.session.get(ProductImage, key)
+    return image
+
+
+def attach(product, image):
+    """Point ``product`` at an uploaded image (the original serves until the variants exist)."""
+    product.image_key = image.key
+    product.image_url = original_url(image)
+    product.image_widths = image.widths if image.status == 'ready' else None
+
+
+def detach(product):
+    product.image_key = None
+    product.image_widths = None
+
+
+# ----------------------
+# Variants (run in worker processes)
+# ----------------------
+
+
+def make_variants(src, out_dir, widths, max_pixels):
+    """Write ``{width}.webp`` and ``{width}.jpg`` for each width no larger than the original.
+
+    Top level and free of Flask state so it can run in a ProcessPoolExecutor.
+    Files are written to a temp name and renamed, so a variant URL never
+    serves a half-written file and re-running is harmless.
+    """
+    started = time.perf_counter()
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(src) as im:
+        largest = max(widths)
+        # JPEG: let the decoder downscale by a power of two first, much cheaper than a full decode
+        im.draft('RGB', (largest, largest))
+        im = ImageOps.exif_transpose(im)
+        alpha = im.mode in ('RGBA', 'LA', 'PA') or (im.mode == 'P' and 'transparency' in im.info)
+        base = im.convert('RGBA' if alpha else 'RGB')
+    targets = sorted({min(w, base.width) for w in widths}, reverse=True)
+    size = 0
+    for width in targets:
+        height = max(round(base.height * width / base.width), 1)
+        resized = base if width == base.width else base.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for ext, fmt, options in VARIANT_FORMATS:
+            out = resized
+            if fmt == 'JPEG' and alpha:
+                out = Image.new('RGB', resized.size, (255, 255, 255))
+                out.paste(resized, mask=resized.getchannel('A'))
+            path = os.path.join(out_dir, f'{width}.{ext}')
+            tmp = f'{path}.{os.getpid()}.tmp'
+            out.save(tmp, fmt, **options)
+            os.replace(tmp, path)
+            size += os.path.getsize(path)
+    return VariantResult(sorted(targets), size, time.perf_counter() - started)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn, not fork: forking a threaded web worker can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'],
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def _variant_args(image):
+    cfg = current_app.config
+    return (os.path.join(_image_dir(image.key), f'original.{image.ext}'), _image_dir(image.key),
+            cfg['IMAGE_WIDTHS'], cfg['IMAGE_MAX_PIXELS'])
+
+
+def _record(key, result=None, error=None):
+    image = db.session.get(ProductImage, key)
+    if image is None:
+        return
+    image.processed_at = datetime.utcnow()
+    if error is not None:
+        image.status, image.error = 'failed', f'{type(error).__name__}: {error}'[:1000]
+        metrics.inc('images_processed_total', status='failed')
+        current_app.logger.warning('image %s: variants failed: %s', key, error)
+    else:
+        widths = ','.join(map(str, result.widths))
+        image.status, image.widths, image.variant_bytes, image.error = 'ready', widths, result.size, None
+        # Bumping updated_at refreshes cached product cards and the sync API
+        db.session.query(Product).filter(Product.image_key == key).update(
+            {Product.image_widths: widths, Product.updated_at: datetime.utcnow()}, synchronize_session=False
+        )
+        metrics.observe('image_variants_seconds', result.elapsed)
+        metrics.inc('images_processed_total', status='ok')
+    db.session.commit()
+
+
+def schedule(image):
+    """Queue variant generation for a just-committed upload (no-op when the background job does it)."""
+    if image.status != 'pending' or current_app.config['IMAGE_PROCESSING'] != 'pool':
+        return
+    app = current_app._get_current_object()
+    key = image.key
+    future = _get_pool().submit(make_variants, *_variant_args(image))
+
+    def done(f):
+        with app.app_context():
+            try:
+                _record(key, result=f.result())
+            except Exception as e:
+                _record(key, error=e)
+
+    future.add_done_callback(done)
+
+
+def process_pending(older_than=None, limit=100, retry_failed=False):
+    """Make variants for images still pending (e.g. queued in a worker that then restarted).
+
+    Uses the process pool and waits, so it is safe from a job or the CLI.
+    Returns (processed, failed).
+    """
+    if Image is None:
+        return 0, 0
+    statuses = ('pending', 'failed') if retry_failed else ('pending',)
+    query = ProductImage.query.filter(ProductImage.status.in_(statuses))
+    if older_than:
+        query = query.filter(ProductImage.created_at < datetime.utcnow() - timedelta(seconds=older_than))
+    images = query.order_by(ProductImage.created_at).limit(limit).all()
+    futures = [(image.key, _get_pool().submit(make_variants, *_variant_args(image))) for image in images]
+    failed = 0
+    for key, future in futures:
+        try:
+            _record(key, result=future.result())
+        except Exception as e:
+            failed += 1
+            _record(key, error=e)
+    return len(futures) - failed, failed
+
+
+# ----------------------
+# Serving
+# ----------------------
+
+
+def init_images(app):
+    def media(filename):
+        # Content-addressed: a URL's bytes never change
+        response = send_from_directory(app.config['UPLOAD_DIR'], filename, max_age=FAR_FUTURE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.add_url_rule('/media/<path:filename>', 'media', media)
+
+    @app.template_global()
+    def image_srcset(product, ext):
+        key = product.image_key
+        return ', '.join(f"{url_for('media', filename=relpath(key, f'{w}.{ext}'))} {w}w"
+                         for w in product.image_widths.split(','))
+
+    @app.template_global()
+    def image_variant_url(product, ext, width):
+        widths = [int(w) for w in product.image_widths.split(',')]
+        best = next((w for w in widths if w >= width), widths[-1])
+        return url_for('media', filename=relpath(product.image_key, f'{best}.{ext}'))
+
+    app.jinja_env.globals['image_sizes'] = CARD_SIZES
@@ -0,0 +1,269 @@
+import atexit
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import JobLease, JobRun
+from app.utils.metrics import describe, metrics
+
+
+describe('job_run_seconds', 'histogram', 'Scheduled job run time, by job and outcome')
+describe('job_runs_total', 'counter', 'Scheduled job runs, by job and outcome (ok, failed, timeout)')
+describe('jobs_leader', 'gauge', '1 while this process holds the scheduler lease')
+
+LEADER_LEASE = 'scheduler'
+
+Job = namedtuple('Job', 'name func interval timeout jitter')
+
+
+class Scheduler:
+    """Periodic jobs run by whichever process holds the ``scheduler`` lease row.
+
+    Every web worker (and any ``flask jobs run`` process) runs this loop;
+    only the lease holder starts jobs. The holder renews the lease every
+    third of ``lease_seconds``; if it dies, another process takes over once
+    the lease lapses and resumes each job's schedule from ``job_runs``.
+
+    Jobs run in their own thread. A run still going after its ``timeout`` is
+    recorded as ``timeout`` and the job is not started again until it
+    returns: Python threads cannot be killed, so long jobs should commit in
+    batches and be safe to re-run, as every built-in job is.
+    """
+
+    def __init__(self, lease_seconds=30.0, tick=1.0):
+        self.jobs = {}
+        self.app = None
+        self.lease_seconds = lease_seconds
+        self.tick = tick
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.leader = False
+        self._lease_checked = 0.0
+        self._next = {}
+        self._running = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def job(self, name, interval, timeout=None, jitter=None):
+        """Register the decorated function to run every ``interval`` seconds (plus up to ``jitter``)."""
+        def decorator(func):
+            self.jobs[name] = Job(name, func, float(interval), float(timeout or interval),
+                                  float(interval * 0.1 if jitter is None else jitter))
+            return func
+        return decorator
+
+    # ----------------------
+    # Lease
+    # ----------------------
+
+    def _acquire(self, now):
+        table = JobLease.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+            db.session.execute(insert(table).values(name=LEADER_LEASE).on_conflict_do_nothing(index_elements=[table.c.name]))
+        elif db.session.get(JobLease, LEADER_LEASE) is None:
+            try:
+                db.session.execute(table.insert().values(name=LEADER_LEASE))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+        # Take it if it is ours, free or lapsed; the row update is the election
+        won = db.session.execute(
+            update(table)
+            .where(table.c.name == LEADER_LEASE,
+                   or_(table.c.holder == self.holder, table.c.expires_at.is_(None), table.c.expires_at < now))
+            .values(holder=self.holder, expires_at=now + timedelta(seconds=self.lease_seconds))
+        ).rowcount == 1
+        db.session.commit()
+        return won
+
+    def release(self):
+        """Give up the lease (at shutdown) so another process can take over without waiting."""
+        if self.app is None or not self.leader:
+            return
+        with self.app.app_context():
+            table = JobLease.__table__
+            db.session.execute(
+                update(table).where(table.c.name == LEADER_LEASE, table.c.holder == self.holder)
+                .values(holder=None, expires_at=None)
+            )
+            db.session.commit()
+        self.leader = False
+        metrics.set_gauge('jobs_leader', 0)
+
+    def _became_leader(self, now):
+        # Runs a previous leader left open can never be finished by it now
+        db.session.query(JobRun).filter(
+            JobRun.status == 'running', JobRun.holder != self.holder, ~JobRun.holder.startswith('manual:')
+        ).update(
+            {JobRun.status: 'lost', JobRun.finished_at: now}, synchronize_session=False
+        )
+        db.session.commit()
+        last = dict(db.session.query(JobRun.job, func.max(JobRun.started_at)).group_by(JobRun.job))
+        for job in self.jobs.values():
+            base = last[job.name] + timedelta(seconds=job.interval) if job.name in last else now
+            self._next[job.name] = base + timedelta(seconds=random.uniform(0, job.jitter))
+
+    # ----------------------
+    # Loop
+    # ----------------------
+
+    def tick_once(self):
+        """One step: renew or try to take the lease, then (as leader) time out and start jobs."""
+        now = datetime.utcnow()
+        if time.monotonic() - self._lease_checked >= self.lease_seconds / 3:
+            self._lease_checked = time.monotonic()
+            was_leader, self.leader = self.leader, self._acquire(now)
+            if self.leader != was_leader:
+                metrics.set_gauge('jobs_leader', int(self.leader))
+                self.app.logger.info('scheduler %s %s the lease', self.holder, 'took' if self.leader else 'lost')
+                if self.leader:
+                    self._became_leader(now)
+        if not self.leader:
+            return
+        self._check_timeouts()
+        for job in self.jobs.values():
+            if job.name not in self._running and self._next.get(job.name, now) <= now:
+                self._start(job, now)
+
+    def _start(self, job, now):
+        run = JobRun(job=job.name, holder=self.holder, status='running', started_at=now)
+        db.session.add(run)
+        db.session.commit()
+        self._next[job.name] = now + timedelta(seconds=job.interval + random.uniform(0, job.jitter))
+        thread = threading.Thread(target=self.execute, args=(job, run.id), name=f'job-{job.name}', daemon=True)
+        self._running[job.name] = [thread, run.id, time.monotonic(), False]
+        thread.start()
+
+    def _check_timeouts(self):
+        for name, entry in list(self._running.items()):
+            thread, run_id, started, timed_out = entry
+            if not thread.is_alive():
+                del self._running[name]
+            elif not timed_out and time.monotonic() - started > self.jobs[name].timeout:
+                entry[3] = True
+                db.session.query(JobRun).filter(JobRun.id == run_id, JobRun.status == 'running').update(
+                    {JobRun.status: 'timeout'}, synchronize_session=False
+                )
+                db.session.commit()
+                metrics.inc('job_runs_total', job=name, status='timeout')
+                self.app.logger.warning('job %s exceeded its %ss timeout', name, self.jobs[name].timeout)
+
+    def execute(self, job, run_id):
+        """Run ``job`` and record the outcome on its ``job_runs`` row."""
+        started = time.perf_counter()
+        status, detail = 'ok', None
+        try:
+            with self.app.app_context():
+                result = job.func()
+                detail = None if result is None else str(result)[:1000]
+        except Exception as e:
+            status, detail = 'failed', f'{type(e).__name__}: {e}'[:1000]
+            self.app.logger.exception('job %s failed', job.name)
+        elapsed = time.perf_counter() - started
+        counted = False
+        try:
+            with self.app.app_context():
+                values = {JobRun.finished_at: datetime.utcnow(), JobRun.duration: elapsed, JobRun.detail: detail}
+                # A run already marked (and counted) as timed out keeps that status
+                if not db.session.query(JobRun).filter(JobRun.id == run_id, JobRun.status == 'running').update(
+                        {**values, JobRun.status: status}, synchronize_session=False):
+                    db.session.query(JobRun).filter(JobRun.id == run_id).update(values, synchronize_session=False)
+                    status, counted = 'timeout', True
+                db.session.commit()
+        except Exception:
+            self.app.logger.exception('could not record the run of job %s', job.name)
+        metrics.observe('job_run_seconds', elapsed, job=job.name, status=status)
+        if not counted:
+            metrics.inc('job_runs_total', job=job.name, status=status)
+        return status, detail
+
+    def run_now(self, name):
+        """Run one job in the foreground, outside the schedule (``flask jobs run-once``)."""
+        job = self.jobs[name]
+        run = JobRun(job=name, holder=f'manual:{self.holder}', status='running', started_at=datetime.utcnow())
+        db.session.add(run)
+        db.session.commit()
+        return self.execute(job, run.id)
+
+    def _loop(self):
+        while not self._stop.wait(self.tick):
+            try:
+                with self.app.app_context():
+                    self.tick_once()
+            except Exception:
+                self.app.logger.exception('scheduler tick failed')
+
+    def start(self):
+        """Start the loop in a daemon thread (once per process, after any fork)."""
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None and self.app is not None:
+            self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        """Run the loop in the foreground (``flask jobs run``) until interrupted."""
+        try:
+            with self.app.app_context():
+                self.tick_once()
+            self._loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.release()
+
+    def stop(self):
+        self._stop.set()
+
+
+scheduler = Scheduler()
+
+
+def job_overview():
+    """[(job, last JobRun or None, next run estimate)] for every registered job."""
+    last_ids = db.session.query(func.max(JobRun.id)).group_by(JobRun.job)
+    last = {run.job: run for run in JobRun.query.filter(JobRun.id.in_(last_ids))}
+    out = []
+    for job in sorted(scheduler.jobs.values(), key=lambda j: j.name):
+        run = last.get(job.name)
+        due = scheduler._next.get(job.name) or (run.started_at + timedelta(seconds=job.interval) if run else None)
+        out.append((job, run, due))
+    return out
+
+
+def prune_runs(days):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    n = db.session.query(JobRun).filter(JobRun.started_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def init_scheduler(app):
+    from app import jobs  # noqa: F401  (registers the built-in jobs)
+    scheduler.app = app
+    scheduler.lease_seconds = app.config.get('JOBS_LEASE_SECONDS', 30.0)
+    scheduler.tick = app.config.get('JOBS_TICK_SECONDS', 1.0)
+    if app.config.get('JOBS_ENABLED', True):
+        # Started from the first request so it runs in each forked worker, not the master
+        app.before_request(scheduler.start)
+
+
+@atexit.register
+def _release_at_exit():
+    scheduler.release()
@@ -0,0 +1,177 @@
+import math
+import random
+import threading
+import time
+
+from flask import jsonify, render_template, request, session
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app.utils.metrics import describe, metrics
+
+
+describe('request_queue_seconds', 'histogram', 'Time a request waited before a worker picked it up (from the proxy header)')
+describe('db_pool_wait_seconds', 'histogram', 'Time to check a connection out of the DB pool')
+describe('load_shed_total', 'counter', 'Requests refused with 503 by the load shedder, by priority and signal')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class DecayingAverage:
+    """Time-weighted moving average of a latency signal, in seconds.
+
+    An observation ``dt`` seconds after the previous one gets weight
+    ``1 - 0.5 ** (dt / half_life)`` (at least ``min_weight``), so the average
+    tracks the last few half-lives however busy the worker is. With no new
+    observations for longer than a half-life the value fades towards zero,
+    so a signal that stops arriving (say, all DB work was shed) cannot keep
+    the worker shedding.
+
+    No single observation moves the average by more than ``max_weight``
+    (the first one included: it is averaged with an idle zero), and each is
+    clamped to ``ceiling``, so one outlier cannot start shedding on its own.
+    """
+
+    def __init__(self, half_life=2.0, min_weight=0.05, max_weight=0.15, ceiling=None):
+        self.half_life = half_life
+        self.min_weight = min_weight
+        self.max_weight = max_weight
+        self.ceiling = ceiling
+        self.value = 0.0
+        self.at = None
+        self._lock = threading.Lock()
+
+    def observe(self, x, now=None):
+        now = time.monotonic() if now is None else now
+        if self.ceiling is not None:
+            x = min(x, self.ceiling)
+        with self._lock:
+            if self.at is None:
+                weight = self.max_weight
+            else:
+                weight = max(1 - 0.5 ** ((now - self.at) / self.half_life), self.min_weight)
+            self.value += (x - self.value) * min(weight, self.max_weight)
+            self.at = now
+
+    def read(self, now=None):
+        if self.at is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        idle = now - self.at - self.half_life
+        return self.value * 0.5 ** (idle / self.half_life) if idle > 0 else self.value
+
+
+queue_wait = DecayingAverage()
+pool_wait = DecayingAverage()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited (including opening a new connection)."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - started
+            pool_wait.observe(elapsed)
+            metrics.observe('db_pool_wait_seconds', elapsed)
+
+
+def configure_pool_timing(app):
+    # Must run before db.init_app creates the engine. SQLite in memory keeps its single-connection pool.
+    if not app.config.get('LOAD_SHED_ENABLED'):
+        return
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('poolclass', TimedQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def protect(methods=None):
+    """Mark a view as never shed (for ``methods`` only, if given), e.g. order placement."""
+    def decorator(view):
+        view.load_shed_protect = tuple(methods) if methods else True
+        return view
+    return decorator
+
+
+def queue_time(header_value, now=None):
+    """Seconds since the proxy stamped ``X-Request-Start`` (``t=`` prefix; s, ms or us since the epoch)."""
+    if not header_value:
+        return None
+    try:
+        stamp = float(header_value.strip().removeprefix('t='))
+    except ValueError:
+        return None
+    if stamp > 1e14:
+        stamp /= 1e6
+    elif stamp > 1e11:
+        stamp /= 1e3
+    waited = (time.time() if now is None else now) - stamp
+    # Clock skew between proxy and app can make it slightly negative; absurd values are ignored
+    return max(waited, 0.0) if waited < 300 else None
+
+
+def priority(app):
+    """critical (never shed), normal (signed-in users) or low (anonymous browsing)."""
+    view = app.view_functions.get(request.endpoint)
+    protected = getattr(view, 'load_shed_protect', None)
+    if protected is True or (protected and request.method in protected):
+        return 'critical'
+    if session.get('is_admin'):
+        # Moderation keeps working through a spike
+        return 'critical'
+    if session.get('user_id') or request.method not in SAFE_METHODS:
+        return 'normal'
+    return 'low'
+
+
+def _shed_response(app, retry_after):
+    message = 'Pelayan sedang sibuk. Sila cuba lagi sebentar lagi.'
+    if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+        response = jsonify(error=message)
+    else:
+        response = app.make_response(render_template('503.html', retry_after=retry_after))
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def init_load_shedding(app):
+    if not app.config.get('LOAD_SHED_ENABLED'):
+        return
+    header = app.config['LOAD_SHED_QUEUE_HEADER']
+    queue_target = app.config['LOAD_SHED_QUEUE_TARGET_MS'] / 1000
+    pool_target = app.config['LOAD_SHED_POOL_TARGET_MS'] / 1000
+    normal_factor = app.config['LOAD_SHED_NORMAL_FACTOR']
+    retry_after = app.config['LOAD_SHED_RETRY_AFTER']
+    queue_wait.half_life = pool_wait.half_life = app.config['LOAD_SHED_HALF_LIFE']
+    # Samples beyond the point where normal traffic is fully shed carry no extra information
+    queue_wait.ceiling = 2 * normal_factor * queue_target
+    pool_wait.ceiling = 2 * normal_factor * pool_target
+
+    @app.before_request
+    def _shed_load():
+        waited = queue_time(request.headers.get(header)) if header else None
+        if waited is not None:
+            queue_wait.observe(waited)
+            metrics.observe('request_queue_seconds', waited)
+        queue_pressure = queue_wait.read() / queue_target
+        pool_pressure = pool_wait.read() / pool_target
+        pressure = max(queue_pressure, pool_pressure)
+        if pressure < 1:
+            return
+        level = priority(app)
+        if level == 'critical':
+            return
+        threshold = 1.0 if level == 'low' else normal_factor
+        # Shed a growing share above the threshold (all of it at twice the threshold), so load
+        # eases off gradually instead of flapping between everything and nothing
+        if pressure < threshold or random.random() >= (pressure - threshold) / threshold:
+            return
+        metrics.inc('load_shed_total', priority=level, signal='queue' if queue_pressure >= pool_pressure else 'pool')
+        return _shed_response(app, min(math.ceil(retry_after * pressure / threshold), 60))
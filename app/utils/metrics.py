@@ -0,0 +1,366 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+from app.utils.fs import private_dir
+
+
+# Latency buckets in seconds (Prometheus convention: upper bounds, cumulative on export)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help). Undeclared names are exported as untyped.
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint and method'),
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status class'),
+    'http_requests_in_flight': ('gauge', 'Requests currently being served'),
+    'http_rate_limited_total': ('counter', 'Requests rejected with 429 by the rate limiter'),
+    'db_pool_size': ('gauge', 'Configured DB connection pool size'),
+    'db_pool_checked_out': ('gauge', 'DB connections currently checked out'),
+    'db_pool_overflow': ('gauge', 'DB connections opened beyond the pool size'),
+    'email_send_duration_seconds': ('histogram', 'Time spent sending email via SMTP'),
+    'email_send_total': ('counter', 'Email send attempts by result (sent, failed, skipped)'),
+    'orders_created_total': ('counter', 'Orders created'),
+    'listings_approved_total': ('counter', 'Listings approved by moderators, by kind'),
+}
+
+
+def describe(name, mtype, help_text):
+    # Lets other modules declare their own metrics next to where they record them
+    METRICS.setdefault(name, (mtype, help_text))
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+class MetricsRegistry:
+    """Per-process metric store, periodically dumped to ``<dir>/<pid>.json``.
+
+    Each gunicorn worker records into memory (a dict update under a lock) and
+    writes its snapshot at most once per ``flush_interval``. ``/metrics`` merges
+    every snapshot in the directory so the scrape covers all workers.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = 1.0
+        self.buckets = DEFAULT_BUCKETS
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._in_flight = 0
+        self._in_flight_fd = None  # inherited descriptors belong to the parent's file
+
+    def configure(self, directory, flush_interval=1.0, enabled=True):
+        self.enabled = enabled
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if self._in_flight_fd is not None:
+            os.close(self._in_flight_fd)
+            self._in_flight_fd = None
+        if enabled and directory:
+            private_dir(directory)
+
+    def _check_fork(self):
+        # State inherited from a preloading master must not be double counted
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._check_fork()
+            self._gauges[key] = value
+
+    def add_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._check_fork()
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def track_request(self, delta):
+        """Adjust this worker's in-flight count and publish it at once.
+
+        Snapshots are written after a request finishes, when a sync worker is
+        always idle, so the count lives in its own fixed-width ``<pid>.inflight``
+        file, rewritten in place on every change.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._check_fork()
+            self._in_flight += delta
+            if not self.directory:
+                return
+            try:
+                if self._in_flight_fd is None:
+                    path = os.path.join(self.directory, f'{self._pid}.inflight')
+                    self._in_flight_fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+                os.lseek(self._in_flight_fd, 0, os.SEEK_SET)
+                os.write(self._in_flight_fd, b'%20d' % self._in_flight)
+            except OSError:
+                pass
+
+    def _in_flight_total(self):
+        with self._lock:
+            self._check_fork()
+            total, own = self._in_flight, self._pid
+        if not self.directory or not os.path.isdir(self.directory):
+            return total
+        for fname in os.listdir(self.directory):
+            pid, _, ext = fname.partition('.')
+            if ext != 'inflight' or not pid.isdigit() or int(pid) == own or not _pid_alive(int(pid)):
+                continue
+            try:
+                with open(os.path.join(self.directory, fname), 'rb') as fh:
+                    total += int(fh.read() or 0)
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._check_fork()
+            hist = self._histograms.get(key)
+            if hist is None:
+                # bucket counts (+Inf last), then sum, then count
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            hist[idx] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'pid': self._pid,
+                'counters': [[n, list(map(list, l)), v] for (n, l), v in self._counters.items()],
+                'gauges': [[n, list(map(list, l)), v] for (n, l), v in self._gauges.items()],
+                'histograms': [[n, list(map(list, l)), list(h)] for (n, l), h in self._histograms.items()],
+            }
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def maybe_flush(self, force=False):
+        if not self.enabled or not self.directory:
+            return
+        if not force and not self.flush_due():
+            return
+        self._last_flush = time.monotonic()
+        data = self.snapshot()
+        path = os.path.join(self.directory, f"{data['pid']}.json")
+        tmp = f'{path}.tmp'
+        try:
+            with open(tmp, 'w') as fh:
+                json.dump(data, fh, separators=(',', ':'))
+            os.replace(tmp, path)
+        except OSError:
+            # Metrics are best-effort and must never break a request
+            pass
+
+    def _load_snapshots(self):
+        if not self.directory:
+            # No shared directory: this worker's own numbers only
+            return [self.snapshot()]
+        snapshots = []
+        if not os.path.isdir(self.directory):
+            return snapshots
+        for fname in os.listdir(self.directory):
+            if not fname.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, fname)) as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def collect(self):
+        """Merge all worker snapshots. Gauges of dead workers are dropped."""
+        self.maybe_flush(force=True)
+        counters, gauges, histograms = {}, {}, {}
+        for snap in self._load_snapshots():
+            alive = _pid_alive(snap.get('pid'))
+            for name, labels, value in snap.get('counters', []):
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            if alive:
+                for name, labels, value in snap.get('gauges', []):
+                    key = (name, tuple(map(tuple, labels)))
+                    gauges[key] = gauges.get(key, 0) + value
+            for name, labels, hist in snap.get('histograms', []):
+                key = (name, tuple(map(tuple, labels)))
+                acc = histograms.get(key)
+                if acc is None or len(acc) != len(hist):
+                    histograms[key] = list(hist)
+                else:
+                    histograms[key] = [a + b for a, b in zip(acc, hist)]
+        gauges[('http_requests_in_flight', ())] = self._in_flight_total()
+        return counters, gauges, histograms
+
+    def render(self):
+        counters, gauges, histograms = self.collect()
+        series = {}
+        for store in (counters, gauges, histograms):
+            for (name, labels), value in store.items():
+                series.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(series):
+            mtype, help_text = METRICS.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {mtype}')
+            for labels, value in sorted(series[name], key=lambda s: s[0]):
+                if mtype == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(list(self.buckets) + ['+Inf'], value[:-2]):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels, ("le", bound))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def clear_metrics_dir(directory):
+    # Called once from the gunicorn master before workers start
+    if not directory or not os.path.isdir(directory):
+        return
+    for fname in os.listdir(directory):
+        if fname.endswith(('.json', '.tmp', '.inflight')):
+            try:
+                os.remove(os.path.join(directory, fname))
+            except OSError:
+                pass
+
+
+metrics = MetricsRegistry()
+
+
+class timed:
+    """Context manager observing elapsed seconds into a histogram."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc):
+        metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _record_pool_usage():
+    from app.extensions import db
+    try:
+        pool = db.engine.pool
+    except Exception:
+        return
+    for metric, attr in (('db_pool_size', 'size'), ('db_pool_checked_out', 'checkedout'), ('db_pool_overflow', 'overflow')):
+        fn = getattr(pool, attr, None)
+        if callable(fn):
+            try:
+                metrics.set_gauge(metric, max(fn(), 0))
+            except Exception:
+                pass
+
+
+def init_metrics(app):
+    options = dict(flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 1.0),
+                   enabled=app.config.get('METRICS_ENABLED', True))
+    try:
+        metrics.configure(app.config.get('METRICS_DIR'), **options)
+    except OSError as exc:
+        app.logger.warning('metrics: %s; not sharing metrics between workers', exc)
+        metrics.configure(None, **options)
+    if not metrics.enabled:
+        return
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        g._metrics_in_flight = True
+        metrics.track_request(1)
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            _observe_request(time.perf_counter() - start, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            # after_request did not run: the view raised
+            _observe_request(time.perf_counter() - start, 500)
+        if g.pop('_metrics_in_flight', False):
+            metrics.track_request(-1)
+        if metrics.flush_due():
+            _record_pool_usage()
+            metrics.maybe_flush()
+
+
+def _observe_request(elapsed, status_code):
+    endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+    method = request.method
+    metrics.observe('http_request_duration_seconds', elapsed, endpoint=endpoint, method=method)
+    metrics.inc('http_requests_total', endpoint=endpoint, method=method, status=f'{status_code // 100}xx')
@@ -0,0 +1,240 @@
+import re
+import statistics
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models import AuditLog, PawahProject, Product
+from app.utils.metrics import describe, metrics
+from app.utils.price_index import market_for, review as review_price
+from app.utils.seller_stats import listing_changed
+
+
+describe('moderation_fast_lane_total', 'counter', 'Listings approved on submission because the seller is trusted')
+describe('moderation_latency_seconds', 'histogram', 'Time from submission to approval, by kind and lane (fast or manual)')
+
+# Risk points (0..100, higher needs a closer look); the queue shows the lowest first
+HISTORY_POINTS = 40  # times the seller's smoothed rejection rate; a new seller gets half
+FLAG_POINTS = {
+    'kenalan': 15,
+    'harga': 15,
+    'ringkas': 10,
+    'huruf_besar': 5,
+    'tiada_gambar': 5,
+}
+DUPLICATE_POINTS = 30  # times the duplicate's similarity
+FLAG_LABELS = {
+    'kenalan': 'Ada nombor telefon / pautan',
+    'harga': 'Harga jauh dari pasaran',
+    'ringkas': 'Keterangan terlalu ringkas',
+    'huruf_besar': 'Tajuk huruf besar',
+    'tiada_gambar': 'Tiada gambar',
+    'pendua': 'Mungkin pendua',
+}
+# A price this many times above or below the market median is unusual
+PRICE_FACTOR = 3
+
+CONTACT_RE = re.compile(r'(\+?6?0[\s-]?1\d(?:[\s-]?\d){7,8})|https?://|www\.|wa\.me|t\.me|\S+@\S+\.\w+', re.I)
+
+History = namedtuple('History', 'approved rejected recent_rejected')
+
+KINDS = {
+    # kind: (model, owner column)
+    'product': (Product, Product.seller_id),
+    'pawah': (PawahProject, PawahProject.owner_id),
+}
+
+
+def owner_id(obj):
+    return obj.seller_id if isinstance(obj, Product) else obj.owner_id
+
+
+def seller_history(user_id, days=None):
+    """Moderator decisions on the user's listings, from the audit log (fast lane approvals don't count)."""
+    days = current_app.config['MODERATION_TRUST_DAYS'] if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    approved = rejected = recent = 0
+    for kind, (model, owner) in KINDS.items():
+        rows = db.session.execute(
+            select(AuditLog.action, func.count(), func.sum(case((AuditLog.created_at >= cutoff, 1), else_=0)))
+            .join(model, and_(AuditLog.entity_type == kind, AuditLog.entity_id == model.id))
+            .where(owner == user_id, AuditLog.action.in_(('approve', 'reject')), AuditLog.actor_id.isnot(None))
+            .group_by(AuditLog.action)
+        )
+        for action, n, n_recent in rows:
+            if action == 'approve':
+                approved += n
+            else:
+                rejected += n
+                recent += n_recent or 0
+    return History(approved, rejected, recent)
+
+
+def content_flags(kind, obj, markets=None):
+    """Reasons to look closer at the listing itself; ``markets`` caches price stats across a batch."""
+    text = f'{obj.title or ""} {obj.description or ""}'
+    flags = []
+    if CONTACT_RE.search(text):
+        flags.append('kenalan')
+    if len((obj.description or '').split()) < 5:
+        flags.append('ringkas')
+    letters = [c for c in obj.title or '' if c.isalpha()]
+    if len(letters) >= 6 and sum(c.isupper() for c in letters) > 0.7 * len(letters):
+        flags.append('huruf_besar')
+    if kind == 'product':
+        if not (obj.image_key or obj.image_url):
+            flags.append('tiada_gambar')
+        markets = {} if markets is None else markets
+        key = (obj.category, obj.location, obj.unit)
+        if key not in markets:
+            markets[key] = market_for(obj)[0]
+        stats = markets[key]
+        if stats and stats.median and obj.price is not None:
+            ratio = float(obj.price) / stats.median
+            if ratio > PRICE_FACTOR or ratio < 1 / PRICE_FACTOR:
+                flags.append('harga')
+    return flags
+
+
+def score(kind, obj, history=None, markets=None):
+    """(risk 0..100, flags) for a listing from its seller's history, its content and any duplicate found."""
+    history = history or seller_history(owner_id(obj))
+    risk = HISTORY_POINTS * (history.rejected + 1) / (history.approved + history.rejected + 2)
+    flags = content_flags(kind, obj, markets)
+    risk += sum(FLAG_POINTS[f] for f in flags)
+    if obj.duplicate_of_id is not None:
+        flags.append('pendua')
+        risk += DUPLICATE_POINTS * (obj.duplicate_score or 0)
+    return min(int(round(risk)), 100), flags
+
+
+def _triage(kind, obj, history, markets=None):
+    obj.triage_score, flags = score(kind, obj, history, markets)
+    obj.triage_flags = ','.join(flags) or None
+    return flags
+
+
+def trusted(history):
+    return (history.approved >= current_app.config['MODERATION_TRUSTED_APPROVALS']
+            and history.recent_rejected == 0)
+
+
+def submit(kind, obj):
+    """Score a new or resubmitted listing (flushed, after ``duplicates.check``); the caller commits.
+
+    With MODERATION_FAST_LANE on, a listing from a trusted seller with no
+    flags at all is approved straight away. Returns True if it was.
+    """
+    now = datetime.utcnow()
+    obj.submitted_at = now
+    history = seller_history(owner_id(obj))
+    flags = _triage(kind, obj, history)
+    if not (current_app.config['MODERATION_FAST_LANE'] and trusted(history) and not flags):
+        return False
+    obj.is_approved = True
+    obj.rejection_reason = None
+    obj.approved_at = obj.reviewed_at = now
+    obj.reviewed_by_id = None
+    db.session.add(AuditLog(entity_type=kind, entity_id=obj.id, action='approve', actor_id=None, meta='fast_lane'))
+    if kind == 'product':
+        listing_changed(obj, False)
+        review_price(obj)
+    metrics.inc('moderation_fast_lane_total', kind=kind)
+    metrics.inc('listings_approved_total', kind=kind)
+    _observe_latency(kind, obj, 'fast')
+    return True
+
+
+def _observe_latency(kind, obj, lane):
+    if obj.submitted_at and obj.approved_at:
+        metrics.observe('moderation_latency_seconds', (obj.approved_at - obj.submitted_at).total_seconds(),
+                        kind=kind, lane=lane)
+
+
+def decided(kind, obj):
+    """After a moderator's decision: record latency and re-score the seller's other pending listings."""
+    if obj.is_approved:
+        _observe_latency(kind, obj, 'manual')
+    return rescore_owner(owner_id(obj))
+
+
+def submit_ids(kind, ids):
+    """Score listings inserted in bulk (imports); they always wait for a moderator."""
+    model, _owner = KINDS[kind]
+    histories, markets = {}, {}
+    now = datetime.utcnow()
+    for obj in model.query.filter(model.id.in_(ids)):
+        user_id = owner_id(obj)
+        if user_id not in histories:
+            histories[user_id] = seller_history(user_id)
+        obj.submitted_at = now
+        _triage(kind, obj, histories[user_id], markets)
+
+
+def pending(model):
+    return model.query.filter_by(is_approved=False, reviewed_at=None)
+
+
+def rescore_owner(user_id):
+    history = seller_history(user_id)
+    n = 0
+    for kind, (model, owner) in KINDS.items():
+        for obj in pending(model).filter(owner == user_id):
+            _triage(kind, obj, history)
+            n += 1
+    return n
+
+
+def rescore(kind, batch_size=500, echo=None):
+    """Re-score every listing awaiting review (after the migration, or when the weights change)."""
+    model, _owner = KINDS[kind]
+    histories, markets = {}, {}
+    last_id = n = 0
+    while True:
+        batch = pending(model).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for obj in batch:
+            user_id = owner_id(obj)
+            if user_id not in histories:
+                histories[user_id] = seller_history(user_id)
+            _triage(kind, obj, histories[user_id], markets)
+            if obj.submitted_at is None:
+                obj.submitted_at = obj.created_at
+        db.session.commit()
+        n += len(batch)
+        if echo:
+            echo(f'{kind}: {n} re-scored')
+    return n
+
+
+def queue(model, limit):
+    """The next ``limit`` listings to review: lowest risk first, then longest waiting (ix_*_triage)."""
+    return (
+        pending(model).options(selectinload(model.duplicate_of))
+        .order_by(model.triage_score, model.submitted_at).limit(limit).all()
+    )
+
+
+Latency = namedtuple('Latency', 'n median p90 fast')
+
+
+def approval_latency(kind, days=30, limit=5000):
+    """Submission-to-approval time of the newest ``limit`` approvals in the last ``days``, in seconds."""
+    model, _owner = KINDS[kind]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.execute(
+        select(model.submitted_at, model.approved_at, model.reviewed_by_id)
+        .where(model.approved_at >= cutoff, model.submitted_at.isnot(None))
+        .order_by(model.approved_at.desc()).limit(limit)
+    ).all()
+    waits = sorted(max((approved_at - submitted_at).total_seconds(), 0.0) for submitted_at, approved_at, _ in rows)
+    if not waits:
+        return Latency(0, None, None, 0)
+    return Latency(len(waits), statistics.median(waits), waits[int(0.9 * (len(waits) - 1))],
+                   sum(1 for *_, reviewer in rows if reviewer is None))
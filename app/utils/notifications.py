@@ -1,6 +1,7 @@
 from flask import current_app
 from flask_mail import Message
 from app.extensions import mail
+from app.utils.metrics import metrics, timed
 
 
 def safe_send_email(to_email: str, subject: str, body: str) -> bool:
@@ -8,13 +9,18 @@ def safe_send_email(to_email: str, subject: str, body: str) -> bool:
         app = current_app
         cfg = app.config
         if not cfg.get('ENABLE_EMAIL'):
+            metrics.inc('email_send_total', result='skipped')
             return False
         if not cfg.get('MAIL_SERVER') or not to_email:
+            metrics.inc('email_send_total', result='skipped')
             return False
         msg = Message(subject=subject, recipients=[to_email])
         msg.body = body
-        mail.send(msg)
+        with timed('email_send_duration_seconds'):
+            mail.send(msg)
+        metrics.inc('email_send_total', result='sent')
         return True
     except Exception:
         # Never raise to callers – email is best-effort
+        metrics.inc('email_send_total', result='failed')
         return False
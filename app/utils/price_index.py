@@ -0,0 +1,264 @@
+import math
+import time
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.extensions import db
+from app.models import PriceBucket, PriceHistory, Product
+from app.utils.metrics import describe, metrics
+
+
+describe('price_history_compacted_total', 'counter', 'Price history rows deleted by compaction')
+
+# Log-spaced buckets 2% wide: a bucket's midpoint is within 1% of any price in it
+BUCKET_RATIO = 1.02
+_LOG_RATIO = math.log(BUCKET_RATIO)
+# Fewer observations than this in a location: fall back to the whole category
+MIN_SAMPLE = 5
+
+PriceStats = namedtuple('PriceStats', 'n p25 median p75')
+CompactResult = namedtuple('CompactResult', 'history buckets elapsed')
+
+
+def bucket_of(price):
+    return math.floor(math.log(max(float(price), 0.01)) / _LOG_RATIO)
+
+
+def bucket_value(bucket):
+    return round(BUCKET_RATIO ** (bucket + 0.5), 2)
+
+
+def week_of(when):
+    day = when.date() if isinstance(when, datetime) else when
+    return day - timedelta(days=day.weekday())
+
+
+def _key(product):
+    return (product.category or '').strip(), (product.location or '').strip(), (product.unit or '').strip()
+
+
+def price_key(product):
+    """What a history row records; an edit that leaves this alone adds no row."""
+    return (product.price,) + _key(product)
+
+
+def record(product):
+    """Append ``product``'s current asking price to its history (in the caller's transaction).
+
+    Rows start uncounted: they join the market statistics when the listing is
+    approved (``review``), so prices that moderation rejects never skew them.
+    """
+    category, location, unit = _key(product)
+    db.session.add(PriceHistory(product=product, category=category, location=location, unit=unit,
+                                price=product.price, recorded_at=datetime.utcnow()))
+
+
+def record_many(rows):
+    """``record`` for ``(product_id, values)`` pairs from a bulk insert."""
+    now = datetime.utcnow()
+    db.session.execute(PriceHistory.__table__.insert(), [
+        {'product_id': product_id, 'price': v['price'], 'category': (v.get('category') or '').strip(),
+         'location': (v.get('location') or '').strip(), 'unit': (v.get('unit') or '').strip(),
+         'counted': False, 'recorded_at': now}
+        for product_id, v in rows
+    ])
+
+
+def review(product):
+    """Count or uncount the product's latest price after a moderation decision."""
+    latest = (
+        PriceHistory.query.filter(PriceHistory.product_id == product.id)
+        .order_by(PriceHistory.id.desc()).first()
+    )
+    if latest is None or latest.counted == bool(product.is_approved):
+        return
+    latest.counted = bool(product.is_approved)
+    bump({_bucket_key(latest): 1 if latest.counted else -1})
+
+
+def _bucket_key(row):
+    return row.category, row.location, row.unit, week_of(row.recorded_at), bucket_of(row.price)
+
+
+def bump(deltas):
+    """Add ``{(category, location, unit, week, bucket): n}`` to the weekly histograms."""
+    table = PriceBucket.__table__
+    rows = [dict(zip(('category', 'location', 'unit', 'week', 'bucket', 'count'), k + (n,)))
+            for k, n in sorted(deltas.items()) if n]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        for start in range(0, len(rows), 500):
+            stmt = insert(table).values(rows[start:start + 500])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.category, table.c.location, table.c.unit, table.c.week, table.c.bucket],
+                set_={'count': table.c['count'] + stmt.excluded['count']},
+            )
+            db.session.execute(stmt)
+    else:
+        for row in rows:
+            key = [table.c[k] == row[k] for k in ('category', 'location', 'unit', 'week', 'bucket')]
+            if not db.session.execute(
+                table.update().where(*key).values(count=table.c['count'] + row['count'])
+            ).rowcount:
+                db.session.execute(table.insert().values(**row))
+
+
+# ----------------------
+# Reading
+# ----------------------
+
+
+def quantiles(histogram):
+    """PriceStats from ``[(bucket, count)]`` (any order); None when empty."""
+    histogram = sorted((b, c) for b, c in histogram if c > 0)
+    n = sum(c for _, c in histogram)
+    if not n:
+        return None
+    out, seen = [], 0
+    targets = iter((0.25, 0.5, 0.75))
+    target = next(targets)
+    for bucket, count in histogram:
+        seen += count
+        while target is not None and seen >= target * n:
+            out.append(bucket_value(bucket))
+            target = next(targets, None)
+    return PriceStats(n, *out)
+
+
+def _buckets(category, location, unit, weeks, today, *columns):
+    # Rows are summed here rather than with GROUP BY: the matching range of the
+    # primary key is small, and a GROUP BY on its tail columns needs a temp sort
+    since = week_of(today or date.today()) - timedelta(weeks=weeks - 1)
+    query = db.session.query(*columns, PriceBucket.bucket, PriceBucket.count).filter(
+        PriceBucket.category == category, PriceBucket.week >= since
+    )
+    if location is not None:
+        query = query.filter(PriceBucket.location == location)
+    if unit is not None:
+        query = query.filter(PriceBucket.unit == unit)
+    grouped = {}
+    for *key, bucket, count in query:
+        histogram = grouped.setdefault(tuple(key), Counter())
+        histogram[bucket] += count
+    return grouped
+
+
+def market_stats(category, location=None, unit=None, weeks=4, today=None):
+    """Rolling price quartiles over the last ``weeks`` weeks; ``None`` location/unit means all."""
+    histogram = _buckets(category, location, unit, weeks, today).get((), {})
+    return quantiles(histogram.items())
+
+
+def market_by_unit(category, location=None, weeks=4, limit=3, today=None):
+    """[(unit, PriceStats)] for the ``limit`` most-priced units; prices in different units don't mix."""
+    grouped = _buckets(category, location, None, weeks, today, PriceBucket.unit)
+    stats = [(unit, quantiles(h.items())) for (unit,), h in grouped.items()]
+    return sorted([(u, st) for u, st in stats if st], key=lambda us: -us[1].n)[:limit]
+
+
+def weekly_stats(category, location=None, unit=None, weeks=12, today=None):
+    """[(week, PriceStats)] oldest first, for weeks with any prices."""
+    grouped = _buckets(category, location, unit, weeks, today, PriceBucket.week)
+    weekly = [(week, quantiles(h.items())) for (week,), h in sorted(grouped.items())]
+    return [(week, stats) for week, stats in weekly if stats]
+
+
+def market_for(product, weeks=4):
+    """(stats, scope) for a listing: its location if there is enough data, else all locations."""
+    category, location, unit = _key(product)
+    if not category:
+        return None, None
+    stats = market_stats(category, location, unit, weeks) if location else None
+    if stats and stats.n >= MIN_SAMPLE:
+        return stats, 'location'
+    stats = market_stats(category, None, unit, weeks)
+    return (stats, 'category') if stats else (None, None)
+
+
+def history_for(product_id, limit=20):
+    return (
+        PriceHistory.query.filter(PriceHistory.product_id == product_id)
+        .order_by(PriceHistory.id.desc()).limit(limit).all()
+    )
+
+
+# ----------------------
+# Maintenance
+# ----------------------
+
+
+def backfill(chunk_size=5000):
+    """History rows (counted) for listed products that have none, e.g. after seeding."""
+    added = 0
+    last_id = 0
+    while True:
+        products = (
+            Product.query.filter(
+                Product.id > last_id, Product.is_active.is_(True), Product.is_approved.is_(True),
+                ~Product.id.in_(db.session.query(PriceHistory.product_id)),
+            ).order_by(Product.id).limit(chunk_size).all()
+        )
+        if not products:
+            return added
+        deltas = Counter()
+        rows = []
+        for p in products:
+            category, location, unit = _key(p)
+            when = p.approved_at or p.created_at or datetime.utcnow()
+            rows.append({'product_id': p.id, 'category': category, 'location': location, 'unit': unit,
+                         'price': p.price, 'counted': True, 'recorded_at': when})
+            deltas[(category, location, unit, week_of(when), bucket_of(p.price))] += 1
+        db.session.execute(PriceHistory.__table__.insert(), rows)
+        bump(deltas)
+        db.session.commit()
+        added += len(rows)
+        last_id = products[-1].id
+
+
+def rebuild(since):
+    """Recompute the histograms for weeks starting on or after ``since`` from the history.
+
+    Only valid for weeks whose history has not been compacted.
+    """
+    since = week_of(since)
+    db.session.query(PriceBucket).filter(PriceBucket.week >= since).delete(synchronize_session=False)
+    deltas = Counter()
+    rows = db.session.query(
+        PriceHistory.category, PriceHistory.location, PriceHistory.unit, PriceHistory.recorded_at, PriceHistory.price
+    ).filter(PriceHistory.counted.is_(True), PriceHistory.recorded_at >= datetime.combine(since, datetime.min.time()))
+    for row in rows.yield_per(5000):
+        deltas[_bucket_key(row)] += 1
+    bump(deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+def compact(keep_days=182, keep_weeks=156, chunk_size=5000):
+    """Delete history older than ``keep_days`` and histograms older than ``keep_weeks``.
+
+    The weekly histograms already hold every counted price, so old raw rows
+    only cost space. The history cutoff is rounded down to a week start so
+    every week still in the history is complete and ``rebuild`` stays exact
+    for it.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.combine(week_of(datetime.utcnow() - timedelta(days=keep_days)), datetime.min.time())
+    history = 0
+    while True:
+        ids = [i for (i,) in db.session.query(PriceHistory.id)
+               .filter(PriceHistory.recorded_at < cutoff).limit(chunk_size)]
+        if not ids:
+            break
+        history += db.session.query(PriceHistory).filter(PriceHistory.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+    oldest = week_of(date.today()) - timedelta(weeks=keep_weeks)
+    buckets = db.session.query(PriceBucket).filter(
+        (PriceBucket.week < oldest) | (PriceBucket.count <= 0)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    metrics.inc('price_history_compacted_total', history)
+    return CompactResult(history, buckets, time.perf_counter() - started)
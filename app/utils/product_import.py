@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models import Product, AuditLog
+from app.utils.duplicates import check_ids as check_duplicates
+from app.utils.moderation import submit_ids as triage
+from app.utils.geo import geo_fields
+from app.utils.price_index import record_many as record_prices
+
+
+PRODUCT_FIELDS = ('title', 'price', 'quantity', 'description', 'category', 'image_url',
+                  'location', 'unit', 'min_order_qty', 'contact_phone')
+
+# Column widths from app.models.Product; SQLite ignores them but Postgres does not
+MAX_LENGTHS = {'title': 120, 'category': 50, 'image_url': 255, 'location': 100, 'unit': 50, 'contact_phone': 30}
+# Largest values price (Numeric(10, 2)) and the Integer quantity columns hold
+MAX_PRICE = Decimal('99999999.99')
+MAX_INTEGER = 2 ** 31 - 1
+
+
+def parse_product_fields(data):
+    """Validate one product submission (form or import row).
+
+    Returns ``(values, error)``; ``values`` holds Product column values and is
+    None when ``error`` (a user-facing message) is set.
+    """
+    raw = {k: str(data.get(k) if data.get(k) is not None else '').strip() for k in PRODUCT_FIELDS}
+
+    if not raw['title'] or not raw['price']:
+        return None, 'Tajuk dan harga diperlukan.'
+    for field, limit in MAX_LENGTHS.items():
+        if len(raw[field]) > limit:
+            return None, f'Medan {field} terlalu panjang (maksimum {limit} aksara).'
+    try:
+        price = Decimal(raw['price'])
+        if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+            raise InvalidOperation
+    except InvalidOperation:
+        return None, 'Harga tidak sah.'
+    try:
+        quantity = int(raw['quantity'] or 1)
+        min_order_qty = int(raw['min_order_qty']) if raw['min_order_qty'] else None
+        if not 0 <= quantity <= MAX_INTEGER or not 0 <= (min_order_qty or 0) <= MAX_INTEGER:
+            raise ValueError
+    except ValueError:
+        return None, 'Kuantiti tidak sah.'
+
+    return {
+        'title': raw['title'],
+        'price': price,
+        'quantity': quantity,
+        'description': raw['description'],
+        'category': raw['category'],
+        'image_url': raw['image_url'] or None,
+        **geo_fields(raw['location']),
+        'unit': raw['unit'] or None,
+        'min_order_qty': min_order_qty,
+        'contact_phone': raw['contact_phone'] or None,
+    }, None
+
+
+def _iter_json_array(text, chunk_size=65536):
+    # Incremental decoder for a top-level JSON array: one object in memory at a time
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if not started and pos < len(buf):
+            if buf[pos] != '[':
+                raise ValueError('Expected a JSON array')
+            started = True
+            pos += 1
+            continue
+        if started and pos < len(buf) and buf[pos] == ']':
+            return
+        if pos < len(buf):
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                pos = end
+                continue
+        if eof:
+            if started:
+                raise ValueError('Unterminated JSON array')
+            return
+        chunk = text.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_rows(stream, fmt):
+    """Yield ``(row_number, mapping)`` from a binary stream without loading it whole.
+
+    ``fmt`` is ``csv`` or ``json``; JSON may be an array of objects or
+    newline-delimited objects (one per line).
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # line_num is the physical line, which is what users see in their spreadsheet
+            yield reader.line_num, row
+        return
+
+    first = text.read(1)
+    while first and first.isspace():
+        first = text.read(1)
+    if first == '[':
+        for n, obj in enumerate(_iter_json_array(_Prefixed(first, text)), start=1):
+            yield n, obj
+        return
+    line_text = first + text.readline()
+    n = 0
+    while line_text:
+        if line_text.strip():
+            n += 1
+            try:
+                yield n, json.loads(line_text)
+            except ValueError:
+                yield n, None
+        line_text = text.readline()
+
+
+class _Prefixed:
+    # Puts back the character consumed while sniffing the JSON flavour
+    def __init__(self, prefix, text):
+        self.prefix = prefix
+        self.text = text
+
+    def read(self, size):
+        if self.prefix:
+            out, self.prefix = self.prefix + self.text.read(size - 1), ''
+            return out
+        return self.text.read(size)
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0  # invalid rows, plus every row of a batch the database refused
+        self.errors = []  # (row_number, message)
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.imported + self.skipped
+
+
+def import_products(stream, fmt, seller_id, actor_id=None, batch_size=1000, dry_run=False):
+    """Validate and bulk-insert products for ``seller_id``.
+
+    Valid rows are inserted in chunked transactions with executemany (with
+    their price history) and land in the moderation queue
+    (``is_approved=False``); invalid rows are reported with their row number
+    and skipped. A batch the database refuses is rolled back and reported as
+    a row range; earlier batches stay committed.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    table = Product.__table__
+    batch = []
+    batch_rows = []
+
+    def flush():
+        if batch and not dry_run:
+            try:
+                ids = db.session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), batch).scalars().all()
+                record_prices(zip(ids, batch))
+                check_duplicates('product', ids)
+                triage('product', ids)
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                first, last = batch_rows[0], batch_rows[-1]
+                current_app.logger.exception('product import: rows %s-%s failed', first, last)
+                result.errors.append((first, f'Baris {first}-{last} tidak dapat disimpan; tiada baris dalam julat ini diimport.'))
+                result.skipped += len(batch)
+                batch.clear()
+                batch_rows.clear()
+                return
+        result.imported += len(batch)
+        batch.clear()
+        batch_rows.clear()
+
+    try:
+        for row_number, row in iter_rows(stream, fmt):
+            if not isinstance(row, dict):
+                result.errors.append((row_number, 'Baris tidak sah.'))
+                result.skipped += 1
+                continue
+            values, error = parse_product_fields(row)
+            if error:
+                result.errors.append((row_number, error))
+                result.skipped += 1
+                continue
+            values.update(
+                seller_id=seller_id, is_active=True, is_approved=False, rejection_reason=None,
+                reviewed_by_id=None, reviewed_at=None, approved_at=None, created_at=now, updated_at=now,
+            )
+            batch.append(values)
+            batch_rows.append(row_number)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        result.errors.append((None, f'Fail tidak dapat dibaca: {e}'))
+
+    # One moderation entry for the whole import instead of one per row
+    if result.imported and not dry_run:
+        db.session.add(AuditLog(
+            entity_type='user', entity_id=seller_id, action='bulk_import', actor_id=actor_id or seller_id,
+            meta=json.dumps({'count': result.imported, 'errors': len(result.errors), 'format': fmt}),
+        ))
+        db.session.commit()
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.json', '.ndjson', '.jsonl')):
+        return 'json'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
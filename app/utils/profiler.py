@@ -0,0 +1,273 @@
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+import zlib
+from collections import Counter
+from urllib.parse import urlencode
+
+from flask import current_app, g, request, session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy.orm import defer
+
+from app.extensions import db
+from app.models import RequestProfile
+from app.utils.metrics import describe, metrics
+
+
+describe('request_profiles_total', 'counter', 'Requests profiled by the sampling profiler, by trigger')
+
+QUERY_FLAG = '_profile'
+SKIP_ENDPOINTS = ('static', 'media')
+
+
+# ----------------------
+# Sampler
+# ----------------------
+
+
+_ROOTS = None
+_names = {}
+
+
+def _short(filename):
+    global _ROOTS
+    if _ROOTS is None:
+        paths = sysconfig.get_paths()
+        app_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        _ROOTS = sorted({paths['purelib'], paths['platlib'], paths['stdlib'], app_root}, key=len, reverse=True)
+    for root in _ROOTS:
+        if filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def frame_name(code):
+    # One name per function (its def line, not the current line) keeps stacks mergeable
+    name = _names.get(code)
+    if name is None:
+        name = _names[code] = f'{code.co_qualname} ({_short(code.co_filename)}:{code.co_firstlineno})'
+    return name
+
+
+class Sampler:
+    """Samples one thread's Python stack every ``interval`` seconds from a helper thread.
+
+    The profiled thread runs untouched (no tracing hooks); the cost is one
+    ``sys._current_frames()`` per tick, paid while it waits for the GIL.
+    Sampling stops by itself after ``max_seconds``.
+    """
+
+    def __init__(self, interval=0.005, max_seconds=30.0):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.counts = Counter()
+        self.samples = 0
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # Called on the profiled thread
+        self.duration = time.perf_counter() - self.started
+        self.cpu = time.thread_time() - self.cpu_started
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        deadline = time.perf_counter() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None or time.perf_counter() > deadline:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if self._stop.is_set():
+                # Caught the request thread inside stop()
+                return
+            self.counts[tuple(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Folded stacks, root first: ``a;b;c <samples>`` per line (flamegraph.pl / speedscope input)."""
+        lines = [';'.join(frame_name(code) for code in reversed(stack)) + f' {n}'
+                 for stack, n in self.counts.most_common()]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+# ----------------------
+# Stored profiles
+# ----------------------
+
+
+def parse_collapsed(text):
+    """[(frames, samples)] from folded-stack text."""
+    stacks = []
+    for line in text.splitlines():
+        frames, _, n = line.rpartition(' ')
+        if frames:
+            stacks.append((frames.split(';'), int(n)))
+    return stacks
+
+
+def collapsed_text(profile):
+    return zlib.decompress(profile.stacks).decode()
+
+
+def load_stacks(profile):
+    return parse_collapsed(collapsed_text(profile))
+
+
+def top_functions(stacks, limit=30):
+    """[(name, self samples, total samples)] of the busiest functions, most self time first."""
+    own, total = Counter(), Counter()
+    for frames, n in stacks:
+        own[frames[-1]] += n
+        for name in set(frames):
+            total[name] += n
+    names = sorted(total, key=lambda name: (own[name], total[name]), reverse=True)[:limit]
+    return [(name, own[name], total[name]) for name in names]
+
+
+def speedscope(profile, stacks):
+    """The profile in speedscope's file format (https://www.speedscope.app), weighted in milliseconds."""
+    frames, index = [], {}
+    samples, weights = [], []
+    # Real ticks drift from the nominal interval (GIL waits), so spread the measured wall time
+    per_sample = profile.duration * 1000 / profile.samples if profile.samples else profile.interval_ms
+    for names, n in stacks:
+        ids = []
+        for name in names:
+            if name not in index:
+                index[name] = len(frames)
+                func, _, where = name.rpartition(' (')
+                file, _, line = where.rstrip(')').rpartition(':')
+                frames.append({'name': func or name, 'file': file, 'line': int(line) if line.isdigit() else None})
+            ids.append(index[name])
+        samples.append(ids)
+        weights.append(round(n * per_sample, 3))
+    title = f'{profile.method} {profile.path}'
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': title,
+        'exporter': 'kelab-petani',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': title, 'unit': 'milliseconds',
+            'startValue': 0, 'endValue': round(sum(weights), 3), 'samples': samples, 'weights': weights,
+        }],
+    }
+
+
+def _store(sampler, trigger):
+    # The request is finished: anything it left uncommitted would be rolled back at teardown anyway
+    db.session.rollback()
+    query = urlencode([(k, v) for k, v in request.args.items(multi=True) if k != QUERY_FLAG])
+    profile = RequestProfile(
+        endpoint=request.endpoint, method=request.method, path=f"{request.path}{'?' if query else ''}{query}"[:255],
+        status=g.get('_profile_status'), trigger=trigger, user_id=session.get('user_id'),
+        duration=sampler.duration, cpu=sampler.cpu, samples=sampler.samples,
+        interval_ms=sampler.interval * 1000, stacks=zlib.compress(sampler.collapsed().encode(), 6),
+    )
+    db.session.add(profile)
+    db.session.commit()
+    metrics.inc('request_profiles_total', trigger=trigger)
+
+
+def prune(keep):
+    """Delete all but the newest ``keep`` profiles; returns how many went."""
+    cutoff = db.session.query(RequestProfile.id).order_by(RequestProfile.id.desc()).offset(keep).limit(1).scalar()
+    if cutoff is None:
+        return 0
+    n = db.session.query(RequestProfile).filter(RequestProfile.id <= cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+# ----------------------
+# Triggers
+# ----------------------
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='request-profile')
+
+
+def profile_link(path, admin_id):
+    """``path`` with a signed flag that profiles it (and no other path), valid for PROFILE_LINK_SECONDS."""
+    token = _serializer().dumps({'by': admin_id, 'path': path.split('?', 1)[0]})
+    return f"{path}{'&' if '?' in path else '?'}{QUERY_FLAG}={token}"
+
+
+def _link_valid(token):
+    try:
+        signed = _serializer().loads(token, max_age=current_app.config['PROFILE_LINK_SECONDS'])
+    except BadSignature:
+        return False
+    return signed.get('path') == request.path
+
+
+def init_profiler(app):
+    if not app.config.get('PROFILING_ENABLED', True):
+        return
+    flag = f'{QUERY_FLAG}='.encode()
+
+    @app.before_request
+    def _profile_start():
+        # Unprofiled requests pay for one substring test and, when sampling is on, one random()
+        rate = app.config['PROFILE_SAMPLE_RATE']
+        if flag in request.query_string:
+            if not _link_valid(request.args.get(QUERY_FLAG, '')):
+                return
+            trigger = 'link'
+        elif rate and random.random() < rate:
+            trigger = 'sample'
+        else:
+            return
+        if request.endpoint in SKIP_ENDPOINTS:
+            return
+        g._profile = (Sampler(app.config['PROFILE_INTERVAL_MS'] / 1000, app.config['PROFILE_MAX_SECONDS']).start(),
+                      trigger)
+
+    @app.after_request
+    def _profile_status(response):
+        if '_profile' in g:
+            g._profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _profile_stop(exc):
+        # Streamed pages (stream_with_context) reach teardown only after the last chunk
+        profiled = g.pop('_profile', None)
+        if profiled is None:
+            return
+        sampler, trigger = profiled
+        sampler.stop()
+        if exc is not None:
+            g._profile_status = 500
+        if trigger == 'sample' and not sampler.samples:
+            # Finished inside one tick: nothing to see, and not worth a row
+            return
+        try:
+            _store(sampler, trigger)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('could not store request profile')
+
+
+def recent(limit=100):
+    return (
+        RequestProfile.query.options(defer(RequestProfile.stacks))
+        .order_by(RequestProfile.created_at.desc()).limit(limit).all()
+    )
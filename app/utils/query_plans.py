@@ -0,0 +1,220 @@
+import json
+import re
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import event, inspect
+
+
+PlanIssue = namedtuple('PlanIssue', 'kind table detail')
+PlanReport = namedtuple('PlanReport', 'sql params plan issues')
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+_SQLITE_TEMP = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)')
+_SQLITE_SEARCH = re.compile(r'^SEARCH (\w+)(?: AS \w+)? USING (?:COVERING |INTEGER PRIMARY KEY|INDEX )?(?:INDEX )?\S*\s*\((.*)\)$')
+
+
+@contextmanager
+def capture_sql(engine):
+    """Collect distinct SELECT statements (with their first parameters) run on ``engine``."""
+    seen = OrderedDict()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip()[:6].upper() in ('SELECT', 'WITH ', 'WITH\n') \
+                and statement not in seen:
+            seen[statement] = parameters
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(connection, statement, parameters=()):
+    """Plan lines for ``statement`` as the database would run it.
+
+    SQLite returns ``EXPLAIN QUERY PLAN`` details. On PostgreSQL sequential
+    scans and sorts are disabled first, so any that remain in the plan mean no
+    index could serve the query rather than that the table is small.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        return [row[-1] for row in rows]
+    if dialect == 'postgresql':
+        with connection.begin_nested():
+            connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            connection.exec_driver_sql('SET LOCAL enable_sort = off')
+            raw = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        lines = []
+        _walk_pg(plan[0]['Plan'], lines)
+        return lines
+    raise NotImplementedError(f'EXPLAIN is not supported for {dialect}')
+
+
+def _walk_pg(node, lines, depth=0):
+    label = node['Node Type']
+    if 'Relation Name' in node:
+        label += ' on ' + node['Relation Name']
+    if 'Index Name' in node:
+        label += ' using ' + node['Index Name']
+    if 'Index Cond' in node:
+        label += ' cond ' + node['Index Cond']
+    if node.get('Sort Key'):
+        label += ' (' + ', '.join(node['Sort Key']) + ')'
+    lines.append('  ' * depth + label)
+    for child in node.get('Plans', ()):
+        _walk_pg(child, lines, depth + 1)
+
+
+def find_issues(plan, sql=None):
+    """Problems in a plan from ``explain``.
+
+    ``scan`` is a full table scan, ``temp_sort`` a sort the index order could
+    not provide, and ``filter`` (needs ``sql``) an index lookup that leaves
+    some of the query's equality predicates to be checked row by row, i.e.
+    an index on the wrong or too few columns.
+    """
+    issues = []
+    for line in plan:
+        text = line.strip()
+        m = _SQLITE_SCAN.match(text)
+        if m:
+            issues.append(PlanIssue('scan', m.group(1), text))
+        elif _SQLITE_TEMP.search(text):
+            issues.append(PlanIssue('temp_sort', None, text))
+        elif text.startswith('Seq Scan on '):
+            issues.append(PlanIssue('scan', text.split()[3], text))
+        elif text.startswith(('Sort ', 'Incremental Sort ')) or text == 'Sort':
+            issues.append(PlanIssue('temp_sort', None, text))
+        elif sql is not None:
+            table, used = _index_lookup(text)
+            if table:
+                missing = [c for c in equality_columns(sql, table) if c not in used]
+                if missing:
+                    issues.append(PlanIssue('filter', table, f"{text} -- filters {', '.join(missing)}"))
+    return issues
+
+
+def _index_lookup(text):
+    # (table, columns the index constrains) for an index search line, else (None, ())
+    m = _SQLITE_SEARCH.match(text)
+    if m:
+        used = re.findall(r'(\w+)\s*(?:=|>|<|IN\b)', m.group(2))
+        return m.group(1), {'id' if c == 'rowid' else c for c in used}
+    if text.startswith(('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')) and ' cond ' in text:
+        head, cond = text.split(' cond ', 1)
+        table = head.split(' on ')[1].split()[0] if ' on ' in head else None
+        return table, set(re.findall(r'(\w+)\s*(?:=|>|<)', cond))
+    return None, ()
+
+
+def check(connection, statements):
+    """``PlanReport`` for each (statement, parameters) pair."""
+    return [
+        PlanReport(sql, params, plan, find_issues(plan, sql))
+        for sql, params in statements
+        for plan in [explain(connection, sql, params)]
+    ]
+
+
+# ----------------------
+# Index advisor
+# ----------------------
+
+_COL = r'(?:"?(\w+)"?)\."?(\w+)"?'
+_EQ = re.compile(_COL + r'\s*(?:=|IS(?! NOT))\s*(?!' + r'"?\w+"?\.)')
+_JOIN = re.compile(_COL + r'\s*=\s*' + _COL)
+_RANGE = re.compile(_COL + r'\s*(?:>=|<=|<|>|IN\b|BETWEEN\b)')
+_ORDER = re.compile(r'ORDER BY (.+?)(?:\s+LIMIT\b|\s+OFFSET\b|\)|$)', re.S)
+
+
+def _clause(sql, start, stops):
+    upper = sql.upper()
+    i = upper.find(start)
+    if i < 0:
+        return ''
+    end = min([j for j in (upper.find(s, i) for s in stops) if j > 0] or [len(sql)])
+    return sql[i:end]
+
+
+def equality_columns(sql, table):
+    """Columns of ``table`` compared to a constant with = or IS in ``sql``'s WHERE clauses."""
+    sql = ' '.join(sql.split())
+    cols = []
+    for where in re.findall(r' WHERE (.+?)(?= GROUP BY | ORDER BY | LIMIT |\)|$)', sql):
+        for t, c in _EQ.findall(where):
+            if t == table and c not in cols:
+                cols.append(c)
+    return cols
+
+
+def suggest_index(sql, table):
+    """Composite index for ``table`` in ``sql``: equality columns, then join keys, sort keys, ranges.
+
+    Equality-first keeps every matching row in one contiguous index range, the
+    sort key after it lets the database read that range already ordered, and a
+    range predicate can only ever use one more column. A heuristic over the
+    generated SQL, not a planner: review before shipping.
+    """
+    where = _clause(sql, ' WHERE ', (' GROUP BY ', ' ORDER BY ', ' LIMIT '))
+    joins = _clause(sql, ' JOIN ', (' WHERE ',))
+    cols = []
+
+    def add(column):
+        if column not in cols:
+            cols.append(column)
+
+    for c in equality_columns(sql, table):
+        add(c)
+    for t1, c1, t2, c2 in _JOIN.findall(joins + ' ' + where):
+        for t, c in ((t1, c1), (t2, c2)):
+            if t == table and c != 'id':
+                add(c)
+    order = _ORDER.search(sql)
+    if order:
+        for t, c in re.findall(_COL, order.group(1)):
+            if t == table:
+                add(c)
+    for t, c in _RANGE.findall(where):
+        if t == table:
+            add(c)
+    return cols
+
+
+def covered(columns, indexes):
+    """True when an existing index starts with ``columns`` (in order)."""
+    return any(list(ix['column_names'][:len(columns)]) == columns for ix in indexes)
+
+
+def advise(connection, reports):
+    """{(table, columns): [statements]} for flagged statements no existing index already covers."""
+    inspector = inspect(connection)
+    existing = {}
+    advice = OrderedDict()
+    for report in reports:
+        tables = {issue.table for issue in report.issues if issue.table}
+        if any(issue.kind == 'temp_sort' for issue in report.issues):
+            order = _ORDER.search(' '.join(report.sql.split()))
+            tables |= {t for t, _ in re.findall(_COL, order.group(1))} if order else set()
+        for table in sorted(tables):
+            columns = suggest_index(report.sql, table)
+            if not columns:
+                continue
+            if table not in existing:
+                existing[table] = inspector.get_indexes(table)
+            if covered(columns, existing[table]):
+                continue
+            advice.setdefault((table, tuple(columns)), []).append(report.sql)
+    # (a, b) is redundant next to (a, b, c): fold its statements into the longer one
+    for key in list(advice):
+        longer = [k for k in advice if k != key and k[0] == key[0] and k[1][:len(key[1])] == key[1]]
+        if longer:
+            advice[longer[0]].extend(advice.pop(key))
+    return advice
+
+
+def index_ddl(table, columns):
+    return f"CREATE INDEX ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
@@ -0,0 +1,275 @@
+import heapq
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, timezone
+
+from app.extensions import db
+from app.models import PawahProject
+from app.utils.geo import KM_PER_DEGREE, cell_of, cells_within
+from app.utils.metrics import describe, metrics
+
+
+describe('recommend_index_size', 'gauge', 'Open, approved pawah projects held in the recommendation index')
+describe('recommend_refresh_total', 'counter', 'Incremental recommendation index refreshes')
+
+# Relative weight of each signal; every component is scaled to 0..1 first
+WEIGHTS = {'crop': 3.0, 'location': 2.0, 'capital': 1.0, 'share': 1.0, 'fresh': 0.5}
+# Location affinity halves roughly every 17 km (exp(-d / 25))
+LOCATION_DECAY_KM = 25.0
+# How much a past project counts towards a farmer's profile, by its status
+HISTORY_WEIGHTS = {'completed': 1.5, 'in_progress': 1.0, 'accepted': 1.0, 'cancelled': 0.3}
+
+ProjectFeatures = namedtuple('ProjectFeatures', 'id owner_id crop location lat lon log_capital farmer_share created_ts')
+# locations: weights of places without coordinates; points: (lat, lon, weight) of geocoded ones
+FarmerProfile = namedtuple('FarmerProfile', 'crops locations points log_capital total')
+Recommendation = namedtuple('Recommendation', 'project_id score parts')
+
+
+def normalize(value):
+    return ' '.join((value or '').lower().split())
+
+
+def _features(row):
+    return ProjectFeatures(
+        id=row.id,
+        owner_id=row.owner_id,
+        crop=normalize(row.crop_type),
+        location=normalize(row.location),
+        lat=row.latitude,
+        lon=row.longitude,
+        log_capital=math.log1p(float(row.capital_required or 0)),
+        farmer_share=(row.farmer_share_percent or 0) / 100.0,
+        created_ts=(row.created_at or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp(),
+    )
+
+
+class RecommendationIndex:
+    """Open, approved pawah projects keyed by id, crop, location and grid cell.
+
+    Built with one scan, then kept current by re-reading only rows whose
+    ``updated_at`` moved past the last watermark (at most every
+    ``refresh_interval`` seconds). Each worker holds its own copy.
+
+    ``updated_at`` comes from the app clock when the write starts, so a row
+    can commit after rows stamped later than it. Each refresh re-reads the
+    last ``settle`` seconds before the watermark to pick such rows up.
+    """
+
+    COLUMNS = (
+        PawahProject.id, PawahProject.owner_id, PawahProject.crop_type, PawahProject.location,
+        PawahProject.capital_required, PawahProject.farmer_share_percent, PawahProject.created_at,
+        PawahProject.status, PawahProject.is_approved, PawahProject.updated_at,
+        PawahProject.latitude, PawahProject.longitude,
+    )
+
+    def __init__(self, refresh_interval=5.0, settle=30.0):
+        self.refresh_interval = refresh_interval
+        self.settle = settle
+        self.projects = {}
+        self.by_crop = {}
+        self.by_location = {}
+        self.by_cell = {}
+        self.watermark = None
+        self.built = False
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _add(self, feat):
+        self._remove(feat.id)
+        self.projects[feat.id] = feat
+        self.by_crop.setdefault(feat.crop, set()).add(feat.id)
+        self.by_location.setdefault(feat.location, set()).add(feat.id)
+        if feat.lat is not None:
+            self.by_cell.setdefault(cell_of(feat.lat, feat.lon), set()).add(feat.id)
+
+    def _remove(self, project_id):
+        old = self.projects.pop(project_id, None)
+        if old is None:
+            return
+        buckets = [(self.by_crop, old.crop), (self.by_location, old.location)]
+        if old.lat is not None:
+            buckets.append((self.by_cell, cell_of(old.lat, old.lon)))
+        for bucket, key in buckets:
+            ids = bucket.get(key)
+            if ids is not None:
+                ids.discard(project_id)
+                if not ids:
+                    del bucket[key]
+
+    def _apply(self, rows):
+        for row in rows:
+            if row.status == 'open' and row.is_approved:
+                self._add(_features(row))
+            else:
+                self._remove(row.id)
+            if row.updated_at and (self.watermark is None or row.updated_at > self.watermark):
+                self.watermark = row.updated_at
+
+    def rebuild(self):
+        rows = (
+            db.session.query(*self.COLUMNS)
+            .filter(PawahProject.status == 'open', PawahProject.is_approved.is_(True))
+            .all()
+        )
+        latest = db.session.query(db.func.max(PawahProject.updated_at)).scalar()
+        with self._lock:
+            self.projects, self.by_crop, self.by_location, self.by_cell = {}, {}, {}, {}
+            self.watermark = None
+            self._apply(rows)
+            # Closed rows are not loaded but still advance the watermark
+            if latest and (self.watermark is None or latest > self.watermark):
+                self.watermark = latest
+            self.built = True
+            self._checked = time.monotonic()
+        metrics.set_gauge('recommend_index_size', len(self.projects))
+
+    def refresh(self, force=False):
+        if not self.built:
+            self.rebuild()
+            return
+        if not force and time.monotonic() - self._checked < self.refresh_interval:
+            return
+        if self.watermark is None:
+            self.rebuild()
+            return
+        # Re-applying rows already seen is idempotent
+        since = self.watermark - timedelta(seconds=self.settle)
+        rows = db.session.query(*self.COLUMNS).filter(PawahProject.updated_at >= since).all()
+        with self._lock:
+            self._apply(rows)
+            self._checked = time.monotonic()
+        metrics.inc('recommend_refresh_total')
+        metrics.set_gauge('recommend_index_size', len(self.projects))
+
+    def candidates(self, profile):
+        with self._lock:
+            if profile is None:
+                return list(self.projects.values())
+            ids = set()
+            for crop in profile.crops:
+                ids |= self.by_crop.get(crop, set())
+            for location in profile.locations:
+                ids |= self.by_location.get(location, set())
+            for lat, lon, _ in profile.points:
+                for cell in cells_within(lat, lon, 2 * LOCATION_DECAY_KM):
+                    ids |= self.by_cell.get(cell, set())
+            return [self.projects[i] for i in ids]
+
+
+def farmer_profile(user_id):
+    """Crop/location experience and typical capital from projects the user accepted before."""
+    rows = (
+        db.session.query(
+            PawahProject.crop_type, PawahProject.location, PawahProject.capital_required, PawahProject.status,
+            PawahProject.latitude, PawahProject.longitude,
+        )
+        .filter(PawahProject.farmer_id == user_id)
+        .all()
+    )
+    return build_profile(rows)
+
+
+def build_profile(rows):
+    """``rows`` are (crop_type, location, capital_required, status, latitude, longitude) tuples."""
+    crops, locations, points = Counter(), Counter(), Counter()
+    log_capital = total = 0.0
+    for crop, location, capital, status, lat, lon in rows:
+        w = HISTORY_WEIGHTS.get(status, 1.0)
+        crops[normalize(crop)] += w
+        if lat is not None and lon is not None:
+            points[(lat, lon)] += w
+        else:
+            locations[normalize(location)] += w
+        log_capital += w * math.log1p(float(capital or 0))
+        total += w
+    if not total:
+        return None
+    return FarmerProfile(crops, locations, [(lat, lon, w) for (lat, lon), w in points.items()], log_capital / total, total)
+
+
+def explain(feat, profile, now_ts):
+    """Per-signal components (each 0..1) behind a project's score."""
+    age_days = max(now_ts - feat.created_ts, 0) / 86400
+    parts = {
+        'share': feat.farmer_share,
+        'fresh': 1.0 / (1.0 + age_days / 30),
+    }
+    if profile is None:
+        parts.update(crop=0.0, location=0.0, capital=0.5)
+    else:
+        parts['crop'] = profile.crops.get(feat.crop, 0.0) / profile.total
+        parts['location'] = _location_affinity(feat, profile) / profile.total
+        parts['capital'] = math.exp(-abs(feat.log_capital - profile.log_capital))
+    return parts
+
+
+def _location_affinity(feat, profile):
+    # Exact name for places the gazetteer does not know, distance decay for the rest
+    value = profile.locations.get(feat.location, 0.0)
+    if feat.lat is not None:
+        scale = math.cos(math.radians(feat.lat)) * KM_PER_DEGREE
+        for lat, lon, w in profile.points:
+            d = math.hypot((feat.lat - lat) * KM_PER_DEGREE, (feat.lon - lon) * scale)
+            value += w * math.exp(-d / LOCATION_DECAY_KM)
+    return value
+
+
+def _scorer(profile, now_ts):
+    # Same sum as explain() weighted by WEIGHTS, inlined: this runs once per candidate
+    w_crop, w_loc, w_cap = WEIGHTS['crop'], WEIGHTS['location'], WEIGHTS['capital']
+    w_share, w_fresh = WEIGHTS['share'], WEIGHTS['fresh']
+    month = 30 * 86400
+    if profile is None:
+        base = w_cap * 0.5
+
+        def key(f):
+            return base + w_share * f.farmer_share + w_fresh / (1.0 + max(now_ts - f.created_ts, 0) / month)
+        return key
+
+    crops, cap = profile.crops, profile.log_capital
+    inv = 1.0 / profile.total
+    exp = math.exp
+    # Listings sit on gazetteer points, so candidates share a handful of locations
+    seen = {}
+
+    def affinity(f):
+        k = (f.location, f.lat, f.lon)
+        value = seen.get(k)
+        if value is None:
+            value = seen[k] = _location_affinity(f, profile)
+        return value
+
+    def key(f):
+        return (
+            inv * (w_crop * crops.get(f.crop, 0.0) + w_loc * affinity(f))
+            + w_cap * exp(-abs(f.log_capital - cap))
+            + w_share * f.farmer_share
+            + w_fresh / (1.0 + max(now_ts - f.created_ts, 0) / month)
+        )
+    return key
+
+
+def recommend(user_id, limit=12, index=None, profile=None):
+    index = index or recommendation_index
+    index.refresh()
+    if profile is None:
+        profile = farmer_profile(user_id)
+    candidates = index.candidates(profile)
+    if profile is not None and len(candidates) < limit:
+        candidates = index.candidates(None)
+    now_ts = time.time()
+    key = _scorer(profile, now_ts)
+    top = heapq.nlargest(limit, (f for f in candidates if f.owner_id != user_id), key=key)
+    return [Recommendation(f.id, key(f), explain(f, profile, now_ts)) for f in top]
+
+
+recommendation_index = RecommendationIndex()
+
+
+def init_recommendations(app):
+    recommendation_index.refresh_interval = app.config.get('RECOMMEND_REFRESH_SECONDS', 5.0)
+    # Same allowance for slow commits and clock skew as the sync API's cursors
+    recommendation_index.settle = app.config.get('SYNC_SETTLE_SECONDS', 30.0)
+    recommendation_index.built = False
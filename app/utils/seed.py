@@ -0,0 +1,224 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from sqlalchemy import func, insert
+
+from app.extensions import db
+from app.models import User, Product, Order, PawahProject, Message, AuditLog
+from app.utils.geo import geo_fields
+
+
+# Long-tailed on purpose: a few categories/locations dominate, like real listings
+CATEGORIES = [
+    ('Sayur', 30), ('Buah', 22), ('Padi', 10), ('Ternakan', 8), ('Ikan', 7),
+    ('Rempah', 6), ('Baja', 5), ('Benih', 5), ('Herba', 4), ('Lain-lain', 3),
+]
+CROP_TYPES = [
+    ('Padi', 25), ('Durian', 15), ('Kelapa Sawit', 15), ('Sayur', 12), ('Cili', 8),
+    ('Pisang', 7), ('Jagung', 6), ('Nanas', 5), ('Getah', 4), ('Halia', 3),
+]
+LOCATIONS = [
+    ('Kota Bharu', 12), ('Alor Setar', 10), ('Kuala Terengganu', 8), ('Kuantan', 8),
+    ('Ipoh', 7), ('Cameron Highlands', 6), ('Raub', 6), ('Muar', 5), ('Seremban', 5),
+    ('Kota Kinabalu', 5), ('Kuching', 5), ('Sungai Petani', 4), ('Temerloh', 4),
+    ('Bentong', 3), ('Kangar', 3), ('Melaka Tengah', 3), ('Batu Pahat', 2), ('Sibu', 2),
+]
+UNITS = ['kg', 'ikat', 'biji', 'tan', 'guni', 'ekor']
+ADJECTIVES = ['Segar', 'Organik', 'Gred A', 'Premium', 'Tempatan', 'Borong', 'Baru Tuai', 'Pilihan']
+WORDS = ('tuai pagi tadi hantar sekitar kawasan harga borong boleh runding stok terhad '
+         'kualiti eksport tanpa racun dari ladang sendiri pembungkusan kemas').split()
+
+ORDER_STATUSES = [('completed', 45), ('pending', 20), ('paid', 12), ('shipped', 8), ('cancelled', 15)]
+PAWAH_STATUSES = [('open', 45), ('accepted', 15), ('in_progress', 20), ('completed', 12), ('cancelled', 8)]
+
+
+class _Weighted:
+    """random.choices with precomputed cumulative weights (the hot part of seeding)."""
+
+    def __init__(self, rng, pairs):
+        self.rng = rng
+        self.values = [v for v, _ in pairs]
+        self.cum = list(accumulate(w for _, w in pairs))
+
+    def __call__(self, k=1):
+        picks = self.rng.choices(self.values, cum_weights=self.cum, k=k)
+        return picks[0] if k == 1 else picks
+
+
+def _zipf_pairs(ids, s=1.1):
+    return [(v, 1.0 / (rank + 1) ** s) for rank, v in enumerate(ids)]
+
+
+def _chunks(n, size):
+    for start in range(0, n, size):
+        yield start, min(size, n - start)
+
+
+def _bulk_insert(model, rows, returning=False):
+    # Core insert (not ORM bulk) so explicit None is stored as NULL, not the column default.
+    # With ``returning`` the new ids come back in row order; later tables point at them, and
+    # a Postgres sequence can be ahead of max(id), so they cannot be computed up front
+    table = model.__table__
+    if not returning:
+        db.session.execute(insert(table), rows)
+        db.session.commit()
+        return []
+    ids = db.session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    db.session.commit()
+    return ids
+
+
+def seed_dataset(users=5000, products=100_000, pawah=20_000, orders=50_000, messages=1_000_000,
+                 audit_logs=500_000, seed=42, chunk_size=5000, echo=print):
+    """Bulk-insert a synthetic dataset. Appends to whatever is already in the DB."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    year_seconds = 365 * 24 * 3600
+
+    def past():
+        return now - timedelta(seconds=rng.randrange(year_seconds))
+
+    # Only labels emails and names; ids come from the inserts
+    start_user = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    user_ids = []
+    echo(f'users: {users}')
+    for start, n in _chunks(users, chunk_size):
+        rows = []
+        for i in range(start_user + start, start_user + start + n):
+            created = past()
+            rows.append({
+                'email': f'seed{i}@example.test', 'name': f'Petani {i}', 'created_at': created,
+                'updated_at': created, 'is_active': True, 'is_admin': i == start_user,
+            })
+        user_ids += _bulk_insert(User, rows, returning=True)
+    if not user_ids:
+        user_ids = [uid for (uid,) in db.session.query(User.id).all()]
+
+    # ~20% of users sell; a handful of large sellers dominate (Zipf)
+    seller_ids = user_ids[: max(1, len(user_ids) // 5)]
+    pick_seller = _Weighted(rng, _zipf_pairs(seller_ids))
+    pick_category = _Weighted(rng, CATEGORIES)
+    pick_location = _Weighted(rng, LOCATIONS)
+    pick_crop = _Weighted(rng, CROP_TYPES)
+
+    def blurb(k):
+        return ' '.join(rng.choices(WORDS, k=k))
+
+    product_ids = []
+    echo(f'products: {products}')
+    for start, n in _chunks(products, chunk_size):
+        rows = []
+        for _ in range(n):
+            created = past()
+            category = pick_category()
+            approved = rng.random() < 0.9
+            rows.append({
+                'title': f'{category} {rng.choice(ADJECTIVES)} {rng.randrange(1000)}',
+                'description': blurb(rng.randint(8, 40)),
+                'price': Decimal(rng.randint(100, 50000)) / 100,
+                'quantity': rng.choice([None, rng.randint(0, 500)]),
+                'category': category,
+                **geo_fields(pick_location()),
+                'unit': rng.choice(UNITS),
+                'is_active': rng.random() < 0.92,
+                'is_approved': approved,
+                'approved_at': created + timedelta(hours=rng.randint(1, 72)) if approved else None,
+                'seller_id': pick_seller(),
+                'created_at': created,
+                'updated_at': created,
+            })
+        product_ids += _bulk_insert(Product, rows, returning=True)
+
+    project_ids = []
+    echo(f'pawah projects: {pawah}')
+    statuses = _Weighted(rng, PAWAH_STATUSES)
+    # Farmers mostly take projects for the crop they know near where they live
+    farmer_home = {uid: (pick_crop(), pick_location()) for uid in user_ids}
+    for start, n in _chunks(pawah, chunk_size):
+        rows = []
+        for _ in range(n):
+            created = past()
+            status = statuses()
+            owner = pick_seller()
+            farmer = rng.choice(user_ids) if status != 'open' else None
+            crop, location = pick_crop(), pick_location()
+            if farmer is not None and rng.random() < 0.7:
+                crop, home = farmer_home[farmer]
+                if rng.random() < 0.7:
+                    location = home
+            owner_share = rng.choice([40, 50, 60, 70])
+            rows.append({
+                'title': f'Pawah {crop} {rng.randrange(1000)}',
+                'description': blurb(rng.randint(10, 50)),
+                'crop_type': crop,
+                **geo_fields(location),
+                'duration_months': rng.choice([3, 4, 6, 9, 12, 24]),
+                'capital_required': Decimal(rng.randint(500, 200000)),
+                'owner_share_percent': owner_share,
+                'farmer_share_percent': 100 - owner_share,
+                'status': status,
+                'is_approved': rng.random() < 0.9,
+                'owner_id': owner,
+                'farmer_id': farmer if farmer != owner else None,
+                'created_at': created,
+                'updated_at': created,
+            })
+        project_ids += _bulk_insert(PawahProject, rows, returning=True)
+
+    order_ids = []
+    # Orders concentrate on popular products, which belong to the big sellers
+    pick_product = _Weighted(rng, _zipf_pairs(product_ids, s=0.8)) if product_ids else None
+    order_status = _Weighted(rng, ORDER_STATUSES)
+    echo(f'orders: {orders if pick_product else 0}')
+    for start, n in _chunks(orders if pick_product else 0, chunk_size):
+        rows = []
+        for _ in range(n):
+            qty = rng.randint(1, 20)
+            rows.append({
+                'buyer_id': rng.choice(user_ids),
+                'product_id': pick_product(),
+                'quantity': qty,
+                'total_price': Decimal(rng.randint(100, 50000)) / 100 * qty,
+                'status': order_status(),
+                'created_at': past(),
+            })
+        order_ids += _bulk_insert(Order, rows, returning=True)
+
+    contexts = [('order', order_ids), ('pawah', project_ids)]
+    contexts = [(t, ids) for t, ids in contexts if ids]
+    echo(f'messages: {messages if contexts else 0}')
+    for start, n in _chunks(messages if contexts else 0, chunk_size):
+        rows = []
+        for _ in range(n):
+            ctx_type, ids = contexts[0] if rng.random() < 0.7 or len(contexts) == 1 else contexts[1]
+            rows.append({
+                'context_type': ctx_type,
+                'context_id': rng.choice(ids),
+                'sender_id': rng.choice(user_ids),
+                'content': blurb(rng.randint(3, 25)),
+                'created_at': past(),
+            })
+        _bulk_insert(Message, rows)
+
+    entities = [('order', order_ids, ['status_change']), ('product', product_ids, ['approve', 'reject']),
+                ('pawah', project_ids, ['approve', 'reject', 'accept', 'status_change'])]
+    entities = [e for e in entities if e[1]]
+    admin_ids = user_ids[:3]
+    echo(f'audit logs: {audit_logs if entities else 0}')
+    for start, n in _chunks(audit_logs if entities else 0, chunk_size):
+        rows = []
+        for _ in range(n):
+            etype, ids, actions = rng.choice(entities)
+            action = rng.choice(actions)
+            rows.append({
+                'entity_type': etype,
+                'entity_id': rng.choice(ids),
+                'action': action,
+                'old_status': 'pending' if action == 'status_change' else None,
+                'new_status': 'paid' if action == 'status_change' else None,
+                'actor_id': rng.choice(admin_ids) if action in ('approve', 'reject') else rng.choice(user_ids),
+                'created_at': past(),
+            })
+        _bulk_insert(AuditLog, rows)
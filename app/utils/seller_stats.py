@@ -0,0 +1,148 @@
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.extensions import db
+from app.models import ArchivedOrder, Message, Order, Product, SellerStats, User
+from app.utils.metrics import describe, metrics
+
+
+describe('seller_stats_drift_total', 'counter', 'Seller stats rows corrected by reconciliation')
+
+COUNTERS = ('products_active', 'orders_completed', 'responses', 'response_seconds')
+
+ReconcileResult = namedtuple('ReconcileResult', 'sellers drifted elapsed samples')
+
+
+def is_listed(product):
+    return bool(product.is_active and product.is_approved)
+
+
+def _upsert(seller_id, values, increment):
+    table = SellerStats.__table__
+    now = datetime.utcnow()
+    changes = {k: (table.c[k] + v if increment else v) for k, v in values.items()}
+    changes['updated_at'] = now
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        stmt = insert(table).values(seller_id=seller_id, updated_at=now, **values)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=[table.c.seller_id], set_=changes))
+    elif not db.session.execute(update(table).where(table.c.seller_id == seller_id).values(**changes)).rowcount:
+        db.session.execute(table.insert().values(seller_id=seller_id, updated_at=now, **values))
+
+
+def bump(seller_id, **deltas):
+    """Add ``deltas`` to a seller's counters as part of the caller's transaction.
+
+    Call before the commit that changes the source rows, so the counters and
+    the data they summarize commit (or roll back) together.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if seller_id and deltas:
+        _upsert(seller_id, deltas, increment=True)
+
+
+def listing_changed(product, was_listed):
+    bump(product.seller_id, products_active=int(is_listed(product)) - int(was_listed))
+
+
+def response_seconds(order_created_at, replied_at):
+    return max(int((replied_at - order_created_at).total_seconds()), 0) if order_created_at else 0
+
+
+def compute(lo, hi):
+    """Counters recomputed from the source tables for sellers with ids in [lo, hi]."""
+    stats = {}
+
+    def row(seller_id):
+        return stats.setdefault(seller_id, dict.fromkeys(COUNTERS, 0))
+
+    listed = (
+        db.session.query(Product.seller_id, func.count())
+        .filter(Product.seller_id.between(lo, hi), Product.is_active.is_(True), Product.is_approved.is_(True))
+        .group_by(Product.seller_id)
+    )
+    for seller_id, n in listed:
+        row(seller_id)['products_active'] = n
+
+    completed = (
+        db.session.query(Product.seller_id, func.count())
+        .join(Order, Order.product_id == Product.id)
+        .filter(Product.seller_id.between(lo, hi), Order.status == 'completed')
+        .group_by(Product.seller_id)
+    )
+    for seller_id, n in completed:
+        row(seller_id)['orders_completed'] = n
+
+    # First reply by the seller on each of their orders
+    first_replies = (
+        db.session.query(Product.seller_id, Order.created_at, func.min(Message.created_at))
+        .join(Order, Order.product_id == Product.id)
+        .join(Message, and_(Message.context_type == 'order', Message.context_id == Order.id,
+                            Message.sender_id == Product.seller_id))
+        .filter(Product.seller_id.between(lo, hi))
+        .group_by(Order.id, Product.seller_id, Order.created_at)
+    )
+    for seller_id, created_at, replied_at in first_replies:
+        r = row(seller_id)
+        r['responses'] += 1
+        r['response_seconds'] += response_seconds(created_at, replied_at)
+
+    # Archived orders keep counting (app/utils/archive.py)
+    archived = (
+        db.session.query(ArchivedOrder.seller_id, ArchivedOrder.status, ArchivedOrder.created_at,
+                         ArchivedOrder.first_reply_at)
+        .filter(ArchivedOrder.seller_id.between(lo, hi))
+    )
+    for seller_id, status, created_at, replied_at in archived:
+        r = row(seller_id)
+        if status == 'completed':
+            r['orders_completed'] += 1
+        if replied_at:
+            r['responses'] += 1
+            r['response_seconds'] += response_seconds(created_at, replied_at)
+    return stats
+
+
+def reconcile(chunk_size=1000, fix=True, sample_limit=20):
+    """Recompute every seller's counters in id-range chunks and correct drift.
+
+    Each chunk locks its stats rows before reading the sources (FOR UPDATE is
+    a no-op on SQLite, where writers are serialized anyway), so a concurrent
+    ``bump`` either committed before the recount or is applied on top of it.
+    """
+    started = time.perf_counter()
+    lo_id, hi_id = db.session.query(func.min(User.id), func.max(User.id)).one()
+    sellers = drifted = 0
+    samples = []
+    for lo in range(lo_id or 0, (hi_id or -1) + 1, chunk_size):
+        hi = lo + chunk_size - 1
+        stored = {
+            s.seller_id: {k: getattr(s, k) for k in COUNTERS}
+            for s in SellerStats.query.filter(SellerStats.seller_id.between(lo, hi)).with_for_update()
+        }
+        expected = compute(lo, hi)
+        zero = dict.fromkeys(COUNTERS, 0)
+        for seller_id in sorted(set(stored) | set(expected)):
+            want = expected.get(seller_id, zero)
+            have = stored.get(seller_id)
+            sellers += 1
+            if have == want or (have is None and want == zero):
+                continue
+            drifted += 1
+            if len(samples) < sample_limit:
+                samples.append((seller_id, have, want))
+            if fix:
+                _upsert(seller_id, want, increment=False)
+        if fix:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    if fix and drifted:
+        metrics.inc('seller_stats_drift_total', drifted)
+    return ReconcileResult(sellers, drifted, time.perf_counter() - started, samples)
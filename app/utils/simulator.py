@@ -0,0 +1,113 @@
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from app.utils.metrics import describe, timed
+
+
+describe('pawah_simulation_seconds', 'histogram', 'Time to run one uncached pawah Monte Carlo simulation')
+
+# Rough per-crop economics. Capital buys the inputs for the whole deal and is
+# spread evenly over its harvest cycles:
+#   revenue   - expected sales per RM of capital in a normal season
+#   yield_sd  - lognormal sigma of the per-cycle yield shock (weather, pests)
+#   price_sd  - lognormal sigma of the farm-gate price over the deal
+#   cost      - (mean, sd) harvest/transport/marketing costs as a fraction of sales
+#   failure   - chance a cycle is mostly lost (yield drops to 20%)
+#   cycle     - months per harvest cycle
+CropModel = namedtuple('CropModel', 'revenue yield_sd price_sd cost failure cycle')
+
+CROP_MODELS = {
+    'padi': CropModel(1.50, 0.18, 0.08, (0.15, 0.04), 0.05, 4),
+    'durian': CropModel(2.00, 0.35, 0.30, (0.20, 0.05), 0.10, 12),
+    'kelapa sawit': CropModel(1.45, 0.15, 0.25, (0.12, 0.03), 0.03, 12),
+    'sayur': CropModel(1.50, 0.25, 0.30, (0.20, 0.05), 0.08, 2),
+    'cili': CropModel(1.70, 0.30, 0.40, (0.20, 0.05), 0.10, 4),
+    'pisang': CropModel(1.50, 0.20, 0.25, (0.15, 0.04), 0.06, 9),
+    'jagung': CropModel(1.40, 0.20, 0.20, (0.15, 0.04), 0.06, 3),
+    'nanas': CropModel(1.50, 0.20, 0.22, (0.15, 0.04), 0.05, 12),
+    'getah': CropModel(1.35, 0.12, 0.30, (0.15, 0.03), 0.03, 12),
+    'halia': CropModel(1.80, 0.30, 0.35, (0.20, 0.05), 0.12, 8),
+}
+DEFAULT_MODEL = CropModel(1.50, 0.25, 0.25, (0.18, 0.05), 0.07, 6)
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+Simulation = namedtuple('Simulation', 'crop_type known_crop scenarios cycles owner farmer profit')
+
+
+def crop_model(crop_type):
+    key = ' '.join((crop_type or '').lower().split())
+    return CROP_MODELS.get(key), key
+
+
+def _summary(values, capital=None):
+    pct = np.percentile(values, PERCENTILES)
+    out = {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, pct)}
+    out['mean'] = round(float(values.mean()), 2)
+    out['prob_loss'] = round(float((values < 0).mean()), 4)
+    if capital:
+        out['median_roi'] = round(float(pct[2] / capital), 4)
+    return out
+
+
+def _seed(*params):
+    # Same parameters -> same draws, so memoized and recomputed results agree
+    return int.from_bytes(hashlib.blake2b(repr(params).encode(), digest_size=8).digest(), 'big')
+
+
+@lru_cache(maxsize=1024)
+def simulate(crop_type, capital, duration_months, owner_share, scenarios=100_000):
+    """Monte Carlo payouts for one pawah deal.
+
+    The owner puts up ``capital`` and gets it back first; what is left after
+    operating costs is split by share. A loss comes out of the owner's
+    capital, while the farmer's share is floored at zero (they lose labour,
+    not money). All arguments must be hashable scalars: results are memoized.
+    """
+    model, key = crop_model(crop_type)
+    known = model is not None
+    model = model or DEFAULT_MODEL
+    cycles = max(duration_months / model.cycle, 1.0)
+    owner_frac = owner_share / 100.0
+    rng = np.random.default_rng(_seed(key, capital, duration_months, owner_share, scenarios))
+
+    with timed('pawah_simulation_seconds'):
+        # Average yield over the deal's cycles. Rather than drawing every cycle,
+        # draw the mean of ``cycles`` lognormal shocks directly (moment-matched
+        # lognormal) and the share of failed cycles from a binomial, so the cost
+        # is four draws per scenario however long the deal runs.
+        n_cycles = int(np.ceil(cycles))
+        sd = np.sqrt(np.log1p(np.expm1(model.yield_sd ** 2) / cycles))
+        yield_avg = rng.lognormal(-sd ** 2 / 2, sd, scenarios)
+        yield_avg *= 1.0 - 0.8 * rng.binomial(n_cycles, model.failure, scenarios) / n_cycles
+        # Price moves are persistent across the deal, not per cycle
+        price = rng.lognormal(-model.price_sd ** 2 / 2, model.price_sd, scenarios)
+        cost_ratio = np.clip(rng.normal(model.cost[0], model.cost[1], scenarios), 0.0, 0.9)
+        profit = capital * model.revenue * yield_avg * price * (1 - cost_ratio) - capital
+
+        gain = np.maximum(profit, 0.0)
+        owner = gain * owner_frac + np.minimum(profit, 0.0)
+        farmer = gain * (1 - owner_frac)
+
+    return Simulation(
+        crop_type=crop_type,
+        known_crop=known,
+        scenarios=scenarios,
+        cycles=round(cycles, 2),
+        owner=_summary(owner, capital),
+        farmer=_summary(farmer),
+        profit=_summary(profit, capital),
+    )
+
+
+def simulate_project(project, owner_share=None, scenarios=100_000):
+    return simulate(
+        project.crop_type,
+        round(float(project.capital_required), 2),
+        int(project.duration_months),
+        int(project.owner_share_percent if owner_share is None else owner_share),
+        scenarios,
+    )
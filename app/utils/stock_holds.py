@@ -0,0 +1,122 @@
+import json
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app.extensions import db
+from app.models import AuditLog, Order, Product
+from app.utils.metrics import describe, metrics
+
+
+describe('stock_holds_expired_total', 'counter', 'Pending orders cancelled because their stock hold expired')
+describe('stock_hold_sweep_seconds', 'histogram', 'Time to release one batch of expired stock holds')
+
+SweepResult = namedtuple('SweepResult', 'orders units elapsed')
+HOLD_EXPIRED_META = json.dumps({'reason': 'hold_expired'})
+
+
+def hold_expiry(now=None):
+    return (now or datetime.utcnow()) + timedelta(hours=current_app.config.get('STOCK_HOLD_HOURS', 48))
+
+
+def reserve(product_id, qty):
+    """Take ``qty`` units of stock in the caller's transaction; False if not enough is left.
+
+    A single conditional UPDATE: no row is read and locked first, so readers
+    of ``Product.quantity`` (which already excludes every active hold) never
+    wait, and concurrent buyers cannot oversell.
+    """
+    return db.session.query(Product).filter(
+        Product.id == product_id, Product.quantity >= qty
+    ).update({Product.quantity: Product.quantity - qty}, synchronize_session=False) == 1
+
+
+def restock(product_id, qty):
+    db.session.query(Product).filter(Product.id == product_id, Product.quantity.isnot(None)).update(
+        {Product.quantity: Product.quantity + qty}, synchronize_session=False
+    )
+
+
+def change_status(order, old_status, new_status):
+    """Move ``order`` on only if it is still in ``old_status``; False if something else moved it first.
+
+    Leaving ``pending`` ends the hold: the stock goes back on cancel and stays
+    sold otherwise.
+    """
+    values = {Order.status: new_status}
+    if old_status == 'pending':
+        values[Order.hold_expires_at] = None
+    moved = db.session.query(Order).filter(Order.id == order.id, Order.status == old_status).update(
+        values, synchronize_session=False
+    ) == 1
+    if moved and old_status == 'pending' and new_status == 'cancelled':
+        restock(order.product_id, order.quantity)
+    return moved
+
+
+def release_expired(now=None, product_id=None, batch_size=1000):
+    """Cancel pending orders whose hold has expired and put their stock back.
+
+    Each batch is one range scan of ``ix_orders_hold_expires_at`` plus a
+    handful of set-based statements (one UPDATE of the orders, one
+    executemany restock per product, one audit insert), committed together.
+    The UPDATE re-checks ``status = 'pending'``, so an order paid or
+    cancelled meanwhile is left alone.
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    orders = Order.__table__
+    products = Product.__table__
+    released = units = 0
+    while True:
+        batch_started = time.perf_counter()
+        query = db.session.query(Order.id).filter(Order.hold_expires_at < now)
+        if product_id is not None:
+            query = query.filter(Order.product_id == product_id)
+        ids = [i for (i,) in query.order_by(Order.hold_expires_at).limit(batch_size)]
+        if not ids:
+            break
+        rows = db.session.execute(
+            orders.update()
+            .where(orders.c.id.in_(ids), orders.c.status == 'pending', orders.c.hold_expires_at < now)
+            .values(status='cancelled', hold_expires_at=None)
+            .returning(orders.c.id, orders.c.product_id, orders.c.quantity)
+        ).all()
+        per_product = Counter()
+        for _order_id, pid, qty in rows:
+            per_product[pid] += qty
+        if per_product:
+            db.session.execute(
+                products.update()
+                .where(products.c.id == bindparam('pid'), products.c.quantity.isnot(None))
+                .values(quantity=products.c.quantity + bindparam('qty')),
+                [{'pid': pid, 'qty': qty} for pid, qty in sorted(per_product.items())],
+            )
+            db.session.execute(AuditLog.__table__.insert(), [
+                {'entity_type': 'order', 'entity_id': order_id, 'action': 'status_change', 'old_status': 'pending',
+                 'new_status': 'cancelled', 'actor_id': None, 'meta': HOLD_EXPIRED_META, 'created_at': now}
+                for order_id, _pid, _qty in rows
+            ])
+        db.session.commit()
+        released += len(rows)
+        units += sum(per_product.values())
+        metrics.observe('stock_hold_sweep_seconds', time.perf_counter() - batch_started)
+        if not rows or len(ids) < batch_size:
+            break
+    if released:
+        metrics.inc('stock_holds_expired_total', released)
+    return SweepResult(released, units, time.perf_counter() - started)
+
+
+def adopt_legacy(now=None):
+    """Give pending orders placed before holds existed an expiry, so the sweep can free their stock."""
+    now = now or datetime.utcnow()
+    limited = db.session.query(Product.id).filter(Product.quantity.isnot(None))
+    n = db.session.query(Order).filter(
+        Order.status == 'pending', Order.hold_expires_at.is_(None), Order.product_id.in_(limited)
+    ).update({Order.hold_expires_at: hold_expiry(now)}, synchronize_session=False)
+    db.session.commit()
+    return n
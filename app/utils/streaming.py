@@ -0,0 +1,61 @@
+from flask import Response, current_app, get_flashed_messages, render_template, stream_with_context
+from flask_wtf.csrf import generate_csrf
+
+from app.extensions import db
+
+
+def _buffered(chunks, first_size, chunk_size):
+    # Jinja yields one tiny string per template node; regroup so each write
+    # (and each compressor sync-flush) carries a useful amount of HTML.
+    buf = []
+    size = 0
+    limit = first_size
+    for chunk in chunks:
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= limit:
+            yield ''.join(buf)
+            buf, size, limit = [], 0, chunk_size
+    if buf:
+        yield ''.join(buf)
+
+
+def render_streamed(template_name, **context):
+    """Like ``render_template`` but sends the page while it renders.
+
+    Pass queries (ideally with ``yield_per``) rather than lists so rows are
+    fetched as the template reaches them. Templates must not test list
+    truthiness or length; use ``{% for %}...{% else %}``.
+    """
+    app = current_app._get_current_object()
+    if not app.config.get('STREAM_TEMPLATES', True):
+        return render_template(template_name, **context)
+
+    # The session cookie goes out with the headers, so anything that writes
+    # to the session (popping flashes, creating the CSRF token) happens now.
+    get_flashed_messages(with_categories=True)
+    if app.config.get('WTF_CSRF_ENABLED', True):
+        generate_csrf()
+
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+    # Teardown removes the view's session as soon as the view returns, but the
+    # queries in ``context`` still hold it and reconnect while the body renders;
+    # nothing else would close it, so its connection would stay checked out
+    session = db.session()
+
+    def generate():
+        try:
+            yield from _buffered(
+                template.generate(context),
+                app.config.get('STREAM_FIRST_CHUNK', 1024),
+                app.config.get('STREAM_CHUNK_SIZE', 8192),
+            )
+        except Exception:
+            # Status and headers are already sent; all we can do is log and stop
+            app.logger.exception('error while streaming %s', template_name)
+            raise
+        finally:
+            session.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
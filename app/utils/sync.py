@@ -0,0 +1,159 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Response, current_app, request
+from sqlalchemy import or_, tuple_
+
+from app.extensions import db
+from app.models import Message, Order, PawahProject, Product
+
+try:
+    import msgpack
+except ImportError:  # optional: minified JSON only
+    msgpack = None
+
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+PRODUCT_FIELDS = ('id', 'title', 'description', 'price', 'quantity', 'unit', 'min_order_qty', 'category',
+                  'location', 'latitude', 'longitude', 'image_url', 'seller_id', 'created_at', 'updated_at')
+PAWAH_FIELDS = ('id', 'title', 'description', 'crop_type', 'location', 'latitude', 'longitude', 'duration_months',
+                'capital_required', 'owner_share_percent', 'farmer_share_percent', 'status', 'owner_id', 'farmer_id',
+                'created_at', 'updated_at')
+ORDER_FIELDS = ('id', 'buyer_id', 'product_id', 'quantity', 'total_price', 'status', 'hold_expires_at',
+                'created_at', 'updated_at')
+MESSAGE_FIELDS = ('id', 'context_id', 'sender_id', 'content', 'created_at')
+# Largest id a cursor may carry (a signed 64-bit column)
+MAX_ID = 2 ** 63 - 1
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def encode_cursor(positions):
+    raw = json.dumps(positions, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """{name: (datetime, id)} from an opaque cursor; {} for none."""
+    if not value:
+        return {}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        positions = {name: (datetime.fromisoformat(ts), int(i)) for name, (ts, i) in raw.items()}
+    except (ValueError, TypeError, AttributeError, OverflowError) as e:
+        raise BadCursor(str(e)) from e
+    # Ids are bound as SQL integers; 0 is what a position held at the settle horizon carries
+    if any(not 0 <= i <= MAX_ID for _, i in positions.values()):
+        raise BadCursor('cursor id out of range')
+    # Stored timestamps are naive UTC; an aware one cannot be compared with them
+    if any(ts.tzinfo is not None for ts, _ in positions.values()):
+        raise BadCursor('cursor timestamps must not carry a timezone')
+    return positions
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def horizon(now=None):
+    """Rows stamped after this may still have commits racing them in; cursors never pass it."""
+    return (now or datetime.utcnow()) - timedelta(seconds=current_app.config.get('SYNC_SETTLE_SECONDS', 30))
+
+
+def page(query, stamp, key, fields, position, limit, settle, visible=None):
+    """One keyset page of ``query`` after ``position`` in (stamp, key) order.
+
+    Returns ``(rows, removed, position, has_more)``: ``rows`` are value lists
+    in ``fields`` order; ``removed`` are keys of rows that changed but fail
+    ``visible`` (tombstones, only sent to clients that already synced once).
+    The next position stops at ``settle`` so a write that commits late with
+    an older timestamp is still picked up; the client sees the rows after it
+    again and upserts them.
+    """
+    if position:
+        # The plain range lets the planner seek the (..., stamp) index; the row value is the exact bound
+        query = query.filter(stamp >= position[0], tuple_(stamp, key) > tuple_(*position))
+    found = query.filter(stamp.isnot(None)).order_by(stamp, key).limit(limit + 1).all()
+    has_more = len(found) > limit
+    found = found[:limit]
+    rows, removed = [], []
+    for obj in found:
+        if visible is None or visible(obj):
+            rows.append([_plain(getattr(obj, f)) for f in fields])
+        elif position:
+            removed.append(getattr(obj, key.key))
+    if found:
+        last = getattr(found[-1], stamp.key), getattr(found[-1], key.key)
+        if last[0] > settle:
+            last = max((settle, 0), tuple(position or (settle, 0)))
+            has_more = False
+        position = last
+    return rows, removed, position, has_more
+
+
+def listing_changes(cursor, limit, now=None):
+    settle = horizon(now)
+    out = {'has_more': False}
+    positions = {}
+    for name, model, fields, visible in (
+        ('products', Product, PRODUCT_FIELDS, lambda p: p.is_active and p.is_approved),
+        ('pawah', PawahProject, PAWAH_FIELDS, lambda p: p.is_approved),
+    ):
+        rows, removed, positions[name], more = page(
+            model.query, model.updated_at, model.id, fields, cursor.get(name), limit, settle, visible
+        )
+        out[name] = {'fields': fields, 'rows': rows, 'removed': removed}
+        out['has_more'] = out['has_more'] or more
+    out['cursor'] = encode_cursor({k: [v[0].isoformat(), v[1]] for k, v in positions.items() if v})
+    return out
+
+
+def order_changes(user_id, cursor, limit, now=None):
+    """The user's orders (as buyer or seller) and their message threads changed since ``cursor``."""
+    settle = horizon(now)
+    seller_products = db.session.query(Product.id).filter(Product.seller_id == user_id)
+    mine = or_(Order.buyer_id == user_id, Order.product_id.in_(seller_products))
+    orders, _removed, orders_at, more_orders = page(
+        Order.query.filter(mine), Order.updated_at, Order.id, ORDER_FIELDS, cursor.get('orders'), limit, settle
+    )
+    messages, _removed, messages_at, more_messages = page(
+        Message.query.filter(Message.context_type == 'order',
+                             Message.context_id.in_(db.session.query(Order.id).filter(mine))),
+        Message.created_at, Message.id, MESSAGE_FIELDS, cursor.get('messages'), limit, settle,
+    )
+    positions = {'orders': orders_at, 'messages': messages_at}
+    return {
+        'orders': {'fields': ORDER_FIELDS, 'rows': orders},
+        'messages': {'fields': MESSAGE_FIELDS, 'rows': messages},
+        'has_more': more_orders or more_messages,
+        'cursor': encode_cursor({k: [v[0].isoformat(), v[1]] for k, v in positions.items() if v}),
+    }
+
+
+def wants_msgpack():
+    if msgpack is None:
+        return False
+    if request.args.get('format') == 'msgpack':
+        return True
+    best = request.accept_mimetypes.best_match(('application/json',) + MSGPACK_TYPES)
+    return best in MSGPACK_TYPES
+
+
+def sync_response(payload):
+    """MessagePack when asked for (and installed), else minified JSON; both go through response compression."""
+    if wants_msgpack():
+        response = Response(msgpack.packb(payload, use_bin_type=True), mimetype='application/msgpack')
+    else:
+        response = Response(json.dumps(payload, separators=(',', ':'), ensure_ascii=False),
+                            mimetype='application/json')
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,219 @@
+import atexit
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import request, session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.extensions import db
+from app.models import ListingView
+from app.utils.metrics import describe, metrics, timed
+
+
+describe('views_recorded_total', 'counter', 'Listing views accepted into the write-behind buffer')
+describe('views_skipped_total', 'counter', 'Listing views not counted, by reason (bot, repeat)')
+describe('views_flushed_total', 'counter', 'Listing views written to the database')
+describe('views_dropped_total', 'counter', 'Buffered listing views discarded after failed flushes')
+describe('view_flush_seconds', 'histogram', 'Time to write one batch of buffered listing views')
+
+BOT_PATTERN = re.compile(
+    r'bot|crawl|spider|slurp|facebookexternalhit|preview|curl|wget|python-requests|httpx|headless|monitor',
+    re.I,
+)
+
+
+class ViewCounter:
+    """Per-worker write-behind buffer for listing view counts.
+
+    ``record`` is a dict increment under a lock. A daemon thread writes the
+    buffer with one bulk upsert every ``flush_interval`` seconds, or sooner
+    once ``flush_events`` views are waiting, and once more at interpreter
+    exit. A worker that dies loses at most one interval's views; a failed
+    write keeps its batch for the next attempt, up to ``max_pending`` keys.
+
+    Repeat views are dropped with a two-generation set of 64-bit viewer
+    hashes: a (viewer, listing) pair counts once per ``dedupe_window``
+    (between one and two windows), and memory stays bounded by
+    ``max_seen`` entries.
+    """
+
+    def __init__(self, flush_interval=5.0, flush_events=500, dedupe_window=1800, max_seen=200_000,
+                 max_pending=50_000):
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.dedupe_window = dedupe_window
+        self.max_seen = max_seen
+        self.max_pending = max_pending
+        self.app = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pending = {}
+        self._events = 0
+        self._seen, self._seen_prev = set(), set()
+        self._rotated = time.monotonic()
+        self._thread = None
+
+    def _check_fork(self):
+        # A preloading master's buffer and thread do not survive the fork
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+        self._thread.start()
+
+    def record(self, kind, entity_id, viewer):
+        key = (kind, entity_id)
+        digest = hash((viewer, kind, entity_id))
+        now = time.monotonic()
+        with self._lock:
+            self._check_fork()
+            if now - self._rotated >= self.dedupe_window or len(self._seen) >= self.max_seen:
+                self._seen_prev, self._seen = self._seen, set()
+                self._rotated = now
+            if digest in self._seen or digest in self._seen_prev:
+                repeat = True
+            else:
+                repeat = False
+                self._seen.add(digest)
+                self._pending[key] = self._pending.get(key, 0) + 1
+                self._events += 1
+            if self._thread is None and self.app is not None:
+                self._start()
+            full = self._events >= self.flush_events
+        if repeat:
+            metrics.inc('views_skipped_total', reason='repeat')
+            return False
+        metrics.inc('views_recorded_total', kind=kind)
+        if full:
+            self._wake.set()
+        return True
+
+    def _take(self):
+        with self._lock:
+            self._check_fork()
+            batch, self._pending, self._events = self._pending, {}, 0
+        return batch
+
+    def _put_back(self, batch):
+        with self._lock:
+            for key, n in batch.items():
+                if key in self._pending or len(self._pending) < self.max_pending:
+                    self._pending[key] = self._pending.get(key, 0) + n
+                else:
+                    metrics.inc('views_dropped_total', n)
+
+    def flush(self):
+        """Write buffered views now; returns how many were written."""
+        app = self.app
+        if app is None:
+            return 0
+        batch = self._take()
+        if not batch:
+            return 0
+        try:
+            with app.app_context(), timed('view_flush_seconds'):
+                write_views(batch)
+        except Exception:
+            self._put_back(batch)
+            app.logger.exception('view count flush failed; %d listings kept for retry', len(batch))
+            return 0
+        total = sum(batch.values())
+        metrics.inc('views_flushed_total', total)
+        return total
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return sum(self._pending.values())
+
+
+def write_views(batch):
+    """Add ``{(kind, entity_id): n}`` to the stored counts in one transaction."""
+    table = ListingView.__table__
+    now = datetime.utcnow()
+    rows = [{'kind': k, 'entity_id': i, 'views': n, 'updated_at': now} for (k, i), n in sorted(batch.items())]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        # Multi-row VALUES, kept under the drivers' bound-parameter limits
+        for start in range(0, len(rows), 500):
+            stmt = insert(table).values(rows[start:start + 500])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.kind, table.c.entity_id],
+                set_={'views': table.c.views + stmt.excluded.views, 'updated_at': stmt.excluded.updated_at},
+            )
+            db.session.execute(stmt)
+    else:
+        for row in rows:
+            updated = db.session.execute(
+                table.update()
+                .where(table.c.kind == row['kind'], table.c.entity_id == row['entity_id'])
+                .values(views=table.c.views + row['views'], updated_at=now)
+            ).rowcount
+            if not updated:
+                db.session.execute(table.insert().values(**row))
+    db.session.commit()
+
+
+def views_for(kind, ids):
+    """{entity_id: views} for ``ids``, a list or a scalar subquery of ids."""
+    if isinstance(ids, (list, tuple, set)) and not ids:
+        return {}
+    rows = db.session.query(ListingView.entity_id, ListingView.views).filter(
+        ListingView.kind == kind, ListingView.entity_id.in_(ids)
+    )
+    return dict(rows)
+
+
+view_counter = ViewCounter()
+
+
+def _viewer_key():
+    user_id = session.get('user_id')
+    if user_id:
+        return f'u{user_id}'
+    # Anonymous: address + browser is close enough to "the same person" for a view count
+    raw = f"{request.remote_addr}|{request.headers.get('User-Agent', '')}".encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def record_view(kind, entity_id):
+    """Count a GET of a listing page, unless it came from a bot or a repeat viewer."""
+    if view_counter.app is None or request.method != 'GET':
+        return False
+    ua = request.headers.get('User-Agent', '')
+    if not ua or BOT_PATTERN.search(ua):
+        metrics.inc('views_skipped_total', reason='bot')
+        return False
+    return view_counter.record(kind, entity_id, _viewer_key())
+
+
+def init_view_counter(app):
+    if not app.config.get('VIEW_COUNTS_ENABLED', True):
+        view_counter.app = None
+        return
+    view_counter.app = app
+    view_counter.flush_interval = app.config.get('VIEW_FLUSH_SECONDS', 5.0)
+    view_counter.flush_events = app.config.get('VIEW_FLUSH_EVENTS', 500)
+    view_counter.dedupe_window = app.config.get('VIEW_DEDUPE_SECONDS', 1800)
+
+
+@atexit.register
+def _flush_at_exit():
+    if view_counter.app is not None:
+        view_counter.flush()
@@ -0,0 +1,89 @@
+import time
+
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text
+
+from app.extensions import db
+from app.utils.fs import private_dir
+
+
+def configure_template_cache(app):
+    # Must run before anything touches app.jinja_env (it is created lazily from jinja_options)
+    cache_dir = app.config.get('JINJA_CACHE_DIR')
+    if not app.config.get('JINJA_BYTECODE_CACHE') or not cache_dir:
+        return
+    try:
+        private_dir(cache_dir)
+    except OSError as exc:
+        app.logger.warning('Jinja bytecode cache disabled: %s', exc)
+        return
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
+
+
+def precompile_templates(app):
+    """Load every template so the first request does not pay for compilation."""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda n: n.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def prime_db_pool(app, connections=1):
+    """Open ``connections`` pooled connections up front and return them to the pool."""
+    with app.app_context():
+        conns = []
+        try:
+            for _ in range(max(connections, 0)):
+                conn = db.engine.connect()
+                conn.execute(text('SELECT 1'))
+                conns.append(conn)
+        finally:
+            for conn in conns:
+                conn.close()
+    return len(conns)
+
+
+def load_oauth_metadata(app):
+    # Network call to Google's discovery document; opt-in via WARMUP_OAUTH
+    from app.oauth import oauth
+    with app.app_context():
+        client = oauth.create_client('google')
+        if client and client.client_id:
+            client.load_server_metadata()
+
+
+def warm_up(app, templates=True, db_connections=None, oauth=None):
+    """Run the warm-up steps enabled in config and return their timings in seconds."""
+    timings = {}
+    if templates:
+        started = time.perf_counter()
+        precompile_templates(app)
+        timings['templates'] = time.perf_counter() - started
+    connections = app.config.get('WARMUP_DB_CONNECTIONS', 1) if db_connections is None else db_connections
+    if connections:
+        started = time.perf_counter()
+        try:
+            prime_db_pool(app, connections)
+        except Exception:
+            app.logger.warning('warm-up: could not prime DB pool', exc_info=True)
+        timings['db_pool'] = time.perf_counter() - started
+    if app.config.get('WARMUP_OAUTH') if oauth is None else oauth:
+        started = time.perf_counter()
+        try:
+            load_oauth_metadata(app)
+        except Exception:
+            app.logger.warning('warm-up: could not load OAuth metadata', exc_info=True)
+        timings['oauth'] = time.perf_counter() - started
+    return timings
+
+
+def dispose_engine_after_fork(app):
+    """Drop pooled connections inherited from a preloading master.
+
+    ``close=False`` leaves the parent's sockets alone; the child simply starts
+    with an empty pool.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,99 @@
+"""Autocomplete snapshot build time and lookup latency.
+
+Builds a snapshot from synthetic listing terms (no database), then times
+lookups straight on the mapped index and through the /autocomplete route.
+
+    python -m bench.autocomplete --products 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from bench.common import make_bench_app, summarize
+
+
+def synthetic_terms(products, pawah, seed=7):
+    from app.utils.seed import ADJECTIVES, CATEGORIES, CROP_TYPES, LOCATIONS, WORDS
+    rng = random.Random(seed)
+    categories = [c for c, _ in CATEGORIES]
+    crops = [c for c, _ in CROP_TYPES]
+    places = [p for p, _ in LOCATIONS] + [f'Kampung {w.title()} {i}' for i in range(200) for w in WORDS[:3]]
+    terms = Counter()
+    for _ in range(products):
+        title = f'{rng.choice(crops)} {rng.choice(ADJECTIVES)} {rng.choice(WORDS)} {rng.randrange(5000)}'
+        terms[('product', title)] += 1
+        terms[('category', rng.choice(categories))] += 1
+        terms[('location', rng.choice(places))] += 1
+    for _ in range(pawah):
+        crop = rng.choice(crops)
+        terms[('pawah', f'Pawah {crop} {rng.choice(WORDS)} {rng.randrange(1000)}')] += 1
+        terms[('crop', crop)] += 1
+        terms[('location', rng.choice(places))] += 1
+    return terms
+
+
+def prefixes(terms, n, seed=11):
+    # What people type: 1-8 leading characters of a real term, sometimes of a later word
+    rng = random.Random(seed)
+    values = [v for _, v in terms]
+    out = []
+    for _ in range(n):
+        words = rng.choice(values).lower().split()
+        word = ' '.join(words[rng.randrange(len(words)):]) if rng.random() < 0.3 else ' '.join(words)
+        out.append(word[:rng.randint(1, 8)])
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--pawah', type=int, default=20_000)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='kp-autocomplete-')
+    os.environ['AUTOCOMPLETE_DIR'] = directory
+    from app.utils.autocomplete import FIELDS, Snapshot, write_snapshot
+
+    terms = synthetic_terms(args.products, args.pawah)
+    path = os.path.join(directory, 'autocomplete.idx')
+    t0 = time.perf_counter()
+    entries = write_snapshot(path, terms)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    snapshot = Snapshot(path)
+    load = time.perf_counter() - t0
+    print(f'{len(terms)} terms, {entries} entries, {os.path.getsize(path) / 1e6:.1f} MB; '
+          f'build {build:.2f}s, map {load * 1000:.2f} ms')
+
+    queries = prefixes(terms, args.lookups)
+    fields = [None] + list(FIELDS)
+    latencies = []
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        snapshot.lookup(q, fields[i % len(fields)])
+        latencies.append(time.perf_counter() - t0)
+    s = summarize(latencies)
+    print(f"index  p50 {s['p50_ms'] * 1000:7.1f} us  p99 {s['p99_ms'] * 1000:7.1f} us  "
+          f"({s['throughput_rps']:,.0f} lookups/s)")
+
+    app = make_bench_app()
+    client = app.test_client()
+    client.get('/autocomplete?q=a')
+    latencies = []
+    for i, q in enumerate(queries[:args.requests]):
+        field = fields[i % len(fields)]
+        t0 = time.perf_counter()
+        r = client.get('/autocomplete', query_string={'q': q, **({'field': field} if field else {})})
+        latencies.append(time.perf_counter() - t0)
+        assert r.status_code == 200, r.status_code
+    s = summarize(latencies)
+    print(f"route  p50 {s['p50_ms']:7.2f} ms  p99 {s['p99_ms']:7.2f} ms  (target p99 < 5 ms)")
+
+
+if __name__ == '__main__':
+    main()
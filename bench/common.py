@@ -0,0 +1,79 @@
+import json
+import math
+import os
+import sys
+import tempfile
+
+# Allow `python bench/<script>.py` as well as `python -m bench.<script>`
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_values[int(k)]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies_s, elapsed_s=None):
+    values = sorted(latencies_s)
+    total = elapsed_s if elapsed_s is not None else sum(values)
+    return {
+        'n': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'throughput_rps': (len(values) / total) if total else 0.0,
+    }
+
+
+def make_bench_app(database_url=None, **config):
+    """App wired for benchmarking: no CSRF, no rate limits, its own DB."""
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='kp-bench-'), 'bench.db')}"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('METRICS_ENABLED', 'false')
+    os.environ.setdefault('JOBS_ENABLED', 'false')
+    from app import create_app
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False, **config)
+    # The limiter reads RATELIMIT_ENABLED in init_app, before the update above
+    from app.extensions import limiter
+    limiter.enabled = False
+    return app
+
+
+def load_baseline(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, key='p95_ms', threshold=0.10):
+    """Yield (name, old, new, ratio, regressed) for scenarios present in both runs."""
+    for name, current in results.items():
+        old = baseline.get(name)
+        if not old or key not in old or not old[key]:
+            continue
+        ratio = current[key] / old[key]
+        yield name, old[key], current[key], ratio, ratio > 1 + threshold
+
+
+def migrate(database_url):
+    """Create the schema through alembic so the DB has the shipped indexes, not just the models'."""
+    from alembic import command
+    from alembic.config import Config
+    cfg = Config(os.path.join(ROOT, 'alembic.ini'))
+    cfg.set_main_option('script_location', os.path.join(ROOT, 'alembic'))
+    cfg.set_main_option('sqlalchemy.url', database_url)
+    command.upgrade(cfg, 'head')
@@ -0,0 +1,159 @@
+"""Near-duplicate lookup cost and accuracy as the catalogue grows to 100k listings.
+
+Fills a SQLite DB with synthetic listings (Zipf-distributed vocabulary, so
+common words recur the way they do in real listings), indexing them as it
+goes. At each ``--steps`` size it submits ``--queries`` listings, half of
+them lightly edited copies of existing ones and half new, through the same
+path as the marketplace form (insert, flush, ``duplicates.check``, rolled
+back afterwards), and times:
+
+- the indexed check: candidates from the LSH bands plus exact verification
+- a brute-force scan computing the exact Jaccard against every live listing
+  in memory (the linear cost the index avoids, before any DB reads)
+
+Recall is the share of submissions with a true match >= DUPLICATE_THRESHOLD
+that the check flagged, and ``same`` how many of those it paired with the
+scan's best match. Flags are confirmed exactly, so there are no false
+positives.
+
+    python -m bench.duplicates --steps 10000,30000,100000 --queries 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bench.common import make_bench_app, percentile
+
+SYLLABLES = ('ba be bi bu da di du ga gi gu ka ke ki ku la li lu ma me mi mu na ni nu pa pe pi pu ra ri ru '
+             'sa se si su ta ti tu ja ju ya wa ng an en in un ar').split()
+
+
+class Corpus:
+    def __init__(self, rng, vocab, zipf=1.1):
+        self.rng = rng
+        words = set()
+        while len(words) < vocab:
+            words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+        self.words = sorted(words)
+        rng.shuffle(self.words)
+        self.weights = [1 / (rank + 1) ** zipf for rank in range(vocab)]
+
+    def listing(self):
+        title = ' '.join(self.rng.choices(self.words[:300], self.weights[:300], k=self.rng.randint(2, 4)))
+        description = ' '.join(self.rng.choices(self.words, self.weights, k=self.rng.randint(15, 60)))
+        return f'{title} {self.rng.randrange(1000)}', description
+
+    def edit(self, title, description, rate):
+        """Replace, drop or insert about ``rate`` of the description's words."""
+        out = []
+        for word in description.split():
+            roll = self.rng.random()
+            if roll < rate / 3:
+                out.append(self.rng.choice(self.words))
+            elif roll < rate * 2 / 3:
+                continue
+            elif roll < rate:
+                out.extend([word, self.rng.choice(self.words)])
+            else:
+                out.append(word)
+        return title, ' '.join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', default='10000,30000,100000', help='catalogue sizes to measure at')
+    parser.add_argument('--queries', type=int, default=200, help='submissions per step')
+    parser.add_argument('--vocab', type=int, default=8000)
+    parser.add_argument('--edit', type=float, default=0.1, help='share of words changed in a planted copy')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args(argv)
+    steps = sorted(int(s) for s in args.steps.split(','))
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='kp-bench-'), 'bench.db')}"
+    app = make_bench_app(url)
+    from sqlalchemy import insert
+    from app.extensions import db
+    from app.models import ListingBand, Product
+    from app.utils import duplicates
+    from app.utils.seed import seed_dataset
+
+    rng = random.Random(7)
+    corpus = Corpus(rng, args.vocab)
+    sets = {}  # id -> shingles, for the brute-force baseline
+    texts = {}
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=500, products=0, pawah=0, orders=0, messages=0, audit_logs=0, echo=lambda m: None)
+        threshold = app.config['DUPLICATE_THRESHOLD']
+        print(f'threshold {threshold}, {duplicates.BANDS} bands x {duplicates.ROWS} rows, '
+              f'vocabulary {args.vocab} words, planted copies edit {args.edit:.0%} of words\n')
+        print(f"{'listings':>9}{'index s':>9}{'band rows':>11}{'check p50':>11}{'check p99':>11}"
+              f"{'cands avg':>11}{'cands max':>11}{'scan p50':>10}{'recall':>8}{'same':>7}")
+
+        build = 0.0
+        for step in steps:
+            while len(sets) < step:
+                n = min(args.batch_size, step - len(sets))
+                rows = []
+                for _ in range(n):
+                    title, description = corpus.listing()
+                    rows.append({'title': title, 'description': description, 'price': 10, 'seller_id': 1 + rng.randrange(100),
+                                 'is_active': True, 'is_approved': True})
+                ids = db.session.execute(
+                    insert(Product).returning(Product.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                listings = [duplicates.Listing(i, duplicates._text(r['title'], r['description'])) for i, r in zip(ids, rows)]
+                started = time.perf_counter()
+                duplicates.index('product', listings)
+                db.session.commit()
+                build += time.perf_counter() - started
+                for item, row in zip(listings, rows):
+                    sets[item.id] = duplicates.shingles(item.text)
+                    texts[item.id] = (row['title'], row['description'])
+            band_rows = db.session.query(ListingBand).count()
+
+            check_times, scan_times, cand_counts = [], [], []
+            expected = found = same = 0
+            all_ids = list(sets)
+            for q in range(args.queries):
+                if q % 2 == 0:
+                    title, description = corpus.edit(*texts[rng.choice(all_ids)], args.edit)
+                else:
+                    title, description = corpus.listing()
+                product = Product(title=title, description=description, price=10, seller_id=1)
+                db.session.add(product)
+                db.session.flush()
+                started = time.perf_counter()
+                match = duplicates.check('product', [product])[0]
+                check_times.append(time.perf_counter() - started)
+                cand_counts.append(len(duplicates.candidates('product', [product.id])[product.id]))
+
+                mine = duplicates.shingles(duplicates._text(title, description))
+                started = time.perf_counter()
+                best, best_score = None, 0.0
+                for other, hashes in sets.items():
+                    score = duplicates.jaccard(mine, hashes)
+                    if score > best_score:
+                        best, best_score = other, score
+                scan_times.append(time.perf_counter() - started)
+                if best_score >= threshold:
+                    expected += 1
+                    if match.duplicate_of is not None:
+                        found += 1
+                        same += match.duplicate_of == best
+                db.session.rollback()
+
+            check_times.sort()
+            scan_times.sort()
+            recall = found / expected if expected else 1.0
+            print(f'{step:>9}{build:>9.1f}{band_rows:>11}'
+                  f'{percentile(check_times, 50) * 1000:>9.2f}ms{percentile(check_times, 99) * 1000:>9.2f}ms'
+                  f'{sum(cand_counts) / len(cand_counts):>11.1f}{max(cand_counts):>11}'
+                  f'{percentile(scan_times, 50) * 1000:>8.0f}ms{recall:>8.1%}{same:>4}/{found}')
+        print(f'\n{expected} of the last {args.queries} submissions had a true match >= {threshold}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Fragment cache effect on listing pages.
+
+Renders marketplace_list.html / pawah_list.html / admin_products.html with
+12 and 50 items, once with an empty cache and then repeatedly warm, and
+prints render time, hit rate and estimated savings.
+
+    python -m bench.fragment_cache --renders 200
+"""
+import argparse
+import time
+
+from bench.common import make_bench_app, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=200)
+    parser.add_argument('--backend', choices=['memory', 'filesystem'], default='memory')
+    args = parser.parse_args(argv)
+
+    import os
+    os.environ['FRAGMENT_CACHE'] = args.backend
+    app = make_bench_app()
+    from flask import render_template
+    from sqlalchemy.orm import selectinload
+    from app.extensions import db
+    from app.models import Product, PawahProject
+    from app.utils.fragment_cache import fragment_cache
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=100, products=500, pawah=200, orders=0, messages=0, audit_logs=0, echo=lambda m: None)
+
+    pages = []
+    for n in (12, 50):
+        pages.append((f'marketplace_list x{n}', 'marketplace_list.html', 'products', Product, n))
+        pages.append((f'pawah_list x{n}', 'pawah_list.html', 'projects', PawahProject, n))
+        pages.append((f'admin_products x{n}', 'admin_products.html', 'products', Product, n))
+
+    print(f"{'page':<22}{'uncached ms':>12}{'cold ms':>9}{'warm p50':>10}{'warm p95':>10}{'hit rate':>10}{'saved/page':>12}")
+    for label, template, var, model, n in pages:
+        with app.test_request_context('/'):
+            query = model.query
+            if model is Product:
+                query = query.options(selectinload(Product.seller))
+            items = query.order_by(model.id).limit(n).all()
+
+            def render():
+                return render_template(template, **{var: items})
+
+            backend, fragment_cache.backend = fragment_cache.backend, None
+            uncached = summarize([_timed(render) for _ in range(20)])['p50_ms']
+            fragment_cache.backend = backend
+            backend.clear()
+            fragment_cache.stats.clear()
+
+            cold = _timed(render) * 1000
+            warm = summarize([_timed(render) for _ in range(args.renders)])
+            stats = next(iter(fragment_cache.report().values()))
+            saved_per_page = stats['saved_ms'] / args.renders
+        print(f"{label:<22}{uncached:>12.2f}{cold:>9.2f}{warm['p50_ms']:>10.2f}{warm['p95_ms']:>10.2f}"
+              f"{stats['hit_rate'] * 100:>9.1f}%{saved_per_page:>10.2f}ms")
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Radius search: geo_cell index vs full scan.
+
+Seeds --products listings, then runs "within R km of <town>" for several
+towns and radii three ways: the indexed geo_cell lookup used by the routes,
+the same distance predicate without the cell filter (scan), and loading
+every row into Python and computing haversine (what "near me" would cost
+without coordinates in SQL).
+
+    python -m bench.geo --products 100000
+"""
+import argparse
+import math
+import time
+
+from bench.common import make_bench_app, summarize
+
+TOWNS = ['Raub', 'Kota Bharu', 'Kuching', 'Ipoh', 'Muar']
+RADII = [10, 30, 100]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = make_bench_app()
+    from app.extensions import db
+    from app.models import Product
+    from app.utils.geo import KM_PER_DEGREE, Near, haversine_km, paginate_nearest, resolve, within_radius
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=2000, products=args.products, pawah=0, orders=0, messages=0, audit_logs=0,
+                     echo=lambda m: None)
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_products_geo_cell ON products (geo_cell, is_active, is_approved, latitude, longitude)'))
+        db.session.commit()
+
+        base = Product.query.filter(Product.is_active.is_(True), Product.is_approved.is_(True))
+        plan = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + str(
+            within_radius(base, Product, 3.79, 101.86, 30).limit(12).statement.compile(
+                db.engine, compile_kwargs={'literal_binds': True})))).fetchall()
+        print('plan:', '; '.join(row[-1] for row in plan))
+
+        print(f"\n{'query':<22}{'hits':>8}{'indexed p50':>13}{'scan p50':>10}{'python p50':>12}{'vs python':>11}")
+        for town in TOWNS:
+            place = resolve(town)
+            for radius in RADII:
+                indexed, scan, python = [], [], []
+                hits = 0
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    pagination = paginate_nearest(base, Product, Near(town, town, place.lat, place.lon, radius), 1, 12)
+                    hits = pagination.total
+                    indexed.append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    scale = math.cos(math.radians(place.lat))
+                    dist2 = (Product.latitude - place.lat) * (Product.latitude - place.lat) + \
+                        (Product.longitude - place.lon) * scale * (Product.longitude - place.lon) * scale
+                    lim = (radius / KM_PER_DEGREE) ** 2
+                    sq = base.filter(dist2 <= lim)
+                    sq.order_by(dist2).limit(12).all()
+                    sq.count()
+                    scan.append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    rows = db.session.query(Product.id, Product.latitude, Product.longitude) \
+                        .filter(Product.is_active.is_(True), Product.is_approved.is_(True)).all()
+                    near = sorted(
+                        (d, pid) for pid, lat, lon in rows if lat is not None
+                        for d in (haversine_km(place.lat, place.lon, lat, lon),) if d <= radius
+                    )
+                    python.append(time.perf_counter() - started)
+                    db.session.expunge_all()
+                ip, sp, pp = (summarize(x)['p50_ms'] for x in (indexed, scan, python))
+                print(f'{town + f" {radius}km":<22}{hits:>8}{ip:>13.1f}{sp:>10.1f}{pp:>12.1f}{pp / ip if ip else 0:>10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Image variant throughput and bytes per listing page.
+
+Generates synthetic camera-sized JPEGs (no database), makes the configured
+variants of each one serially and through a process pool, then reports how
+many bytes a listing page of cards costs with the originals versus the
+variant a browser picks from the srcset.
+
+    python -m bench.images --images 24 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bench.common  # noqa: F401  (puts the repo root on sys.path)
+from app.utils.images import make_variants
+
+CARDS_PER_PAGE = 12
+
+
+def synthetic_photo(path, width, height, seed):
+    # Smooth gradients plus sensor-like noise compress about like a real field photo
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = []
+    for _ in range(3):
+        fx, fy, phase = rng.uniform(0.5, 4, 2).tolist() + [rng.uniform(0, 6.28)]
+        base = 127 + 90 * np.sin(x / width * fx * 6.28 + phase) * np.cos(y / height * fy * 6.28)
+        channels.append(base + rng.normal(0, 6, (height, width)))
+    pixels = np.clip(np.stack(channels, axis=-1), 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path, 'JPEG', quality=90)
+
+
+def run_serial(jobs, widths, max_pixels):
+    started = time.perf_counter()
+    results = [make_variants(src, out, widths, max_pixels) for src, out in jobs]
+    return results, time.perf_counter() - started
+
+
+def run_pool(jobs, widths, max_pixels, workers):
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # Warm the workers so process start-up is not counted
+        list(pool.map(abs, range(workers)))
+        started = time.perf_counter()
+        futures = [pool.submit(make_variants, src, out, widths, max_pixels) for src, out in jobs]
+        results = [f.result() for f in futures]
+    return results, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=24)
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--widths', default='320,640,1024')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--card-width', type=int, default=640,
+                        help='width the browser asks for per card (360 CSS px at 2x is about 640)')
+    args = parser.parse_args(argv)
+    widths = [int(w) for w in args.widths.split(',')]
+    max_pixels = args.width * args.height * 2
+
+    root = tempfile.mkdtemp(prefix='kp-bench-images-')
+    try:
+        sources = []
+        for i in range(args.images):
+            src = os.path.join(root, f'{i}.jpg')
+            synthetic_photo(src, args.width, args.height, seed=i)
+            sources.append(src)
+        print(f'{args.images} photos of {args.width}x{args.height}, variants at {widths} (webp + jpg)')
+
+        timings = {}
+        for mode in ('serial', 'pool'):
+            jobs = []
+            for i, src in enumerate(sources):
+                out = os.path.join(root, mode, str(i))
+                os.makedirs(out)
+                jobs.append((src, out))
+            if mode == 'serial':
+                results, elapsed = run_serial(jobs, widths, max_pixels)
+            else:
+                results, elapsed = run_pool(jobs, widths, max_pixels, args.workers)
+            timings[mode] = elapsed
+            per_image = sorted(r.elapsed for r in results)
+            label = mode if mode == 'serial' else f'pool x{args.workers}'
+            print(f'{label:<10} {args.images / elapsed:7.2f} images/s  '
+                  f'(median {per_image[len(per_image) // 2] * 1000:.0f} ms per image in the worker)')
+        print(f'speed-up   {timings["serial"] / timings["pool"]:7.2f}x')
+
+        pick = next((w for w in sorted(widths) if w >= args.card_width), max(widths))
+        cards = sources[:CARDS_PER_PAGE]
+        original = sum(os.path.getsize(src) for src in cards)
+        print(f'\nlisting page of {len(cards)} cards at {args.card_width}px:')
+        print(f"{'original jpg':<18}{original:>12,} bytes")
+        for ext in ('jpg', 'webp'):
+            size = sum(os.path.getsize(os.path.join(root, 'serial', str(i), f'{pick}.{ext}'))
+                       for i in range(len(cards)))
+            print(f"{f'{pick}w {ext}':<18}{size:>12,} bytes  (-{(original - size) * 100 / original:.1f}%)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
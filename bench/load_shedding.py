@@ -0,0 +1,186 @@
+"""Overload test for load shedding: p99 with the shedder off and on.
+
+Starts gunicorn (sync workers) on a seeded SQLite DB, measures its capacity
+on the marketplace listing, then offers ``--overload`` times that rate as an
+open-loop Poisson stream for ``--seconds``: anonymous browsing (low
+priority), signed-in browsing (normal) and order placement (protected).
+Each request carries ``X-Request-Start`` as a proxy would set it, and
+latency is measured from the scheduled send time, so requests stuck behind
+a backed-up server count in full. The run is repeated with
+LOAD_SHED_ENABLED=false and =true.
+
+    python -m bench.load_shedding --workers 2 --overload 2 --seconds 20
+"""
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import ROOT, make_bench_app, percentile
+
+MIX = (('low', 0.7), ('normal', 0.2), ('critical', 0.1))
+
+
+def server_app():
+    # gunicorn entry point: bench.load_shedding:server_app()
+    return make_bench_app(os.environ['DATABASE_URL'])
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_url, workers, shed, port):
+    env = dict(os.environ, DATABASE_URL=db_url, LOAD_SHED_ENABLED='true' if shed else 'false',
+               LOAD_SHED_QUEUE_HEADER='X-Request-Start',
+               METRICS_ENABLED='false', JOBS_ENABLED='false', VIEW_COUNTS_ENABLED='false', FRAGMENT_CACHE='none')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--timeout', '60', '--log-level', 'warning', 'bench.load_shedding:server_app()'],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/marketplace')
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def send(port, request, timeout=60):
+    method, path, headers, body = request
+    headers = dict(headers, **{'X-Request-Start': f't={time.time():.6f}'})
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def capacity(port, make_request, seconds=3.0, concurrency=8):
+    done = []
+    stop = time.perf_counter() + seconds
+
+    def loop():
+        while time.perf_counter() < stop:
+            send(port, make_request('low'))
+            done.append(1)
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(done) / seconds
+
+
+def overload(port, make_request, rate, seconds, concurrency, seed=1):
+    rng = random.Random(seed)
+    results = defaultdict(list)  # class -> [(status, latency)]
+    lock = threading.Lock()
+
+    def task(kind, scheduled):
+        status = send(port, make_request(kind))
+        with lock:
+            results[kind].append((status, time.perf_counter() - scheduled))
+
+    kinds, weights = zip(*MIX)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        at = start
+        while at - start < seconds:
+            at += rng.expovariate(rate)
+            delay = at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(task, rng.choices(kinds, weights)[0], at)
+    return results
+
+
+def report(label, results):
+    print(f'\n{label}')
+    print(f"{'class':<10}{'sent':>7}{'ok':>7}{'503':>7}{'error':>7}{'ok p50 ms':>11}{'ok p99 ms':>11}{'all p99 ms':>12}")
+    for kind, _ in MIX:
+        rows = results.get(kind, [])
+        ok = sorted(lat for status, lat in rows if status and status < 500)
+        shed = sum(1 for status, _ in rows if status == 503)
+        errors = sum(1 for status, _ in rows if not status or (status >= 500 and status != 503))
+        everything = sorted(lat for _, lat in rows)
+        print(f'{kind:<10}{len(rows):>7}{len(ok):>7}{shed:>7}{errors:>7}'
+              f'{percentile(ok, 50) * 1000:>11.0f}{percentile(ok, 99) * 1000:>11.0f}'
+              f'{percentile(everything, 99) * 1000:>12.0f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--overload', type=float, default=2.0, help='offered load as a multiple of measured capacity')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, default=256, help='most requests in flight from the client')
+    args = parser.parse_args(argv)
+
+    db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='kp-bench-'), 'bench.db')}"
+    app = make_bench_app(db_url)
+    from app.extensions import db
+    from app.models import Product
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=200, products=args.products, pawah=0, orders=0, messages=0, audit_logs=0,
+                     echo=lambda m: None)
+        product = Product.query.filter(Product.is_active.is_(True), Product.is_approved.is_(True)).first()
+        db.session.query(Product).filter(Product.id == product.id).update({Product.quantity: None})
+        db.session.commit()
+        buyer_id = 1 if product.seller_id != 1 else 2
+        product_id = product.id
+    with app.test_request_context():
+        signer = app.session_interface.get_signing_serializer(app)
+        cookie = f"{app.config['SESSION_COOKIE_NAME']}={signer.dumps({'user_id': buyer_id})}"
+
+    def make_request(kind):
+        page = random.randint(1, 20)
+        if kind == 'low':
+            return 'GET', f'/marketplace?page={page}', {}, None
+        if kind == 'normal':
+            return 'GET', f'/marketplace?page={page}', {'Cookie': cookie}, None
+        return ('POST', f'/marketplace/{product_id}',
+                {'Cookie': cookie, 'Content-Type': 'application/x-www-form-urlencoded'}, 'quantity=1')
+
+    for shed in (False, True):
+        port = _free_port()
+        proc = start_server(db_url, args.workers, shed, port)
+        try:
+            rps = capacity(port, make_request)
+            rate = rps * args.overload
+            results = overload(port, make_request, rate, args.seconds, args.concurrency)
+        finally:
+            proc.terminate()
+            proc.wait()
+        report(f"shedding {'on' if shed else 'off'}: capacity {rps:.0f} req/s, offered {rate:.0f} req/s "
+               f'for {args.seconds:.0f}s', results)
+
+
+if __name__ == '__main__':
+    main()
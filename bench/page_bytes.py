@@ -0,0 +1,49 @@
+"""Bytes on the wire per page, full vs lite mode.
+
+Renders the listing pages through the test client with each
+Accept-Encoding and reports the transferred HTML size plus the number of
+external resources (scripts, stylesheets, images) the page pulls in.
+
+    python -m bench.page_bytes
+"""
+import argparse
+import re
+
+from bench.common import make_bench_app
+
+PATHS = ['/marketplace', '/pawah']
+ENCODINGS = ['identity', 'gzip', 'br']
+RESOURCE_RE = re.compile(r'<(?:script[^>]+src|link[^>]+href|img[^>]+src)=', re.I)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    app = make_bench_app()
+    from app.extensions import db
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=100, products=args.products, pawah=args.products // 2, orders=0, messages=0,
+                     audit_logs=0, echo=lambda m: None)
+
+    client = app.test_client()
+    print(f"{'page':<22}{'mode':<6}" + ''.join(f'{e:>11}' for e in ENCODINGS) + f"{'resources':>11}")
+    for path in PATHS:
+        for mode, lite in (('full', '0'), ('lite', '1')):
+            sizes = []
+            resources = 0
+            for encoding in ENCODINGS:
+                client.delete_cookie('lite')
+                resp = client.get(f'{path}?lite={lite}', headers={'Accept-Encoding': encoding})
+                sizes.append(len(resp.get_data()))
+                if encoding == 'identity':
+                    resources = len(RESOURCE_RE.findall(resp.get_data(as_text=True)))
+            print(f'{path:<22}{mode:<6}' + ''.join(f'{s:>11,}' for s in sizes) + f'{resources:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Request overhead of the sampling profiler.
+
+Times the marketplace and pawah listings through the test client with the
+profiler hooks not installed, installed but idle (no link, sample rate 0),
+and profiling every request (sample rate 1, profile stored).
+
+    python -m bench.profiler --requests 300
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench.common import make_bench_app, summarize
+
+PATHS = ['/marketplace', '/pawah']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300, help='requests per path and mode')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3, help='modes are interleaved in this many rounds')
+    args = parser.parse_args(argv)
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='kp-bench-'), 'bench.db')}"
+    os.environ['PROFILING_ENABLED'] = 'false'
+    app_off = make_bench_app(url, FRAGMENT_CACHE='none', VIEW_COUNTS_ENABLED=False)
+    os.environ['PROFILING_ENABLED'] = 'true'
+    app_on = make_bench_app(url, FRAGMENT_CACHE='none', VIEW_COUNTS_ENABLED=False)
+
+    from app.extensions import db
+    from app.models import RequestProfile
+    from app.utils.seed import seed_dataset
+
+    with app_on.app_context():
+        db.create_all()
+        seed_dataset(users=200, products=args.products, pawah=args.products // 4, orders=0, messages=0,
+                     audit_logs=0, echo=lambda m: None)
+
+    modes = {
+        'off': (app_off, 0.0),
+        'idle': (app_on, 0.0),
+        'every request': (app_on, 1.0),
+    }
+    latencies = {name: [] for name in modes}
+    per_round = max(args.requests // args.rounds, 1)
+    for _ in range(args.rounds):
+        for name, (app, rate) in modes.items():
+            app.config['PROFILE_SAMPLE_RATE'] = rate
+            client = app.test_client()
+            for path in PATHS:
+                client.get(path)  # warm
+                for _ in range(per_round):
+                    started = time.perf_counter()
+                    client.get(path).get_data()
+                    latencies[name].append(time.perf_counter() - started)
+
+    base = summarize(latencies['off'])
+    print(f"{'mode':<16}{'p50 ms':>10}{'p95 ms':>10}{'vs off':>10}")
+    for name, values in latencies.items():
+        s = summarize(values)
+        print(f"{name:<16}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{(s['p50_ms'] / base['p50_ms'] - 1) * 100:>9.1f}%")
+    with app_on.app_context():
+        stored = RequestProfile.query.count()
+        samples = db.session.query(db.func.avg(RequestProfile.samples)).scalar() or 0
+    print(f'\n{stored} profiles stored, {samples:.1f} samples each on average')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Query plan regression check for the hot routes.
+
+Drives each scenario through the test client, captures the SELECTs it runs
+and EXPLAINs them (EXPLAIN QUERY PLAN on SQLite, EXPLAIN with seq scans and
+sorts disabled on PostgreSQL). Full table scans, temp B-tree sorts and
+equality filters no index covers fail the run unless listed in ALLOWED, and
+a composite index is suggested for each. SQLite is left without ANALYZE
+statistics, so the plans show whether an index *can* serve each query
+rather than what a tiny dataset happens to favour.
+
+    python -m bench.query_plans                       # fresh SQLite, migrated to head and seeded
+    python -m bench.query_plans --db postgresql://... # an existing, migrated, populated DB
+    python -m bench.query_plans --verbose             # print every plan
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from bench.common import make_bench_app, migrate
+from bench.routes import SCALES, pick_fixtures
+
+# (scenario, issue kind) -> why the plan is acceptable
+ALLOWED = {
+    ('marketplace_search', 'filter'): 'q= is a substring LIKE; needs full-text search, not a b-tree',
+    ('marketplace_category_location', 'filter'): 'the category index narrows to one category; location is checked within it',
+    ('marketplace_near', 'temp_sort'): 'distance order is computed over the few rows in nearby grid cells',
+    ('marketplace_near', 'filter'): 'page rows are fetched by primary key after the geo_cell index chose them',
+    ('pawah_crop_status', 'filter'): 'the crop index narrows to one crop; status is checked within it',
+    ('pawah_near', 'temp_sort'): 'distance order is computed over the few rows in nearby grid cells',
+    ('pawah_near', 'filter'): 'page rows are fetched by primary key after the geo_cell index chose them',
+    ('orders_home_seller', 'temp_sort'): "sales span the seller's products, so no single index range is in created_at order",
+    ('admin_logs_action', 'filter'): "action is checked while walking one entity type's rows newest first",
+    ('sync_orders_buyer', 'temp_sort'): "a user's orders as buyer and as seller come from two index ranges, merged and sorted",
+    ('sync_orders_seller', 'temp_sort'): "a user's orders as buyer and as seller come from two index ranges, merged and sorted",
+    ('sync_orders_buyer', 'filter'): 'buyer_id OR product_id: each side of the MULTI-INDEX OR uses its own index',
+    ('sync_orders_seller', 'filter'): 'buyer_id OR product_id: each side of the MULTI-INDEX OR uses its own index',
+}
+
+
+def build_scenarios(fx):
+    # (name, path, user_id)
+    return [
+        ('marketplace', '/marketplace', None),
+        ('marketplace_page5', '/marketplace?page=5', None),
+        ('marketplace_category', f"/marketplace?category={fx['category']}", None),
+        ('marketplace_location', '/marketplace?location=Raub', None),
+        ('marketplace_category_price', f"/marketplace?category={fx['category']}&min_price=5&max_price=50", None),
+        ('marketplace_category_location', f"/marketplace?category={fx['category']}&location=Kuantan", None),
+        ('marketplace_near', '/marketplace?near=Raub&radius=40', None),
+        ('marketplace_search', '/marketplace?q=organik', None),
+        ('pawah_list', '/pawah', None),
+        ('pawah_status', '/pawah?status=open', None),
+        ('pawah_crop', '/pawah?crop_type=Padi', None),
+        ('pawah_location', '/pawah?location=Kuantan', None),
+        ('pawah_crop_status', '/pawah?crop_type=Durian&status=open', None),
+        ('pawah_near', '/pawah?near=Ipoh', None),
+        ('pawah_search', '/pawah?q=tuai', None),
+        ('pawah_for_you', '/pawah/for-you', fx['seller_id']),
+        ('my_listings', '/marketplace/my', fx['seller_id']),
+        ('orders_home_seller', '/orders', fx['seller_id']),
+        ('orders_home_buyer', '/orders', fx['buyer_id']),
+        ('order_detail', f"/orders/{fx['order_id']}", fx['buyer_id']),
+        ('pawah_detail', f"/pawah/{fx['pawah_id']}", fx['admin_id']),
+        ('admin_home', '/admin', fx['admin_id']),
+        ('admin_products', '/admin/products', fx['admin_id']),
+        ('admin_pawah', '/admin/pawah', fx['admin_id']),
+        ('admin_logs', '/admin/logs', fx['admin_id']),
+        ('admin_logs_entity', '/admin/logs?entity_type=order', fx['admin_id']),
+        ('admin_logs_action', '/admin/logs?entity_type=product&action=approve', fx['admin_id']),
+        ('admin_logs_actor', f"/admin/logs?actor_id={fx['admin_id']}", fx['admin_id']),
+        ('api_products', f"/api/v1/products?include=seller&cursor={fx['api_cursor']}", None),
+        ('api_products_category', f"/api/v1/products?category={fx['category']}&fields=title,price", None),
+        ('api_pawah_status', '/api/v1/pawah?status=open&include=owner,farmer', None),
+        ('api_orders_buyer', f"/api/v1/orders?include=product&cursor={fx['api_cursor']}", fx['buyer_id']),
+        ('api_order_messages', f"/api/v1/orders/{fx['order_id']}/messages?include=sender", fx['buyer_id']),
+        ('sync_listings', '/api/sync/listings', None),
+        ('sync_listings_since', f"/api/sync/listings?since={fx['sync_cursor']}", None),
+        ('sync_orders_buyer', f"/api/sync/orders?since={fx['sync_cursor']}", fx['buyer_id']),
+        ('sync_orders_seller', '/api/sync/orders', fx['seller_id']),
+    ]
+
+
+def capture(app, scenarios):
+    """[(scenario, statement, params)], each statement attributed to the first scenario that ran it."""
+    from app.extensions import db
+    from app.utils.query_plans import capture_sql
+    seen, out = set(), []
+    for name, path, user_id in scenarios:
+        client = app.test_client()
+        if user_id:
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+                sess['is_admin'] = True
+        with app.app_context():
+            engine = db.engine
+        with capture_sql(engine) as statements:
+            resp = client.get(path)
+            resp.get_data()
+        if resp.status_code >= 400:
+            print(f'  {name}: HTTP {resp.status_code}', file=sys.stderr)
+        for sql, params in statements.items():
+            if sql not in seen:
+                seen.add(sql)
+                out.append((name, sql, params))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='DATABASE_URL to check (default: fresh temp SQLite, migrated and seeded)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='tiny')
+    parser.add_argument('--verbose', action='store_true', help='print every statement and plan')
+    args = parser.parse_args(argv)
+
+    url = args.db
+    if url is None:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='kp-plans-'), 'plans.db')}"
+        migrate(url)
+    app = make_bench_app(url, FRAGMENT_CACHE='none', STREAM_TEMPLATES=False)
+    from app.extensions import db
+    from app.models import PawahProject, Product
+    from app.utils.query_plans import advise, check, index_ddl
+    from app.utils.sync import encode_cursor
+
+    with app.app_context():
+        if not db.session.query(Product.id).first():
+            from app.utils.seed import seed_dataset
+            print(f'seeding {args.scale} dataset...', file=sys.stderr)
+            seed_dataset(**SCALES[args.scale], echo=lambda m: None)
+        fixtures = pick_fixtures(app)
+        fixtures['pawah_id'] = db.session.query(db.func.min(PawahProject.id)).scalar()
+        since = ['2000-01-01T00:00:00', 0]
+        fixtures['api_cursor'] = encode_cursor({'after': ['2100-01-01T00:00:00', 0]})
+        fixtures['sync_cursor'] = encode_cursor(dict.fromkeys(('products', 'pawah', 'orders', 'messages'), since))
+
+    captured = capture(app, build_scenarios(fixtures))
+    failures = []
+    with app.app_context(), db.engine.connect() as conn:
+        reports = check(conn, [(sql, params) for _, sql, params in captured])
+        for (name, sql, _), report in zip(captured, reports):
+            bad = [i for i in report.issues if (name, i.kind) not in ALLOWED]
+            if args.verbose or bad:
+                print(f"\n[{name}] {'FAIL' if bad else 'ok'}\n  {' '.join(sql.split())}")
+                for line in report.plan:
+                    print(f'    {line}')
+            if bad:
+                failures.append(report._replace(issues=bad))
+        advice = advise(conn, failures)
+
+    print(f'\n{len(reports)} statements from {len({c[0] for c in captured})} scenarios, {len(failures)} with unexpected scans or sorts')
+    for (table, columns), statements in advice.items():
+        print(f'  suggest: {index_ddl(table, columns)};  -- {len(statements)} statement(s)')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
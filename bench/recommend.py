@@ -0,0 +1,105 @@
+"""Offline evaluation and latency of the pawah recommendations.
+
+Leave-one-out: for each farmer with at least --min-history accepted
+projects, the newest one is held out, the profile is built from the rest,
+and the held-out project is put back into the index as if it were still
+open. We then check where it ranks among all open projects, compared with
+sorting by newest first and random order.
+
+    python -m bench.recommend --pawah 20000 --farmers 300
+"""
+import argparse
+import random
+import time
+
+from bench.common import make_bench_app, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--pawah', type=int, default=20000)
+    parser.add_argument('--farmers', type=int, default=300, help='farmers to evaluate')
+    parser.add_argument('--min-history', type=int, default=3)
+    parser.add_argument('-k', type=int, default=24)
+    args = parser.parse_args(argv)
+
+    app = make_bench_app()
+    from app.extensions import db
+    from app.models import PawahProject
+    from app.utils import recommend as rec
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=args.users, products=0, pawah=args.pawah, orders=0, messages=0, audit_logs=0,
+                     echo=lambda m: None)
+
+        # Indexes from the migration (create_all only builds tables)
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_pawah_projects_updated_at ON pawah_projects (updated_at)'))
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_pawah_projects_farmer_id ON pawah_projects (farmer_id)'))
+        db.session.commit()
+
+        index = rec.RecommendationIndex()
+        started = time.perf_counter()
+        index.rebuild()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        history = {}
+        for row in db.session.query(*rec.RecommendationIndex.COLUMNS, PawahProject.farmer_id) \
+                .filter(PawahProject.farmer_id.isnot(None)).order_by(PawahProject.created_at):
+            history.setdefault(row.farmer_id, []).append(row)
+        farmers = [f for f, rows in history.items() if len(rows) >= args.min_history]
+        random.Random(1).shuffle(farmers)
+        farmers = farmers[: args.farmers]
+
+        rng = random.Random(2)
+        ranks = {'recommend': [], 'newest': [], 'random': []}
+        for farmer in farmers:
+            *past, held = history[farmer]
+            profile = rec.build_profile([(r.crop_type, r.location, r.capital_required, r.status, r.latitude, r.longitude)
+                                         for r in past])
+            feat = rec._features(held)
+            index._add(feat)
+            try:
+                top = rec.recommend(farmer, limit=args.k, index=index, profile=profile)
+                ids = [r.project_id for r in top]
+                ranks['recommend'].append(ids.index(held.id) + 1 if held.id in ids else None)
+                pool = [f for f in index.projects.values() if f.owner_id != farmer]
+                newer = sum(1 for f in pool if f.created_ts > feat.created_ts)
+                ranks['newest'].append(newer + 1 if newer < args.k else None)
+                ranks['random'].append(rng.randrange(len(pool)) + 1 if pool else None)
+            finally:
+                index._remove(feat.id)
+
+        latencies = []
+        for farmer in farmers:
+            started = time.perf_counter()
+            rec.recommend(farmer, limit=args.k, index=index)
+            latencies.append(time.perf_counter() - started)
+
+        changed = [pid for (pid,) in db.session.query(PawahProject.id).filter(PawahProject.status == 'open').limit(200)]
+        db.session.query(PawahProject).filter(PawahProject.id.in_(changed[:100])).update(
+            {PawahProject.status: 'accepted', PawahProject.updated_at: db.func.current_timestamp()},
+            synchronize_session=False)
+        db.session.commit()
+        started = time.perf_counter()
+        index.refresh(force=True)
+        refresh_ms = (time.perf_counter() - started) * 1000
+
+    print(f'index: {len(index.projects)} open projects, build {build_ms:.1f} ms, '
+          f'incremental refresh after 100 changes {refresh_ms:.1f} ms')
+    print(f'evaluated farmers: {len(farmers)} (>= {args.min_history} past projects)\n')
+    print(f"{'ranking':<12}{'hit@10':>9}{f'hit@{args.k}':>9}{'MRR':>8}")
+    for name, values in ranks.items():
+        n = len(values) or 1
+        hit10 = sum(1 for r in values if r and r <= 10) / n
+        hitk = sum(1 for r in values if r and r <= args.k) / n
+        mrr = sum(1 / r for r in values if r and r <= args.k) / n
+        print(f'{name:<12}{hit10:>9.3f}{hitk:>9.3f}{mrr:>8.3f}')
+    s = summarize(latencies)
+    print(f"\nrecommend() incl. profile query: p50 {s['p50_ms']:.2f} ms  p95 {s['p95_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""End-to-end route benchmark.
+
+Drives the hot read routes and the main write paths through the Flask test
+client (default) or a running gunicorn (``--url``), reporting p50/p95/p99,
+throughput and SQL queries per request.
+
+    python -m bench.routes --scale small --save bench/baselines/routes.json
+    python -m bench.routes --db sqlite:////tmp/kp.db --compare bench/baselines/routes.json
+"""
+import argparse
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import compare, load_baseline, make_bench_app, save_baseline, summarize
+
+SCALES = {
+    'tiny': dict(users=200, products=2000, pawah=400, orders=1000, messages=10_000, audit_logs=5000),
+    'small': dict(users=1000, products=10_000, pawah=2000, orders=5000, messages=100_000, audit_logs=50_000),
+    'full': dict(users=5000, products=100_000, pawah=20_000, orders=50_000, messages=1_000_000, audit_logs=500_000),
+}
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *_args):
+        with self._lock:
+            self.count += 1
+
+
+def pick_fixtures(app):
+    from sqlalchemy import func
+    from app.extensions import db
+    from app.models import User, Product, Order
+
+    with app.app_context():
+        seller_id = (db.session.query(Product.seller_id).group_by(Product.seller_id)
+                     .order_by(func.count().desc()).limit(1).scalar())
+        buyer_id = (db.session.query(Order.buyer_id).group_by(Order.buyer_id)
+                    .order_by(func.count().desc()).limit(1).scalar())
+        order_id = db.session.query(Order.id).filter(Order.buyer_id == buyer_id).limit(1).scalar()
+        admin_id = db.session.query(User.id).filter(User.is_admin.is_(True)).limit(1).scalar()
+        product_id = (db.session.query(Product.id)
+                      .filter(Product.is_active.is_(True), Product.is_approved.is_(True),
+                              Product.quantity.is_(None), Product.seller_id != buyer_id)
+                      .limit(1).scalar())
+        category = db.session.query(Product.category).limit(1).scalar()
+    return dict(seller_id=seller_id, buyer_id=buyer_id, order_id=order_id, admin_id=admin_id,
+                product_id=product_id, category=category)
+
+
+def build_scenarios(fx):
+    # (name, method, path, user_id, form data)
+    return [
+        ('marketplace', 'GET', '/marketplace', None, None),
+        ('marketplace_page5', 'GET', '/marketplace?page=5', None, None),
+        ('marketplace_category', 'GET', f"/marketplace?category={fx['category']}", None, None),
+        ('marketplace_search', 'GET', '/marketplace?q=organik', None, None),
+        ('pawah_list', 'GET', '/pawah', None, None),
+        ('pawah_list_open', 'GET', '/pawah?status=open', None, None),
+        ('orders_home_seller', 'GET', '/orders', fx['seller_id'], None),
+        ('orders_home_buyer', 'GET', '/orders', fx['buyer_id'], None),
+        ('order_detail', 'GET', f"/orders/{fx['order_id']}", fx['buyer_id'], None),
+        ('admin_home', 'GET', '/admin', fx['admin_id'], None),
+        ('admin_logs', 'GET', '/admin/logs', fx['admin_id'], None),
+        ('admin_logs_filtered', 'GET', '/admin/logs?entity_type=product&action=approve', fx['admin_id'], None),
+        ('write_order_create', 'POST', f"/marketplace/{fx['product_id']}", fx['buyer_id'], {'quantity': '1'}),
+        ('write_order_message', 'POST', f"/orders/{fx['order_id']}/message", fx['buyer_id'], {'content': 'Bila boleh hantar?'}),
+        ('write_new_product', 'POST', '/marketplace/new', fx['seller_id'],
+         {'title': 'Cili Api Segar', 'price': '12.50', 'quantity': '40', 'category': 'Sayur', 'location': 'Kuantan'}),
+    ]
+
+
+def run_test_client(app, scenarios, iterations, warmup):
+    from app.extensions import db
+    results = {}
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    for name, method, path, user_id, data in scenarios:
+        client = app.test_client()
+        if user_id:
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+                sess['is_admin'] = True
+        for _ in range(warmup):
+            client.open(path, method=method, data=data).close()
+        latencies = []
+        queries_before = counter.count
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            resp = client.open(path, method=method, data=data)
+            # Streamed pages render while the body is read; closing ends their request context
+            resp.get_data()
+            resp.close()
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                print(f'  {name}: HTTP {resp.status_code}', file=sys.stderr)
+                break
+        elapsed = time.perf_counter() - started
+        stats = summarize(latencies, elapsed)
+        stats['queries_per_request'] = (counter.count - queries_before) / max(len(latencies), 1)
+        results[name] = stats
+    return results
+
+
+def run_http(app, base_url, scenarios, iterations, warmup, concurrency):
+    # Sessions are forged with the app's own signer, so SECRET_KEY must match the server
+    signer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config.get('SESSION_COOKIE_NAME', 'session')
+    results = {}
+    for name, method, path, user_id, _data in scenarios:
+        if method != 'GET':
+            continue  # CSRF is enabled on a real server
+        headers = {}
+        if user_id:
+            headers['Cookie'] = f"{cookie_name}={signer.dumps({'user_id': user_id, 'is_admin': True})}"
+
+        def hit(_i):
+            req = urllib.request.Request(base_url.rstrip('/') + path, headers=headers)
+            t0 = time.perf_counter()
+            with urllib.request.urlopen(req) as resp:
+                resp.read()
+            return time.perf_counter() - t0
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(hit, range(warmup)))
+            started = time.perf_counter()
+            latencies = list(pool.map(hit, range(iterations)))
+            elapsed = time.perf_counter() - started
+        stats = summarize(latencies, elapsed)
+        stats['queries_per_request'] = None
+        results[name] = stats
+    return results
+
+
+def print_table(results):
+    print(f"{'scenario':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}")
+    for name, s in results.items():
+        q = s['queries_per_request']
+        print(f"{name:<24}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}"
+              f"{s['throughput_rps']:>9.1f}{(f'{q:.1f}' if q is not None else '-'):>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='DATABASE_URL to benchmark against (default: fresh temp SQLite)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='tiny',
+                        help='dataset size to seed when the DB has no products')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--url', help='benchmark a running server instead of the test client (GET routes only)')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads in --url mode')
+    parser.add_argument('--save', metavar='PATH', help='write results as a baseline JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='compare p95 against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed p95 regression ratio')
+    args = parser.parse_args(argv)
+
+    app = make_bench_app(args.db)
+    from app.extensions import db
+    from app.models import Product
+    with app.app_context():
+        db.create_all()
+        if not db.session.query(Product.id).first():
+            from app.utils.seed import seed_dataset
+            print(f'seeding {args.scale} dataset...', file=sys.stderr)
+            seed_dataset(**SCALES[args.scale], echo=lambda m: print(f'  {m}', file=sys.stderr))
+
+    scenarios = build_scenarios(pick_fixtures(app))
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [s for s in scenarios if s[0] in wanted]
+
+    if args.url:
+        results = run_http(app, args.url, scenarios, args.iterations, args.warmup, args.concurrency)
+    else:
+        results = run_test_client(app, scenarios, args.iterations, args.warmup)
+    print_table(results)
+
+    exit_code = 0
+    if args.compare:
+        print(f"\n{'scenario':<24}{'base p95':>10}{'now p95':>10}{'change':>9}")
+        for name, old, new, ratio, regressed in compare(results, load_baseline(args.compare), threshold=args.threshold):
+            print(f"{name:<24}{old:>10.2f}{new:>10.2f}{(ratio - 1) * 100:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+            exit_code = exit_code or int(regressed)
+    if args.save:
+        save_baseline(args.save, results)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
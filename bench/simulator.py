@@ -0,0 +1,37 @@
+"""Cold and memoized timings of the pawah profit-share simulator.
+
+    python -m bench.simulator --scenarios 100000
+"""
+import argparse
+import time
+
+from bench.common import summarize
+
+CASES = [('Padi', 5000, 4), ('Durian', 50000, 60), ('Cili', 8000, 12), ('Tanaman Baru', 20000, 24)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=int, default=100_000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    from app.utils.simulator import simulate
+
+    for crop, capital, months in CASES:
+        cold, warm = [], []
+        for run in range(args.runs):
+            simulate.cache_clear()
+            t0 = time.perf_counter()
+            result = simulate(crop, float(capital), months, 50 + run % 2, args.scenarios)
+            cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            simulate(crop, float(capital), months, 50 + run % 2, args.scenarios)
+            warm.append(time.perf_counter() - t0)
+        c, w = summarize(cold), summarize(warm)
+        print(f"{crop:<14} {months:>3} mo  cold p50 {c['p50_ms']:7.2f} ms  p95 {c['p95_ms']:7.2f} ms  "
+              f"cached p50 {w['p50_ms'] * 1000:6.1f} us  owner P50 RM {result.owner['p50']:,.0f}")
+
+
+if __name__ == '__main__':
+    main()
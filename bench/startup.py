@@ -0,0 +1,94 @@
+"""Cold vs warm worker boot.
+
+Each sample runs in a fresh interpreter (like a new gunicorn worker) and
+measures app import/creation, the optional warm-up phase, and the latency of
+the first request to each main page.
+
+    python -m bench.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bench.common import ROOT
+
+CHILD = r'''
+import json, os, sys, time
+t0 = time.perf_counter()
+from app import create_app
+app = create_app()
+app.config.update(WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False)
+t1 = time.perf_counter()
+warm = {}
+if os.environ.get('BENCH_WARMUP') == '1':
+    from app.utils.warmup import warm_up
+    warm = warm_up(app)
+t2 = time.perf_counter()
+client = app.test_client()
+first = {}
+for path in sys.argv[1:]:
+    s = time.perf_counter()
+    client.get(path)
+    first[path] = time.perf_counter() - s
+print(json.dumps({'boot': t1 - t0, 'warmup': t2 - t1, 'first': first}))
+'''
+
+PATHS = ['/', '/marketplace', '/pawah', '/marketplace/1', '/pawah/1', '/marketplace/new']
+
+MODES = {
+    # name: (bytecode cache enabled, reuse a populated cache dir, run warm-up)
+    'cold (no bytecode cache)': (False, False, False),
+    'cold (empty bytecode cache)': (True, False, False),
+    'bytecode cache': (True, True, False),
+    'bytecode cache + warm-up': (True, True, True),
+}
+
+
+def prepare_db(path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', METRICS_ENABLED='false')
+    code = ('from app import create_app; from app.extensions import db; from app.utils.seed import seed_dataset\n'
+            'app = create_app()\n'
+            'with app.app_context():\n'
+            '    db.create_all(); seed_dataset(users=50, products=200, pawah=50, orders=100, messages=500, audit_logs=100, echo=lambda m: None)\n')
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def run_child(db_path, cache_dir, bytecode, warmup):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', METRICS_ENABLED='false',
+               JINJA_BYTECODE_CACHE='true' if bytecode else 'false', JINJA_CACHE_DIR=cache_dir,
+               BENCH_WARMUP='1' if warmup else '0', PYTHONWARNINGS='ignore')
+    out = subprocess.run([sys.executable, '-c', CHILD, *PATHS], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='kp-startup-')
+    db_path = os.path.join(workdir, 'bench.db')
+    prepare_db(db_path)
+    shared_cache = os.path.join(workdir, 'jinja-shared')
+    run_child(db_path, shared_cache, True, False)  # populate the reusable cache
+
+    print(f"{'mode':<30}{'boot ms':>9}{'warm-up ms':>12}{'1st reqs ms':>13}{'ready+1st ms':>14}")
+    for name, (bytecode, reuse, warmup) in MODES.items():
+        samples = []
+        for i in range(args.runs):
+            cache_dir = shared_cache if reuse else os.path.join(workdir, f'jinja-empty-{name[:4]}-{i}')
+            samples.append(run_child(db_path, cache_dir, bytecode, warmup))
+        boot = statistics.median(s['boot'] for s in samples) * 1000
+        warm = statistics.median(s['warmup'] for s in samples) * 1000
+        first = statistics.median(sum(s['first'].values()) for s in samples) * 1000
+        print(f'{name:<30}{boot:>9.1f}{warm:>12.1f}{first:>13.1f}{boot + warm + first:>14.1f}')
+    print(f'\nfirst requests: {", ".join(PATHS)}')
+
+
+if __name__ == '__main__':
+    main()
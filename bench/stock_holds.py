@@ -0,0 +1,183 @@
+"""Many buyers racing for one hot product, and the expired-hold sweep.
+
+Contention: ``--threads`` buyers repeatedly buy 1 unit of a product with
+``--stock`` units until it runs out, using
+
+    conditional        app.utils.stock_holds.reserve: one UPDATE ... WHERE quantity >= n
+    read-modify-write  load the row, check, assign quantity - n (what not to do)
+    for-update         SELECT ... FOR UPDATE first (PostgreSQL only)
+
+and reports latency, throughput, database errors and whether units were
+oversold. Then the product page's POST is driven the same way end to end.
+
+Sweep: ``--orders`` pending orders of which ``--expired`` have lapsed holds
+are released by ``release_expired``; its lookup plan is printed to show the
+index range scan.
+
+    python -m bench.stock_holds --threads 16 --stock 500
+    python -m bench.stock_holds --db postgresql://localhost/kp_bench
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bench.common import make_bench_app, migrate, summarize
+
+
+def buy_conditional(db, models, pid, buyer_id):
+    from app.utils.stock_holds import hold_expiry, reserve
+    if not reserve(pid, 1):
+        db.session.rollback()
+        return False
+    db.session.add(models.Order(buyer_id=buyer_id, product_id=pid, quantity=1, total_price=1,
+                                status='pending', hold_expires_at=hold_expiry()))
+    db.session.commit()
+    return True
+
+
+def buy_read_modify_write(db, models, pid, buyer_id, lock=False):
+    query = db.session.query(models.Product).filter(models.Product.id == pid)
+    product = (query.with_for_update() if lock else query).one()
+    if product.quantity < 1:
+        db.session.rollback()
+        return False
+    product.quantity = product.quantity - 1
+    db.session.add(models.Order(buyer_id=buyer_id, product_id=pid, quantity=1, total_price=1, status='pending'))
+    db.session.commit()
+    return True
+
+
+def race(app, buy, pid, buyers, threads):
+    from app.extensions import db
+    import app.models as models
+    latencies, sold, errors = [], [0], [0]
+    lock = threading.Lock()
+
+    def worker(tid):
+        local, n, failed = [], 0, 0
+        with app.app_context():
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    ok = buy(db, models, pid, buyers[tid % len(buyers)])
+                except Exception:
+                    db.session.rollback()
+                    failed += 1
+                    if failed > 1000:
+                        break
+                    continue
+                finally:
+                    local.append(time.perf_counter() - t0)
+                if not ok:
+                    break
+                n += 1
+            db.session.remove()
+        with lock:
+            latencies.extend(local)
+            sold[0] += n
+            errors[0] += failed
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return summarize(latencies, time.perf_counter() - started), sold[0], errors[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='database URL (default: a fresh SQLite file)')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--expired', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    url = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='kp-bench-'), 'bench.db')}"
+    migrate(url)
+    app = make_bench_app(url)
+    from app.extensions import db
+    from app.models import Order, Product, User
+    from app.utils.query_plans import explain
+    from app.utils.stock_holds import release_expired
+
+    with app.app_context():
+        seller = User(email='seller@bench', name='Seller')
+        buyers = [User(email=f'buyer{i}@bench', name=f'Buyer {i}') for i in range(args.threads)]
+        db.session.add_all([seller, *buyers])
+        db.session.flush()
+        hot = Product(title='Hot', price=1, quantity=0, seller_id=seller.id, is_approved=True)
+        db.session.add(hot)
+        db.session.commit()
+        pid, seller_id, buyer_ids = hot.id, seller.id, [b.id for b in buyers]
+        dialect = db.engine.dialect.name
+
+    strategies = [('conditional', buy_conditional), ('read-modify-write', buy_read_modify_write)]
+    if dialect == 'postgresql':
+        strategies.append(('for-update', lambda *a: buy_read_modify_write(*a, lock=True)))
+    print(f'{args.threads} buyers, {args.stock} units of one product ({dialect})')
+    for name, buy in strategies:
+        with app.app_context():
+            db.session.query(Product).filter(Product.id == pid).update({Product.quantity: args.stock})
+            db.session.query(Order).delete()
+            db.session.commit()
+        s, sold, errors = race(app, buy, pid, buyer_ids, args.threads)
+        with app.app_context():
+            left = db.session.get(Product, pid).quantity
+            orders = db.session.query(Order).count()
+        oversold = max(orders - args.stock, 0)
+        print(f"  {name:<18} p50 {s['p50_ms']:6.2f} ms  p99 {s['p99_ms']:7.2f} ms  {s['throughput_rps']:7.0f} tries/s  "
+              f"sold {sold:4d}  left {left:4d}  errors {errors:4d}  "
+              f"{'OVERSOLD by ' + str(oversold) if oversold else 'consistent'}")
+
+    # End to end through the product page POST
+    with app.app_context():
+        db.session.query(Product).filter(Product.id == pid).update({Product.quantity: args.stock})
+        db.session.query(Order).delete()
+        db.session.commit()
+
+    def buy_via_route(_db, _models, product_id, buyer_id):
+        client = clients.setdefault(threading.get_ident(), app.test_client())
+        with client.session_transaction() as sess:
+            sess['user_id'] = buyer_id
+        resp = client.post(f'/marketplace/{product_id}', data={'quantity': '1'})
+        return resp.status_code == 302 and '/orders/' in resp.headers.get('Location', '')
+
+    clients = {}
+    s, sold, errors = race(app, buy_via_route, pid, buyer_ids, args.threads)
+    with app.app_context():
+        left = db.session.get(Product, pid).quantity
+        orders = db.session.query(Order).count()
+    print(f"  {'route':<18} p50 {s['p50_ms']:6.2f} ms  p99 {s['p99_ms']:7.2f} ms  {s['throughput_rps']:7.0f} tries/s  "
+          f"sold {sold:4d}  left {left:4d}  orders {orders}")
+
+    # Sweep
+    with app.app_context():
+        db.session.query(Order).delete()
+        now = datetime.utcnow()
+        rows = [{'buyer_id': buyer_ids[i % len(buyer_ids)], 'product_id': pid, 'quantity': 1, 'total_price': 1,
+                 'status': 'pending', 'created_at': now,
+                 'hold_expires_at': now + (timedelta(hours=-1) if i < args.expired else timedelta(hours=47))}
+                for i in range(args.orders)]
+        for start in range(0, len(rows), 10_000):
+            db.session.execute(Order.__table__.insert(), rows[start:start + 10_000])
+        db.session.query(Product).filter(Product.id == pid).update({Product.quantity: 0})
+        db.session.commit()
+        query = db.session.query(Order.id).filter(Order.hold_expires_at < now).order_by(Order.hold_expires_at).limit(1000)
+        compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        with db.engine.connect() as conn:
+            plan = explain(conn, str(compiled))
+        result = release_expired()
+        left = db.session.get(Product, pid).quantity
+    print(f'sweep: {args.orders} pending orders, {args.expired} expired -> released {result.orders} '
+          f'({left} units back) in {result.elapsed * 1000:.0f} ms')
+    print('  lookup plan: ' + ' | '.join(line.strip() for line in plan))
+
+
+if __name__ == '__main__':
+    main()
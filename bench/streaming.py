@@ -0,0 +1,73 @@
+"""Buffered vs streamed rendering of the long list pages.
+
+Seeds a dataset, then requests /admin/products, /admin/pawah and /orders
+as an admin with STREAM_TEMPLATES off and on, reporting time to first byte,
+total time and peak Python memory (tracemalloc) per request.
+
+    python -m bench.streaming --products 20000
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from bench.common import make_bench_app
+
+PATHS = ['/admin/products', '/admin/pawah', '/orders']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    app = make_bench_app(FRAGMENT_CACHE='none')
+    from app.extensions import db
+    from app.models import Order, User
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=200, products=args.products, pawah=args.products // 4, orders=args.products // 2,
+                     messages=0, audit_logs=0, echo=lambda m: None)
+        # Log in as the heaviest buyer so /orders has a long purchase history
+        buyer_id = db.session.query(Order.buyer_id).group_by(Order.buyer_id) \
+            .order_by(db.func.count().desc()).limit(1).scalar()
+        User.query.get(buyer_id).is_admin = True
+        db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = buyer_id
+        sess['is_admin'] = True
+
+    print(f"{'page':<18}{'mode':<10}{'ttfb ms':>10}{'total ms':>10}{'peak MiB':>10}{'bytes':>12}")
+    for path in PATHS:
+        for mode in ('buffered', 'streamed'):
+            app.config['STREAM_TEMPLATES'] = mode == 'streamed'
+            samples = [_measure(client, path) for _ in range(args.runs)]
+            ttfb = statistics.median(s[0] for s in samples) * 1000
+            total = statistics.median(s[1] for s in samples) * 1000
+            peak = max(s[2] for s in samples) / 2**20
+            print(f'{path:<18}{mode:<10}{ttfb:>10.1f}{total:>10.1f}{peak:>10.1f}{samples[0][3]:>12,}')
+
+
+def _measure(client, path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    resp = client.get(path, buffered=False)
+    chunks = iter(resp.response)
+    size = len(next(chunks, b''))
+    ttfb = time.perf_counter() - started
+    for chunk in chunks:
+        size += len(chunk)
+    total = time.perf_counter() - started
+    resp.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ttfb, total, peak, size
+
+
+if __name__ == '__main__':
+    main()
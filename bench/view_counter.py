@@ -0,0 +1,122 @@
+"""Cost of counting views on the product page GET path.
+
+Hits /marketplace/<id> from several threads (a few hot products, every
+request a distinct viewer so nothing is deduplicated) in three modes:
+
+    off           no view counting
+    write-behind  app.utils.view_counter: in-memory increment, batched flush
+    sync          one UPSERT + COMMIT per view inside the request
+
+and reports latency percentiles, throughput, failed requests and whether
+the stored counts match the views sent, plus the raw cost of one
+``ViewCounter.record`` call.
+
+    python -m bench.view_counter --requests 4000 --threads 8
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from bench.common import make_bench_app, summarize
+
+MODES = ('off', 'write-behind', 'sync')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--hot', type=int, default=5, help='number of products receiving the traffic')
+    parser.add_argument('--rounds', type=int, default=3, help='interleaved runs per mode; the median is shown')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='kp-bench-'), 'bench.db')
+    app = make_bench_app(f'sqlite:///{db_path}', FRAGMENT_CACHE='none', VIEW_FLUSH_SECONDS=1.0)
+    from flask import request
+    from app.extensions import db
+    from app.models import ListingView, Product
+    from app.utils import view_counter as vc
+    from app.utils.seed import seed_dataset
+
+    with app.app_context():
+        db.create_all()
+        seed_dataset(users=200, products=2000, pawah=0, orders=0, messages=0, audit_logs=0, echo=lambda m: None)
+        hot = [pid for (pid,) in db.session.query(Product.id).filter(
+            Product.is_active.is_(True), Product.is_approved.is_(True)).limit(args.hot)]
+    vc.init_view_counter(app)
+    vc.view_counter.flush_interval = 1.0
+    vc.view_counter.app = None
+
+    mode = {'name': 'off'}
+
+    @app.before_request
+    def _sync_count():
+        if mode['name'] == 'sync' and request.endpoint == 'main.product_detail':
+            vc.write_views({('product', request.view_args['product_id']): 1})
+
+    warm = app.test_client()
+    for i in range(200):
+        warm.get(f'/marketplace/{hot[i % len(hot)]}')
+
+    def run(name, round_no):
+        mode['name'] = name
+        vc.view_counter.app = app if name == 'write-behind' else None
+        with app.app_context():
+            db.session.query(ListingView).delete()
+            db.session.commit()
+        latencies, errors = [], []
+        lock = threading.Lock()
+        per_thread = args.requests // args.threads
+
+        def worker(tid):
+            client = app.test_client()
+            local, failed = [], 0
+            for i in range(per_thread):
+                pid = hot[(tid + i) % len(hot)]
+                t0 = time.perf_counter()
+                resp = client.get(f'/marketplace/{pid}', headers={'User-Agent': f'Mozilla/5.0 viewer-{round_no}-{tid}-{i}'})
+                local.append(time.perf_counter() - t0)
+                failed += resp.status_code != 200
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        if name == 'write-behind':
+            vc.view_counter.app = app
+            vc.view_counter.flush()
+        with app.app_context():
+            stored = db.session.query(db.func.coalesce(db.func.sum(ListingView.views), 0)).scalar()
+        return summarize(latencies, elapsed), sum(errors), stored, per_thread * args.threads
+
+    # Interleave the modes so warm-up and drift do not favour one of them
+    results = {name: [] for name in MODES}
+    for round_no in range(args.rounds):
+        for name in MODES:
+            results[name].append(run(name, round_no))
+
+    print(f"{'mode':<14}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}{'stored/sent':>13}")
+    for name, runs in results.items():
+        pick = sorted(runs, key=lambda r: r[0]['p50_ms'])[len(runs) // 2]
+        s, errors, stored, sent = pick
+        print(f"{name:<14}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}"
+              f"{s['throughput_rps']:>9.0f}{errors:>8}{f'{stored}/{sent}':>13}")
+
+    counter = vc.ViewCounter()
+    n = 100_000
+    started = time.perf_counter()
+    for i in range(n):
+        counter.record('product', i % 50, f'viewer-{i}')
+    print(f'\nViewCounter.record: {(time.perf_counter() - started) / n * 1e6:.1f} us per view')
+
+
+if __name__ == '__main__':
+    main()
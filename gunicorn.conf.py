@@ -0,0 +1,43 @@
+# Gunicorn picks this file up automatically from the working directory.
+# Command-line flags (see nixpacks.toml / Dockerfile) still take precedence.
+import os
+
+# GUNICORN_PRELOAD=true imports the app once in the master and forks workers
+# from it, so compiled templates are shared copy-on-write.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def _wsgi_app(worker):
+    return getattr(worker, 'wsgi', None)
+
+
+def on_starting(server):
+    # Drop per-worker metric snapshots left over from a previous run
+    from app.utils.metrics import clear_metrics_dir
+    # Same default as create_app: the instance folder next to the app package
+    clear_metrics_dir(os.getenv('METRICS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'))
+
+
+def when_ready(server):
+    # Preloaded app: compile templates once in the master before forking
+    if preload_app and os.getenv('WARMUP_ON_START', 'false').lower() == 'true':
+        from app.utils.warmup import precompile_templates
+        app = server.app.wsgi()
+        server.log.info('warm-up: precompiled %d templates in master', precompile_templates(app))
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with children
+    if preload_app:
+        from app.utils.warmup import dispose_engine_after_fork
+        dispose_engine_after_fork(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    # Runs in the worker after the app is loaded and before it accepts requests
+    app = _wsgi_app(worker)
+    if app is None or not getattr(app, 'config', {}).get('WARMUP_ON_START'):
+        return
+    from app.utils.warmup import warm_up
+    timings = warm_up(app, templates=not preload_app)
+    worker.log.info('warm-up: %s', ', '.join(f'{k}={v * 1000:.0f}ms' for k, v in timings.items()))